@@ -0,0 +1,476 @@
+"""
+Replay synthetic updates against the real handlers and measure dispatch.
+
+Handlers are loaded from the same modules the bot loads and dispatched the
+way pyrogram's Dispatcher does (groups in order, first matching handler per
+group, Stop/ContinuePropagation), by a pool of worker tasks like the bot's
+BOT_WORKERS. Telegram is replaced by a fake client that answers every API
+call at once, yt-dlp by an in-process fake that prints synthetic (or
+recorded) `-j` output, and remote files by a local HTTP server, so what is
+measured is the bot's own work per update.
+
+    python benchmarks/dispatch_load.py --updates 20000 --workers 50
+    python benchmarks/dispatch_load.py --mix link=1 --probe-fixture benchmarks/fixtures/site.jsonl
+
+Fixtures recorded with `probe_memory.py --record` can be replayed as the
+yt-dlp output with --probe-fixture.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import importlib
+import contextlib
+import itertools
+import tempfile
+import tracemalloc
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiohttp import web  # noqa: E402
+from pyrogram import enums  # noqa: E402
+from pyrogram import ContinuePropagation, StopPropagation  # noqa: E402
+from pyrogram.handlers import CallbackQueryHandler, MessageHandler  # noqa: E402
+from pyrogram.handlers.handler import Handler  # noqa: E402
+from pyrogram.types import CallbackQuery, Chat, Message, MessageEntity, User  # noqa: E402
+
+import startup  # noqa: E402
+from config import Config  # noqa: E402
+
+COMMANDS = ["/start", "/help", "/about", "/queue_status"]
+# Download and playlist presses are only queued, as the bot runs in frontend mode here
+CALLBACKS = ["home", "help", "about", "close", "{token}|0", "pl:{token}:best", "video=18=mp4"]
+FILE_SIZE = 50 * 1024 * 1024
+
+
+# -----------------------------------------------------
+# Fake Telegram
+# -----------------------------------------------------
+class FakeClient:
+    """
+    Stands in for pyrogram.Client: every API method succeeds immediately.
+
+    Methods are created on demand; send_*/edit_*/copy_* return a bound
+    Message so handlers can keep chaining (``chk.delete()``...).
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        # Pyrogram runs non-async filters in the client's executor
+        self.executor = ThreadPoolExecutor(4, thread_name_prefix="filters")
+        self.parse_mode = enums.ParseMode.DEFAULT
+        self.me = User(client=self, id=1, first_name="Load test", username="loadtest_bot", is_bot=True)
+        self.calls = Counter()
+        self._ids = itertools.count(1_000_000)
+
+    def message(self, chat_id, text=None, reply_to=None):
+        user = User(client=self, id=chat_id, first_name=f"user{chat_id}")
+        return Message(
+            client=self,
+            id=next(self._ids),
+            from_user=user,
+            chat=Chat(id=chat_id, type=enums.ChatType.PRIVATE),
+            text=text,
+            entities=[],
+            reply_to_message=reply_to,
+        )
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            self.calls[name] += 1
+            if name.startswith(("send_", "edit_", "copy_")):
+                chat_id = kwargs.get("chat_id", args[0] if args else 0)
+                return self.message(chat_id, kwargs.get("text"))
+            return True
+
+        return call
+
+
+class FakeProcess:
+    """asyncio subprocess replacement that prints a canned yt-dlp probe."""
+
+    def __init__(self, output, delay):
+        self.returncode = None
+        self.stdout = asyncio.StreamReader(limit=64 * 1024 * 1024)
+        self.stderr = asyncio.StreamReader()
+        self.stderr.feed_eof()
+        self._task = asyncio.ensure_future(self._produce(output, delay))
+
+    async def _produce(self, output, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        self.stdout.feed_data(output)
+        self.stdout.feed_eof()
+        self.returncode = 0
+
+    async def wait(self):
+        await self._task
+        return self.returncode
+
+    async def communicate(self, _input=None):
+        await self._task
+        return await self.stdout.read(), b""
+
+
+def synthetic_video(index, formats):
+    info = {
+        "_type": "video",
+        "id": f"vid{index}",
+        "title": f"Synthetic video {index}",
+        "fulltitle": f"Synthetic video {index}",
+        "webpage_url": f"https://example.com/watch/{index}",
+        "duration": 300,
+        "ext": "mp4",
+        "format_id": "18",
+        "formats": [
+            {
+                "format_id": str(100 + n),
+                "format_note": f"{144 * (n + 1)}p",
+                "ext": "mp4",
+                "vcodec": "avc1",
+                "acodec": "none" if n % 2 else "mp4a",
+                "filesize": 1_000_000 * (n + 1),
+                "fragments": [{"url": f"https://cdn.example.com/{index}/{n}/{k}.ts"} for k in range(50)],
+            }
+            for n in range(formats)
+        ],
+    }
+    return json.dumps(info).encode() + b"\n"
+
+
+def synthetic_playlist(index, entries):
+    return b"".join(
+        json.dumps(
+            {
+                "_type": "url",
+                "id": f"pl{index}-{n}",
+                "url": f"https://example.com/watch/{index}-{n}",
+                "title": f"Entry {n}",
+                "playlist_title": f"Synthetic playlist {index}",
+            }
+        ).encode()
+        + b"\n"
+        for n in range(entries)
+    )
+
+
+def install_fake_ytdlp(args):
+    fixture = None
+    if args.probe_fixture:
+        with open(args.probe_fixture, "rb") as f:
+            fixture = f.read()
+    counter = itertools.count()
+    real = asyncio.create_subprocess_exec
+
+    async def create_subprocess_exec(*command, **kwargs):
+        if command[0] != "yt-dlp":
+            # ffmpeg, ffprobe... run for real
+            return await real(*command, **kwargs)
+        index = next(counter)
+        if fixture is not None:
+            output = fixture
+        elif random.random() < args.playlist_ratio:
+            output = synthetic_playlist(index, args.playlist_entries)
+        else:
+            output = synthetic_video(index, args.formats)
+        return FakeProcess(output, args.probe_delay)
+
+    asyncio.create_subprocess_exec = create_subprocess_exec
+
+
+async def start_file_server():
+    """Local server answering HEAD and ranged GET like a file host."""
+
+    async def serve(request):
+        headers = {"Content-Type": "video/mp4", "Accept-Ranges": "bytes"}
+        if request.method == "HEAD":
+            return web.Response(headers={**headers, "Content-Length": str(FILE_SIZE)})
+        return web.Response(
+            status=206,
+            body=b"\0",
+            headers={**headers, "Content-Range": f"bytes 0-0/{FILE_SIZE}"},
+        )
+
+    app = web.Application()
+    app.router.add_route("*", "/file/{name}", serve)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+# -----------------------------------------------------
+# Handlers and dispatch
+# -----------------------------------------------------
+def load_handlers():
+    """
+    Import the bot's handler modules and collect their handlers by group.
+
+    Returns:
+    List[Tuple[int, List[Handler]]]: Groups in dispatch order.
+    """
+    Config.LAZY_PLUGINS = True
+    # Plugin discovery walks paths relative to the bot's directory
+    os.chdir(ROOT)
+    config = startup.plugins_config("plugins")
+    groups = defaultdict(list)
+    for name in config["include"]:
+        module = importlib.import_module(f"{config['root']}.{name}")
+        for attribute in vars(module).values():
+            for handler, group in getattr(attribute, "handlers", ()):
+                if isinstance(handler, Handler) and isinstance(group, int):
+                    groups[group].append(handler)
+    return sorted(groups.items())
+
+
+def handler_name(handler):
+    callback = handler.callback
+    return f"{callback.__module__.split('.')[-1]}.{callback.__name__}"
+
+
+async def dispatch(client, groups, update):
+    """
+    Run ``update`` through the handlers like pyrogram's Dispatcher.
+
+    Returns:
+    Tuple[str, float]: Handlers that ran ("+"-joined, or "unhandled") and
+    seconds spent in filter checks.
+    """
+    handler_type = CallbackQueryHandler if isinstance(update, CallbackQuery) else MessageHandler
+    ran = []
+    checking = 0.0
+    try:
+        for _, handlers in groups:
+            for handler in handlers:
+                if not isinstance(handler, handler_type):
+                    continue
+                started = time.perf_counter()
+                try:
+                    matched = await handler.check(client, update)
+                except Exception as e:
+                    logging.error("Filter of %s failed: %s", handler_name(handler), e)
+                    matched = False
+                checking += time.perf_counter() - started
+                if not matched:
+                    continue
+                ran.append(handler_name(handler))
+                try:
+                    await handler.callback(client, update)
+                except StopPropagation:
+                    raise
+                except ContinuePropagation:
+                    # Like pyrogram: try the next handler of the same group
+                    continue
+                except Exception as e:
+                    logging.error("%s raised %s: %s", handler_name(handler), type(e).__name__, e)
+                break
+    except StopPropagation:
+        pass
+    return "+".join(ran) or "unhandled", checking
+
+
+# -----------------------------------------------------
+# Workload
+# -----------------------------------------------------
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    unknown = set(mix) - {"link", "command", "callback", "queue", "chatter"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown update kinds: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def build_updates(client, args, base_url):
+    """Synthetic updates, each as (kind, update)."""
+    rng = random.Random(args.seed)
+    kinds, weights = zip(*args.mix.items())
+    updates = []
+    link_ids = itertools.count()
+    while len(updates) < args.updates:
+        kind = rng.choices(kinds, weights)[0]
+        user_id = 10_000 + rng.randrange(args.users)
+        if kind == "link":
+            url = f"https://example.com/watch/{next(link_ids)}"
+            message = client.message(user_id, url)
+            message.entities = [MessageEntity(type=enums.MessageEntityType.URL, offset=0, length=len(url))]
+            updates.append((kind, message))
+        elif kind == "command":
+            text = rng.choice(COMMANDS)
+            message = client.message(user_id, text)
+            message.entities = [MessageEntity(type=enums.MessageEntityType.BOT_COMMAND, offset=0, length=len(text))]
+            updates.append((kind, message))
+        elif kind == "callback":
+            data = rng.choice(CALLBACKS).format(token=f"{rng.getrandbits(64):016x}")
+            origin = client.message(user_id, "https://example.com/watch/1")
+            updates.append(
+                (
+                    kind,
+                    CallbackQuery(
+                        client=client,
+                        id=str(len(updates)),
+                        from_user=origin.from_user,
+                        chat_instance="loadtest",
+                        message=client.message(user_id, "menu", reply_to=origin),
+                        data=data,
+                    ),
+                )
+            )
+        elif kind == "queue":
+            # /queue, then the links it waits for, from the same user
+            command = client.message(user_id, "/queue")
+            command.entities = [MessageEntity(type=enums.MessageEntityType.BOT_COMMAND, offset=0, length=6)]
+            links = "\n".join(f"{base_url}/file/{next(link_ids)}.mp4" for _ in range(args.queue_links))
+            updates.append((kind, command))
+            updates.append((kind, client.message(user_id, links)))
+        else:
+            updates.append((kind, client.message(user_id, "hello there")))
+    return updates[: args.updates]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run_load(client, groups, updates, workers):
+    """Dispatch every update with ``workers`` concurrent tasks; per-handler timings."""
+    queue = asyncio.Queue()
+    for item in updates:
+        queue.put_nowait(item)
+    latencies = defaultdict(list)
+    checks = defaultdict(float)
+
+    async def worker():
+        while True:
+            try:
+                _, update = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            name, checking = await dispatch(client, groups, update)
+            latencies[name].append(time.perf_counter() - started)
+            checks[name] += checking
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return time.perf_counter() - started, latencies, checks
+
+
+async def measure_allocations(client, groups, updates, per_kind):
+    """Allocated (peak) and retained bytes per update, dispatching one at a time."""
+    by_kind = defaultdict(list)
+    for kind, update in updates:
+        if len(by_kind[kind]) < per_kind:
+            by_kind[kind].append(update)
+    results = {}
+    tracemalloc.start()
+    try:
+        for kind, sample in by_kind.items():
+            peak_total = 0
+            tracemalloc.clear_traces()
+            baseline, _ = tracemalloc.get_traced_memory()
+            for update in sample:
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await dispatch(client, groups, update)
+                _, peak = tracemalloc.get_traced_memory()
+                peak_total += peak - before
+            retained, _ = tracemalloc.get_traced_memory()
+            results[kind] = (peak_total / len(sample), (retained - baseline) / len(sample))
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def report(elapsed, latencies, checks, calls, allocations, total):
+    print(f"\n{'handler':42} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'filters us':>10}")
+    for name in sorted(latencies, key=lambda n: -len(latencies[n])):
+        values = sorted(latencies[name])
+        print(
+            f"{name[:42]:42} {len(values):7d}"
+            f" {percentile(values, 0.5) * 1000:8.2f} {percentile(values, 0.9) * 1000:8.2f}"
+            f" {percentile(values, 0.99) * 1000:8.2f} {values[-1] * 1000:8.2f}"
+            f" {checks[name] / len(values) * 1e6:10.1f}"
+        )
+    print(f"\n{total} updates in {elapsed:.2f}s: {total / elapsed:.0f} updates/s")
+    print(f"API calls: {sum(calls.values())} ({sum(calls.values()) / total:.2f} per update) {dict(calls.most_common())}")
+    if allocations:
+        print(f"\n{'kind':12} {'alloc KiB/update':>18} {'retained KiB/update':>20}")
+        for kind, (peak, retained) in sorted(allocations.items()):
+            print(f"{kind:12} {peak / 1024:18.1f} {retained / 1024:20.1f}")
+
+
+async def main_async(args):
+    tmp = tempfile.mkdtemp(prefix="dispatch-load-")
+    # Queued links go to a throwaway broker instead of being downloaded
+    Config.BOT_MODE = "frontend"
+    Config.BROKER_PATH = os.path.join(tmp, "jobs.sqlite3")
+    Config.DOWNLOAD_LOCATION = tmp
+    if not args.log:
+        logging.disable(logging.INFO)
+
+    random.seed(args.seed)
+    install_fake_ytdlp(args)
+    runner, base_url = await start_file_server()
+    try:
+        groups = load_handlers()
+        print("Handlers:", ", ".join(f"[{g}] " + " ".join(handler_name(h) for h in hs) for g, hs in groups))
+        client = FakeClient(asyncio.get_running_loop())
+        updates = build_updates(client, args, base_url)
+        # Handlers print debugging output; keep it out of the report
+        with contextlib.nullcontext() if args.log else contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(args.warmup):
+                await dispatch(client, groups, updates[0][1])
+            elapsed, latencies, checks = await run_load(client, groups, updates, args.workers)
+            calls = Counter(client.calls)
+            allocations = None
+            if args.allocations:
+                fresh = build_updates(FakeClient(asyncio.get_running_loop()), args, base_url)
+                allocations = await measure_allocations(client, groups, fresh, args.allocations)
+        report(elapsed, latencies, checks, calls, allocations, len(updates))
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=10000, help="updates to replay")
+    parser.add_argument("--workers", type=int, default=Config.BOT_WORKERS, help="concurrent dispatch tasks")
+    parser.add_argument("--users", type=int, default=5000, help="distinct synthetic users")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("link=50,command=20,callback=20,queue=5,chatter=5"),
+        help="update kinds and weights: link, command, callback, queue, chatter",
+    )
+    parser.add_argument("--formats", type=int, default=20, help="formats per synthetic video")
+    parser.add_argument("--playlist-ratio", type=float, default=0.1, help="share of links that are playlists")
+    parser.add_argument("--playlist-entries", type=int, default=25)
+    parser.add_argument("--queue-links", type=int, default=5, help="links per /queue message")
+    parser.add_argument("--probe-fixture", help="recorded `yt-dlp -j` output to replay for every link")
+    parser.add_argument("--probe-delay", type=float, default=0.0, help="seconds the fake yt-dlp takes")
+    parser.add_argument("--allocations", type=int, default=200, metavar="N", help="updates per kind traced for allocations (0 = off)")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log", action="store_true", help="keep the handlers' INFO logging and prints")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
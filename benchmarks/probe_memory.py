@@ -0,0 +1,141 @@
+"""
+Memory and time spent turning `yt-dlp -j` output into what echo.py keeps.
+
+Compares the old approach (keep the whole info dict) with ``ProbeRecord``.
+Fixtures are files of raw `yt-dlp -j` output; record them with --record,
+or write the deterministic synthetic HLS probe (80 formats x 300 fragments)
+with --synthetic:
+
+    python benchmarks/probe_memory.py --record URL benchmarks/fixtures/site.jsonl
+    python benchmarks/probe_memory.py --synthetic benchmarks/fixtures/synthetic-hls.jsonl
+    python benchmarks/probe_memory.py benchmarks/fixtures/*.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.functions.probe import ProbeRecord  # noqa: E402
+
+
+def full_dicts(lines):
+    return [json.loads(line) for line in lines]
+
+
+def records(lines):
+    return [ProbeRecord.parse(line) for line in lines]
+
+
+def measure(parse, lines, rounds):
+    """
+    Run ``parse`` over the fixture lines.
+
+    Returns:
+    Tuple[float, int, int]: Seconds per run, peak bytes while parsing, and
+    bytes still held by the result.
+    """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        parse(lines)
+    elapsed = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    result = parse(lines)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, retained
+
+
+def record(url, path):
+    output = subprocess.run(
+        ["yt-dlp", "--no-warnings", "--flat-playlist", "-j", url],
+        check=True,
+        capture_output=True,
+    ).stdout
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(output)
+    print(f"{path}: {len(output.splitlines())} lines, {len(output)} bytes")
+
+
+def synthetic(path, formats=80, fragments=300):
+    """Write a `yt-dlp -j` line shaped like an HLS site's, the same every time."""
+    base = "https://cdn.example.com/hls/abc123"
+    info = {
+        "id": "abc123",
+        "title": "Synthetic HLS video",
+        "fulltitle": "Synthetic HLS video",
+        "webpage_url": "https://example.com/watch/abc123",
+        "extractor": "generic",
+        "duration": fragments * 6,
+        "thumbnail": f"{base}/thumb.jpg",
+        "formats": [
+            {
+                "format_id": f"hls-{n}",
+                "format_note": f"{144 + 12 * n}p",
+                "ext": "mp4",
+                "protocol": "m3u8_native",
+                "url": f"{base}/{n}/index.m3u8",
+                "manifest_url": f"{base}/master.m3u8",
+                "vcodec": "avc1.64001f",
+                "acodec": "mp4a.40.2" if n % 2 else "none",
+                "width": 256 + 16 * n,
+                "height": 144 + 12 * n,
+                "tbr": 200.0 + 50 * n,
+                "filesize_approx": (200 + 50 * n) * 750 * fragments,
+                "http_headers": {"User-Agent": "Mozilla/5.0", "Accept": "*/*"},
+                "fragments": [
+                    {"url": f"{base}/{n}/segment-{k:05d}.ts?token=0123456789abcdef", "duration": 6.0}
+                    for k in range(fragments)
+                ],
+            }
+            for n in range(formats)
+        ],
+    }
+    output = json.dumps(info).encode() + b"\n"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(output)
+    print(f"{path}: {formats} formats x {fragments} fragments, {len(output)} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("fixtures", nargs="*", help="files of `yt-dlp -j` output")
+    parser.add_argument("--record", metavar="URL", help="save the probe of URL to the single fixture path")
+    parser.add_argument("--synthetic", metavar="PATH", help="write the synthetic HLS fixture to PATH and measure it")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.record:
+        if len(args.fixtures) != 1:
+            parser.error("--record takes exactly one fixture path")
+        record(args.record, args.fixtures[0])
+        return
+    if args.synthetic:
+        synthetic(args.synthetic)
+        args.fixtures.append(args.synthetic)
+    if not args.fixtures:
+        parser.error("no fixtures given")
+
+    print(f"{'fixture':30} {'approach':12} {'ms/run':>10} {'peak KiB':>10} {'kept KiB':>10}")
+    for path in args.fixtures:
+        with open(path, "rb") as f:
+            lines = [line for line in f.read().splitlines() if line.strip()]
+        for name, parse in (("full dict", full_dicts), ("ProbeRecord", records)):
+            elapsed, peak, retained = measure(parse, lines, args.rounds)
+            print(
+                f"{os.path.basename(path)[:30]:30} {name:12} {elapsed * 1000:10.2f}"
+                f" {peak / 1024:10.1f} {retained / 1024:10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 import os
+import asyncio
 import logging
+
+import startup
+from config import Config
+
+# Must run before pyrogram is imported: installs uvloop and the import timer
+startup.begin()
+
 from pyrogram.raw.all import layer
 from pyrogram import Client, idle, __version__
 
-from config import Config
-from keep_alive import keep_alive
-keep_alive()
+from keep_alive import keep_alive, stop_keep_alive
+from plugins.functions.governor import governor
+from plugins.functions.settings import live_settings, mount_settings_routes
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -37,39 +45,74 @@ if not Config.API_HASH:
 
 
 # -----------------------------------------------------
-# 🟩 CHANGE / ADD — Cleaner plugin loading (recommended)
-# Old: plugins=dict(root="plugins"),
-# New: plugins={"root": "plugins"},
+# Plugin loading — with LAZY_PLUGINS only handler modules
+# are imported at start, helpers load on first use
 # -----------------------------------------------------
 bot = Client(
     "All-Url-Uploader",
     api_id=Config.API_ID,
     api_hash=Config.API_HASH,
     bot_token=Config.BOT_TOKEN,
-    workers=50,
-    plugins={"root": "plugins"},  # 🟩 UPDATED
+    workers=Config.BOT_WORKERS,
+    plugins=startup.plugins_config("plugins"),
 )
+governor.install(bot)
 
 
-# -----------------------------------------------------
-# ✔ NO DELETE — START BOT
-# -----------------------------------------------------
-bot.start()
-logger.info("Bot has started.")
+def resize_handler_workers(count):
+    """Grow or shrink pyrogram's update handler tasks while the bot runs."""
+    dispatcher = bot.dispatcher
+    if not dispatcher.handler_worker_tasks:
+        # Not started yet: Client.start() spawns ``workers`` tasks
+        bot.workers = count
+        return
+    while bot.workers < count:
+        lock = asyncio.Lock()
+        dispatcher.locks_list.append(lock)
+        dispatcher.handler_worker_tasks.append(
+            bot.loop.create_task(dispatcher.handler_worker(lock))
+        )
+        bot.workers += 1
+    while bot.workers > count:
+        # A handler task exits when it takes None from the queue, after its current update
+        dispatcher.updates_queue.put_nowait(None)
+        bot.workers -= 1
 
-# -----------------------------------------------------
-# ✔ NO CHANGE — Logging Bot Info
-# -----------------------------------------------------
-logger.info("**Bot Started**\n\n**Pyrogram Version:** %s \n**Layer:** %s", __version__, layer)
-logger.info("Developed by github.com/kalanakt Sponsored by www.netronk.com")
 
-# -----------------------------------------------------
-# ✔ NO CHANGE — keep idle()
-# -----------------------------------------------------
-idle()
+live_settings.on_change("BOT_WORKERS", resize_handler_workers)
+
 
 # -----------------------------------------------------
-# ✔ NO CHANGE — Stop bot
+# START BOT — health server runs on the bot's own event loop
 # -----------------------------------------------------
-bot.stop()
-logger.info("Bot Stopped ;)")
+async def main():
+    from plugins.functions.cpu_pool import cpu_pool
+
+    # Fork the CPU workers before pyrogram starts its threads
+    await cpu_pool.warm()
+    await bot.start()
+    logger.info("Bot has started.")
+    if Config.BOT_MODE == "frontend":
+        from plugins.functions.broker import get_broker, mount_broker_routes
+
+        # Settings changed during an earlier run are not applied again
+        await get_broker().clear_settings()
+        if Config.BROKER_TOKEN:
+            mount_broker_routes(get_broker())
+    if Config.ADMIN_TOKEN:
+        mount_settings_routes()
+    await keep_alive(bot)
+
+    logger.info("**Bot Started**\n\n**Pyrogram Version:** %s \n**Layer:** %s", __version__, layer)
+    logger.info("Developed by github.com/kalanakt Sponsored by www.netronk.com")
+    startup.finish()
+
+    await idle()
+
+    await stop_keep_alive()
+    await bot.stop()
+    cpu_pool.shutdown()
+    logger.info("Bot Stopped ;)")
+
+
+bot.run(main())
@@ -26,16 +26,162 @@ class Config(object):
     # Telegram maximum file upload size
     TG_MAX_FILE_SIZE = 4194304000
 
+    # Split downloads larger than TG_MAX_FILE_SIZE into parts (while downloading)
+    # and post them as an album; parts target SPLIT_PART_RATIO of the limit
+    SPLIT_OVERSIZE = os.environ.get("SPLIT_OVERSIZE", "True").lower() in ("1", "true", "yes")
+    SPLIT_PART_RATIO = float(os.environ.get("SPLIT_PART_RATIO", 0.9))
+    SPLIT_UPLOAD_CONCURRENCY = int(os.environ.get("SPLIT_UPLOAD_CONCURRENCY", 3))
+
     # Chunk size that should be used with requests : default is 128KB
     CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 128))
     # Proxy for accessing youtube-dl in GeoRestricted Areas
     # Get your own proxy from https://github.com/rg3/youtube-dl/issues/1091#issuecomment-230163061
     HTTP_PROXY = os.environ.get("HTTP_PROXY", "")
 
+    # HLS/DASH fragments yt-dlp fetches at once, and retries per fragment
+    FRAGMENT_CONCURRENCY = int(os.environ.get("FRAGMENT_CONCURRENCY", 8))
+    FRAGMENT_RETRIES = int(os.environ.get("FRAGMENT_RETRIES", 10))
+
+    # Normalized custom thumbnails kept in memory (one per user)
+    THUMB_CACHE_SIZE = int(os.environ.get("THUMB_CACHE_SIZE", 512))
+
+    # Processes for CPU-heavy work (metadata parsing, image resizing, big JSON);
+    # 0 runs it in threads instead. Tasks taking longer than CPU_TASK_TIMEOUT fail
+    CPU_WORKERS = int(os.environ.get("CPU_WORKERS", 2))
+    CPU_TASK_TIMEOUT = float(os.environ.get("CPU_TASK_TIMEOUT", 120))
+
+    # Screenshots sent in reply to every uploaded video (0 = none)
+    SCREENSHOTS = int(os.environ.get("SCREENSHOTS", 0))
+    # Parallel ffmpeg processes used when screenshots have to be retried one by one
+    SCREENSHOT_CONCURRENCY = int(os.environ.get("SCREENSHOT_CONCURRENCY", 4))
+
+    # Pyrogram tasks handling updates at once
+    BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 50))
+
     # Set timeout for subprocess
     PROCESS_MAX_TIMEOUT = 0
 
     OWNER_ID = os.environ.get("OWNER_ID")
-    ADL_BOT_RQ = {}
     AUTH_USERS = list({int(x) for x in os.environ.get("AUTH_USERS", "0").split()})
     AUTH_USERS.append(OWNER_ID)
+
+    # Bandwidth shaping in bytes per second (0 = unlimited), for downloads and
+    # uploads, across the whole bot and per user; the first
+    # BANDWIDTH_FREE_BYTES of every transfer are never delayed, so small jobs
+    # stay fast while big ones are shaped
+    BANDWIDTH_DOWN_GLOBAL = int(os.environ.get("BANDWIDTH_DOWN_GLOBAL", 0))
+    BANDWIDTH_DOWN_USER = int(os.environ.get("BANDWIDTH_DOWN_USER", 0))
+    BANDWIDTH_UP_GLOBAL = int(os.environ.get("BANDWIDTH_UP_GLOBAL", 0))
+    BANDWIDTH_UP_USER = int(os.environ.get("BANDWIDTH_UP_USER", 0))
+    BANDWIDTH_FREE_BYTES = int(os.environ.get("BANDWIDTH_FREE_BYTES", 8 * 1024 * 1024))
+
+    # Files at least UPLOAD_MMAP_MIN_SIZE bytes are uploaded from a memory map
+    # with kernel readahead of UPLOAD_READAHEAD bytes; pages already sent are
+    # dropped from the page cache
+    UPLOAD_MMAP = os.environ.get("UPLOAD_MMAP", "True").lower() in ("1", "true", "yes")
+    UPLOAD_MMAP_MIN_SIZE = int(os.environ.get("UPLOAD_MMAP_MIN_SIZE", 20 * 1024 * 1024))
+    UPLOAD_READAHEAD = int(os.environ.get("UPLOAD_READAHEAD", 16 * 1024 * 1024))
+
+    # Content digest computed while downloading: "blake2b", or "xxh3" when the
+    # xxhash package is installed. Uploads of content sent before are copied
+    # from the earlier message; CONTENT_INDEX_SIZE digests are remembered
+    HASH_ALGORITHM = os.environ.get("HASH_ALGORITHM", "blake2b")
+    DEDUPE_UPLOADS = os.environ.get("DEDUPE_UPLOADS", "True").lower() in ("1", "true", "yes")
+    CONTENT_INDEX_SIZE = int(os.environ.get("CONTENT_INDEX_SIZE", 10000))
+
+    # Outbound Telegram calls allowed bot-wide and per chat ("<calls>/<seconds>",
+    # "0" = unlimited); FloodWaits up to RPC_MAX_FLOOD_WAIT seconds are waited
+    # out for the affected chat only, longer ones are raised to the caller
+    RPC_GLOBAL_LIMIT = os.environ.get("RPC_GLOBAL_LIMIT", "30/1")
+    RPC_CHAT_LIMIT = os.environ.get("RPC_CHAT_LIMIT", "5/5")
+    RPC_MAX_FLOOD_WAIT = float(os.environ.get("RPC_MAX_FLOOD_WAIT", 60))
+    # Processes using the bot token, which share RPC_GLOBAL_LIMIT equally: the
+    # front-end plus every worker.py process on every host ("0" = 1 +
+    # WORKER_PROCESSES in frontend mode, 1 otherwise; set it when workers run
+    # on other hosts). The per-chat budget applies in each process
+    RPC_PROCESSES = int(os.environ.get("RPC_PROCESSES", 0))
+
+    # Extra chats every finished upload is copied to (log channel, mirrors...),
+    # space-separated IDs or @usernames, and how many copies are sent at once
+    DELIVERY_CHATS = [
+        int(x) if x.lstrip("-").isdigit() else x for x in os.environ.get("DELIVERY_CHATS", "").split()
+    ]
+    DELIVERY_CONCURRENCY = int(os.environ.get("DELIVERY_CONCURRENCY", 5))
+
+    # Startup: import only handler modules, use uvloop if installed, log import times at boot
+    LAZY_PLUGINS = os.environ.get("LAZY_PLUGINS", "True").lower() in ("1", "true", "yes")
+    USE_UVLOOP = os.environ.get("USE_UVLOOP", "False").lower() in ("1", "true", "yes")
+    IMPORT_TIME_REPORT = os.environ.get("IMPORT_TIME_REPORT", "False").lower() in ("1", "true", "yes")
+
+    # Scale-out: "standalone" runs downloads in the bot process, "frontend" only
+    # enqueues them (/queue links and download button presses) for worker.py
+    # processes sharing the SQLite broker at BROKER_PATH
+    BOT_MODE = os.environ.get("BOT_MODE", "standalone")
+    BROKER_PATH = os.environ.get("BROKER_PATH", f"{DOWNLOAD_LOCATION}/jobs.sqlite3")
+    # Workers on other hosts: set BROKER_URL to the front-end's health server
+    # and the same BROKER_TOKEN on both sides (the front-end only exposes it with a token)
+    BROKER_URL = os.environ.get("BROKER_URL", "")
+    BROKER_TOKEN = os.environ.get("BROKER_TOKEN", "")
+    # Seconds a worker may go silent before its job is handed to another worker
+    BROKER_LEASE = int(os.environ.get("BROKER_LEASE", 300))
+    BROKER_MAX_ATTEMPTS = int(os.environ.get("BROKER_MAX_ATTEMPTS", 3))
+    # worker.py processes to start, and how often an idle worker polls (seconds)
+    WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", 1))
+    WORKER_POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", 1.0))
+
+    # /queue pre-flight: concurrent HEAD probes, per-probe timeout (seconds) and
+    # job order: "fifo", "smallest" or "largest"
+    PREFLIGHT_CONCURRENCY = int(os.environ.get("PREFLIGHT_CONCURRENCY", 16))
+    PREFLIGHT_TIMEOUT = int(os.environ.get("PREFLIGHT_TIMEOUT", 15))
+    QUEUE_ORDER = os.environ.get("QUEUE_ORDER", "smallest")
+
+    # MP3 buttons: bitrates encoded together from one decode, ffmpeg encodes at
+    # once, and how many encoded files / downloaded audio sources stay cached
+    AUDIO_LADDER = os.environ.get("AUDIO_LADDER", "64k,128k,320k")
+    AUDIO_ENCODE_CONCURRENCY = int(os.environ.get("AUDIO_ENCODE_CONCURRENCY", 2))
+    AUDIO_CACHE_SIZE = int(os.environ.get("AUDIO_CACHE_SIZE", 60))
+    AUDIO_SOURCE_CACHE_SIZE = int(os.environ.get("AUDIO_SOURCE_CACHE_SIZE", 20))
+
+    # Playlists: entries listed per link, and entries downloaded/uploaded at once
+    PLAYLIST_MAX_ENTRIES = int(os.environ.get("PLAYLIST_MAX_ENTRIES", 100))
+    PLAYLIST_CONCURRENCY = int(os.environ.get("PLAYLIST_CONCURRENCY", 3))
+
+    # Remote file inspections (size, type, name, range support) reused across
+    # jobs for INSPECT_CACHE_TTL seconds, at most INSPECT_CACHE_SIZE URLs
+    INSPECT_CACHE_TTL = int(os.environ.get("INSPECT_CACHE_TTL", 600))
+    INSPECT_CACHE_SIZE = int(os.environ.get("INSPECT_CACHE_SIZE", 4096))
+
+    # Format-selection sessions behind inline buttons: lifetime (seconds) and memory bounds
+    SESSION_TTL = int(os.environ.get("SESSION_TTL", 6 * 3600))
+    SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", 20000))
+    SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 32 * 1024 * 1024))
+    # Also keep sessions in DOWNLOAD_LOCATION/sessions.sqlite3 so buttons survive restarts
+    SESSION_PERSIST = os.environ.get("SESSION_PERSIST", "False").lower() in ("1", "true", "yes")
+
+    # Port for the health server (/healthz, /readyz)
+    PORT = int(os.environ.get("PORT", 10000))
+    # Bearer token for /settings on the health server (not exposed when empty)
+    ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+    # Readiness fails when event-loop lag (seconds) or disk usage (percent) exceed these
+    HEALTH_MAX_LOOP_LAG = float(os.environ.get("HEALTH_MAX_LOOP_LAG", 1.0))
+    HEALTH_MAX_DISK_USAGE = float(os.environ.get("HEALTH_MAX_DISK_USAGE", 90))
+    # Log the blocking call site when the event loop stalls longer than this (seconds)
+    LOOP_WATCHDOG_THRESHOLD = float(os.environ.get("LOOP_WATCHDOG_THRESHOLD", 0.25))
+    LOOP_WATCHDOG_INTERVAL = float(os.environ.get("LOOP_WATCHDOG_INTERVAL", 0.1))
+
+    # /profile (owner only): seconds between stack samples, longest allowed
+    # run (seconds), and stack frames kept per allocation in memory mode
+    PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.01))
+    PROFILE_MAX_SECONDS = int(os.environ.get("PROFILE_MAX_SECONDS", 300))
+    PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get("PROFILE_TRACEMALLOC_FRAMES", 5))
+
+    # Free-user rate limits as "<amount>/<seconds>" token buckets ("0" = unlimited); AUTH_USERS bypass them
+    # Link probes (yt-dlp -j) per user
+    PROBE_RATE_LIMIT = os.environ.get("PROBE_RATE_LIMIT", "10/60")
+    # Downloads started per user
+    DOWNLOAD_RATE_LIMIT = os.environ.get("DOWNLOAD_RATE_LIMIT", "5/300")
+    # Bytes downloaded per user : default is 8GB per hour
+    BYTES_RATE_LIMIT = os.environ.get("BYTES_RATE_LIMIT", f"{8 * 1024 ** 3}/3600")
+    # Users to keep rate-limit state for, and how long an idle user's state is kept
+    RATE_LIMIT_MAX_USERS = int(os.environ.get("RATE_LIMIT_MAX_USERS", 10000))
+    RATE_LIMIT_IDLE_TTL = int(os.environ.get("RATE_LIMIT_IDLE_TTL", 3600))
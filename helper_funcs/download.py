@@ -4,15 +4,29 @@ import asyncio
 import mimetypes
 import subprocess
 import json
+from typing import Optional
 from pyrogram import Client
 from pyrogram.errors import RPCError
+from plugins.functions.bandwidth import shaper
+from plugins.functions.fanout import fan_out
+from plugins.functions.hashing import StreamHasher, content_index, deliver_known
+from plugins.functions.thumbnail import get_thumbnail
+from plugins.functions.upload_reader import upload_source
 
 
 # -----------------------------------------------------
 # FAST ASYNC DOWNLOADER
 # -----------------------------------------------------
-async def download_file(url: str, output_folder: str = "downloads") -> str | None:
-    """Downloads a file from URL and saves it with correct extension."""
+async def download_file(
+    url: str,
+    output_folder: str = "downloads",
+    user_id: Optional[int] = None,
+    hasher: Optional[StreamHasher] = None,
+) -> Optional[str]:
+    """Downloads a file from URL and saves it with correct extension.
+
+    Every written chunk is also fed to ``hasher``, when given.
+    """
 
     os.makedirs(output_folder, exist_ok=True)
 
@@ -32,12 +46,17 @@ async def download_file(url: str, output_folder: str = "downloads") -> str | Non
                 if response.status != 200:
                     return None
 
+                downloaded = 0
                 with open(file_path, "wb") as f:
                     while True:
                         chunk = await response.content.read(1024 * 128)
                         if not chunk:
                             break
                         f.write(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        downloaded += len(chunk)
+                        await shaper.throttle(user_id, "down", len(chunk), downloaded)
 
         return file_path
 
@@ -82,7 +101,12 @@ def get_video_metadata(path: str):
 # UPLOAD AS REAL TELEGRAM STREAMABLE VIDEO
 # -----------------------------------------------------
 async def upload_file(client: Client, chat_id: int, file_path: str, caption: str = ""):
-    """Uploads a video properly with metadata so Telegram plays it internally."""
+    """Uploads a video properly with metadata so Telegram plays it internally.
+
+    Returns the sent message, or None if the upload failed.
+    """
+
+    sent = None
 
     # FORCE MP4 EXTENSION
     if not file_path.lower().endswith(".mp4"):
@@ -115,18 +139,23 @@ async def upload_file(client: Client, chat_id: int, file_path: str, caption: str
 
     # GET VIDEO METADATA (DURATION + SIZE)
     duration, width, height = get_video_metadata(final_path)
+    thumb = await get_thumbnail(chat_id, final_path)
 
     # SEND AS VIDEO
     try:
-        await client.send_video(
-            chat_id,
-            video=final_path,
-            caption=caption,
-            duration=int(duration),
-            width=width,
-            height=height,
-            supports_streaming=True
-        )
+        with upload_source(final_path) as source:
+            sent = await client.send_video(
+                chat_id,
+                video=source,
+                caption=caption,
+                duration=int(duration),
+                width=width,
+                height=height,
+                thumb=thumb,
+                supports_streaming=True,
+                progress=shaper.progress(chat_id)
+            )
+        await fan_out(client, chat_id, sent.id)
 
     except RPCError as e:
         await client.send_message(chat_id, f"⚠️ Upload failed: `{e}`")
@@ -145,13 +174,18 @@ async def upload_file(client: Client, chat_id: int, file_path: str, caption: str
         except:
             pass
 
+    return sent
+
 
 
 # -----------------------------------------------------
 # FULL PROCESS (DOWNLOAD → FIX → UPLOAD)
 # -----------------------------------------------------
 async def process_url(client: Client, chat_id: int, url: str, cancel_flag_ref: dict):
-    """Handles full process: download → convert → upload"""
+    """Handles full process: download → convert → upload
+
+    Returns the content digest of the download, or None if it failed.
+    """
 
     if cancel_flag_ref.get("cancel", False):
         cancel_flag_ref["cancel"] = False
@@ -161,12 +195,27 @@ async def process_url(client: Client, chat_id: int, url: str, cancel_flag_ref: d
     await client.send_message(chat_id, f"⬇️ Downloading:\n{url}")
 
     # DOWNLOAD
-    file_path = await download_file(url)
+    hasher = StreamHasher()
+    file_path = await download_file(url, user_id=chat_id, hasher=hasher)
 
     if not file_path:
         await client.send_message(chat_id, "❌ Download failed!")
         return
 
-    # UPLOAD
+    digest = hasher.hexdigest()
+    content_index.check_url(url, digest)
     caption = f"Uploaded:\n`{url}`"
-    await upload_file(client, chat_id, file_path, caption=caption)
\ No newline at end of file
+
+    # SAME CONTENT ALREADY ON TELEGRAM → COPY INSTEAD OF UPLOADING
+    sent = await deliver_known(client, digest, "video", chat_id, caption=caption)
+    if sent is not None:
+        os.remove(file_path)
+        await fan_out(client, chat_id, sent.id)
+        return digest
+
+    # UPLOAD
+    sent = await upload_file(client, chat_id, file_path, caption=caption)
+    if sent is None:
+        return None
+    content_index.remember(digest, "video", sent)
+    return digest
\ No newline at end of file
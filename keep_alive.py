@@ -1,15 +1,104 @@
-from flask import Flask
-import threading
+import shutil
+import logging
 
-app = Flask(__name__)
+from aiohttp import web
 
-@app.route('/')
-def home():
-    return "Bot running"
+from config import Config
+from plugins.functions.metrics import render as render_metrics
+from plugins.functions.watchdog import watchdog
 
-def run():
-    app.run(host='0.0.0.0', port=10000)
+logger = logging.getLogger(__name__)
 
-def keep_alive():
-    thread = threading.Thread(target=run)
-    thread.start()
+# Extra endpoints mounted by other modules before the server starts
+_routes = []
+# The running server, for stop_keep_alive()
+_runners = []
+
+
+def mount(method, path, handler):
+    """
+    Register an extra endpoint (diagnostics, metrics...) on the health server.
+
+    Parameters:
+    - method (str): HTTP method, e.g. "GET".
+    - path (str): URL path, e.g. "/metrics".
+    - handler: aiohttp request handler coroutine.
+    """
+    _routes.append((method, path, handler))
+
+
+def loop_lag():
+    """Most recent event-loop lag in seconds."""
+    return watchdog.lag
+
+
+def readiness(bot):
+    """
+    Evaluate every readiness check.
+
+    Parameters:
+    - bot: The running pyrogram Client.
+
+    Returns:
+    Tuple[bool, dict]: Overall readiness and the individual check results.
+    """
+    usage = shutil.disk_usage(Config.DOWNLOAD_LOCATION)
+    disk_percent = round(usage.used * 100 / usage.total, 2)
+    checks = {
+        "pyrogram_connected": bool(getattr(bot, "is_connected", False)),
+        "loop_lag": round(watchdog.lag, 4),
+        "loop_lag_ok": watchdog.lag < Config.HEALTH_MAX_LOOP_LAG,
+        "disk_used_percent": disk_percent,
+        "disk_ok": disk_percent < Config.HEALTH_MAX_DISK_USAGE,
+    }
+    ready = checks["pyrogram_connected"] and checks["loop_lag_ok"] and checks["disk_ok"]
+    return ready, checks
+
+
+async def keep_alive(bot):
+    """
+    Start the liveness/readiness HTTP server on the bot's own event loop.
+
+    Parameters:
+    - bot: The pyrogram Client whose state readiness reflects.
+    """
+
+    async def home(_request):
+        return web.Response(text="Bot running")
+
+    async def live(_request):
+        return web.json_response(
+            {"status": "ok", "loop_lag": round(watchdog.lag, 4), "loop_lag_peak": round(watchdog.peak, 4)}
+        )
+
+    async def metrics(_request):
+        return web.Response(text=render_metrics(), content_type="text/plain")
+
+    async def ready(_request):
+        is_ready, checks = readiness(bot)
+        return web.json_response(
+            {"status": "ok" if is_ready else "unavailable", **checks},
+            status=200 if is_ready else 503,
+        )
+
+    app = web.Application()
+    app.router.add_get("/", home)
+    app.router.add_get("/healthz", live)
+    app.router.add_get("/readyz", ready)
+    app.router.add_get("/metrics", metrics)
+    for method, path, handler in _routes:
+        app.router.add_route(method, path, handler)
+
+    watchdog.start()
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", Config.PORT).start()
+    _runners.append(runner)
+    logger.info("Health server listening on port %s", Config.PORT)
+
+
+async def stop_keep_alive():
+    """Shut the health server down."""
+    watchdog.stop()
+    while _runners:
+        await _runners.pop().cleanup()
@@ -0,0 +1,75 @@
+"""Owner-only commands for tuning and inspecting the running bot"""
+
+import io
+import time
+
+from pyrogram import Client, filters
+from pyrogram.types import Message
+
+from config import Config
+from plugins.functions.profiler import profile_cpu, profile_memory
+from plugins.functions.settings import live_settings
+from plugins.script import Translation
+
+
+async def _is_owner(_, __, message):
+    return (
+        bool(Config.OWNER_ID)
+        and message.from_user is not None
+        and str(message.from_user.id) == str(Config.OWNER_ID)
+    )
+
+
+owner_only = filters.create(_is_owner)
+
+
+@Client.on_message(filters.command("settings") & filters.private & owner_only)
+async def settings_cmd(_bot, message: Message):
+    args = message.command[1:]
+    if not args:
+        lines = "\n".join(f"<code>{name}</code> = <code>{value}</code>" for name, value in live_settings.items())
+        return await message.reply_text(Translation.SETTINGS_LIST.format(lines), quote=True)
+
+    name = args[0].upper()
+    if name not in live_settings:
+        return await message.reply_text(Translation.SETTINGS_UNKNOWN.format(name), quote=True)
+    if len(args) == 1:
+        return await message.reply_text(
+            Translation.SETTINGS_VALUE.format(name, live_settings.get(name)), quote=True
+        )
+
+    try:
+        name, value = await live_settings.change(name, " ".join(args[1:]))
+    except ValueError as e:
+        return await message.reply_text(Translation.SETTINGS_INVALID.format(name, e), quote=True)
+    return await message.reply_text(Translation.SETTINGS_UPDATED.format(name, value), quote=True)
+
+
+@Client.on_message(filters.command("profile") & filters.private & owner_only)
+async def profile_cmd(_bot, message: Message):
+    args = message.command[1:]
+    memory = bool(args) and args[0].lower() == "mem"
+    if memory:
+        args = args[1:]
+    try:
+        seconds = int(args[0]) if args else 30
+    except ValueError:
+        return await message.reply_text(Translation.PROFILE_USAGE, quote=True)
+    seconds = max(1, min(seconds, Config.PROFILE_MAX_SECONDS))
+
+    status = await message.reply_text(
+        Translation.PROFILE_START.format("memory" if memory else "CPU", seconds), quote=True
+    )
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if memory:
+        report = await profile_memory(seconds)
+        document = io.BytesIO(report.encode())
+        document.name = f"memory-{stamp}.txt"
+        caption = Translation.PROFILE_MEMORY_DONE.format(seconds)
+    else:
+        report, samples = await profile_cpu(seconds)
+        document = io.BytesIO(report.encode())
+        document.name = f"profile-{stamp}.folded"
+        caption = Translation.PROFILE_CPU_DONE.format(seconds, samples)
+    await message.reply_document(document, caption=caption, quote=True)
+    await status.delete()
@@ -1,13 +1,23 @@
 import logging
 import os
-import json
 import time
 import shutil
 import asyncio
 from datetime import datetime
 from config import Config
+from plugins.functions.audio import get_mp3
+from plugins.functions.bandwidth import shaper
+from plugins.functions.broker import offload_callback
 from plugins.functions.display_progress import humanbytes, progress_for_pyrogram
+from plugins.functions.fanout import fan_out
+from plugins.functions.help_Nekmo_ffmpeg import send_video_screen_shots
+from plugins.functions.help_ytdl import download_dash, fragment_args
 from plugins.functions.ran_text import random_char
+from plugins.functions.rate_limit import rate_limiter
+from plugins.functions.sessions import sessions
+from plugins.functions.splitter import split_file, upload_album
+from plugins.functions.thumbnail import get_thumbnail
+from plugins.functions.upload_reader import upload_source
 from plugins.script import Translation
 from plugins.utitles import Mdata01, Mdata02, Mdata03
 
@@ -19,25 +29,49 @@ logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
 
-async def youtube_dl_call_back(_bot, update):
+async def youtube_dl_call_back(bot, update, session=None):
+    """
+    Download the chosen format with yt-dlp and upload it.
+
+    Parameters:
+    - bot: Pyrogram client.
+    - update (CallbackQuery): The format button press.
+    - session (dict): Session already resolved (and rate-limited) by the
+      front-end, when a worker replays the press.
+
+    Returns:
+    bool: Whether the file was delivered.
+    """
     # Constants
     AD_STRING_TO_REPLACE = "please report this issue on https://github.com/kalanakt/All-Url-Uploader/issues"
 
     cb_data = update.data
-    tg_send_type, youtube_dl_format, youtube_dl_ext, ranom = cb_data.split("|")
+    token, choice = cb_data.split("|")
     print(cb_data)
     random1 = random_char(5)
-    save_ytdl_json_path = (
-        Config.DOWNLOAD_LOCATION + "/" + str(update.from_user.id) + f"{ranom}" + ".json"
-    )
 
-    try:
-        with open(save_ytdl_json_path, "r", encoding="utf8") as f:
-            response_json = json.load(f)
-    except FileNotFoundError as e:
-        await update.message.edit(f"Error: {e}")
+    response_json = session or sessions.get(token)
+    if response_json is None:
+        await update.message.edit(Translation.SESSION_EXPIRED)
         await update.message.delete()
         return False
+    tg_send_type, youtube_dl_format, youtube_dl_ext = response_json["choices"][int(choice)]
+
+    if session is None:
+        retry_after = rate_limiter.retry_after(
+            update.from_user.id, "bytes"
+        ) or rate_limiter.check(update.from_user.id, "download")
+        if retry_after:
+            await update.answer(
+                Translation.FREE_USER_LIMIT_Q_SZE.format(round(retry_after)),
+                show_alert=True,
+            )
+            return False
+
+        if Config.BOT_MODE == "frontend":
+            await offload_callback(update, response_json)
+            await update.answer(Translation.QUEUED_FOR_WORKER)
+            return True
 
     youtube_dl_url = update.message.reply_to_message.text
     custom_file_name = (
@@ -93,7 +127,7 @@ async def youtube_dl_call_back(_bot, update):
     )
     description = Translation.CUSTOM_CAPTION_UL_FILE
 
-    if "fulltitle" in response_json:
+    if response_json.get("fulltitle"):
         description = response_json["fulltitle"][:1021]
 
     tmp_directory_for_each_user = (
@@ -106,6 +140,10 @@ async def youtube_dl_call_back(_bot, update):
     download_directory = f"{tmp_directory_for_each_user}/{custom_file_name}"
 
     command_to_exec = []
+    # Oversized videos and documents are split after downloading instead of refused
+    size_guard = ["--max-filesize", str(Config.TG_MAX_FILE_SIZE)]
+    if Config.SPLIT_OVERSIZE and tg_send_type != "audio":
+        size_guard = []
 
     if tg_send_type == "audio":
         command_to_exec = [
@@ -125,13 +163,12 @@ async def youtube_dl_call_back(_bot, update):
         ]
     else:
         minus_f_format = youtube_dl_format
-        if "youtu" in youtube_dl_url:
+        if "youtu" in youtube_dl_url and "+" not in youtube_dl_format:
             minus_f_format = f"{youtube_dl_format}+bestaudio"
         command_to_exec = [
             "yt-dlp",
             "-c",
-            "--max-filesize",
-            str(Config.TG_MAX_FILE_SIZE),
+            *size_guard,
             "--embed-subs",
             "-f",
             minus_f_format,
@@ -140,30 +177,62 @@ async def youtube_dl_call_back(_bot, update):
             "-o",
             download_directory,
         ]
+    command_to_exec.extend(fragment_args())
 
+    extra_args = []
     if Config.HTTP_PROXY != "":
-        command_to_exec.extend(["--proxy", Config.HTTP_PROXY])
+        extra_args.extend(["--proxy", Config.HTTP_PROXY])
 
     if youtube_dl_username is not None:
-        command_to_exec.extend(["--username", youtube_dl_username])
+        extra_args.extend(["--username", youtube_dl_username])
 
     if youtube_dl_password is not None:
-        command_to_exec.extend(["--password", youtube_dl_password])
+        extra_args.extend(["--password", youtube_dl_password])
 
+    command_to_exec.extend(extra_args)
     command_to_exec.extend(["--no-warnings"])
 
     logger.info(command_to_exec)
     start = datetime.now()
 
-    process = await asyncio.create_subprocess_exec(
-        *command_to_exec,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
+    if tg_send_type == "audio" and youtube_dl_ext == "mp3":
+        # Shared source download and one-decode bitrate ladder, cached across taps
+        try:
+            await get_mp3(
+                youtube_dl_url,
+                youtube_dl_format,
+                download_directory,
+                ["--max-filesize", str(Config.TG_MAX_FILE_SIZE), *extra_args],
+            )
+        except RuntimeError as e:
+            await update.message.edit_caption(caption=str(e)[:1000])
+            return False
+        e_response, t_response = "", download_directory
+    elif tg_send_type != "audio" and "+" in minus_f_format:
+        # Separate video and audio tracks: fetch both at once, then mux
+        video_format, audio_format = minus_f_format.split("+", 1)
+        try:
+            download_directory = await download_dash(
+                youtube_dl_url,
+                video_format,
+                audio_format,
+                download_directory,
+                [*size_guard, *extra_args],
+            )
+        except RuntimeError as e:
+            await update.message.edit_caption(caption=str(e)[:1000])
+            return False
+        e_response, t_response = "", download_directory
+    else:
+        process = await asyncio.create_subprocess_exec(
+            *command_to_exec,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
 
-    stdout, stderr = await process.communicate()
-    e_response = stderr.decode().strip()
-    t_response = stdout.decode().strip()
+        stdout, stderr = await process.communicate()
+        e_response = stderr.decode().strip()
+        t_response = stdout.decode().strip()
 
     logger.info(e_response)
     logger.info(t_response)
@@ -175,10 +244,6 @@ async def youtube_dl_call_back(_bot, update):
 
     if t_response:
         logger.info(t_response)
-        try:
-            os.remove(save_ytdl_json_path)
-        except FileNotFoundError:
-            pass
 
         end_one = datetime.now()
         time_taken_for_download = (end_one - start).seconds
@@ -189,11 +254,34 @@ async def youtube_dl_call_back(_bot, update):
         except FileNotFoundError:
             download_directory = os.path.splitext(download_directory)[0] + "." + "mkv"
             file_size = os.stat(download_directory).st_size
-
-        download_location = f"{Config.DOWNLOAD_LOCATION}/{update.from_user.id}.jpg"
-        thumb = download_location if os.path.isfile(download_location) else None
-
-        if file_size > Config.TG_MAX_FILE_SIZE:
+        rate_limiter.charge(update.from_user.id, "bytes", file_size)
+
+        if file_size > Config.TG_MAX_FILE_SIZE and not size_guard:
+            try:
+                # A failed split removes its own parts; the rest goes with the directory
+                parts, playable = await split_file(download_directory, is_video=tg_send_type == "video")
+                await update.message.edit_caption(
+                    caption=Translation.UPLOAD_PARTS_START.format(len(parts))
+                )
+                album_ids = await upload_album(
+                    bot,
+                    update.message.chat.id,
+                    parts,
+                    caption=description,
+                    is_video=tg_send_type == "video" and playable,
+                    reply_to_message_id=update.message.reply_to_message.id,
+                )
+            finally:
+                shutil.rmtree(tmp_directory_for_each_user)
+            await update.message.edit_caption(
+                caption=Translation.AFTER_SUCCESSFUL_UPLOAD_MSG_WITH_TS.format(
+                    time_taken_for_download, (datetime.now() - end_one).seconds
+                )
+            )
+            for album_id in album_ids:
+                await fan_out(bot, update.message.chat.id, album_id, media_group=len(parts) > 1)
+            return True
+        elif file_size > Config.TG_MAX_FILE_SIZE:
             await update.message.edit_caption(
                 caption=Translation.RCHD_TG_API_LIMIT.format(
                     time_taken_for_download, humanbytes(file_size)
@@ -204,68 +292,75 @@ async def youtube_dl_call_back(_bot, update):
                 caption=Translation.UPLOAD_START.format(custom_file_name)
             )
 
+            thumb = await get_thumbnail(
+                update.from_user.id,
+                download_directory if tg_send_type in ("video", "vm") else None,
+            )
             start_time = time.time()
 
-            if tg_send_type == "video":
-                width, height, duration = await Mdata01(download_directory)
-                await update.message.reply_video(
-                    video=download_directory,
-                    caption=description,
-                    duration=duration,
-                    width=width,
-                    height=height,
-                    supports_streaming=True,
-                    thumb=thumb,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
-                )
-            elif tg_send_type == "audio":
-                duration = await Mdata03(download_directory)
-                await update.message.reply_audio(
-                    audio=download_directory,
-                    caption=description,
-                    duration=duration,
-                    thumb=thumb,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
-                )
-            elif tg_send_type == "vm":
-                width, duration = await Mdata02(download_directory)
-                await update.message.reply_video_note(
-                    video_note=download_directory,
-                    duration=duration,
-                    length=width,
-                    thumb=thumb,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
-                )
-            else:
-                await update.message.reply_document(
-                    document=download_directory,
-                    caption=description,
-                    thumb=thumb,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
-                )
+            with upload_source(download_directory) as source:
+                if tg_send_type == "video":
+                    width, height, duration = await Mdata01(download_directory)
+                    sent = await update.message.reply_video(
+                        video=source,
+                        caption=description,
+                        duration=duration,
+                        width=width,
+                        height=height,
+                        supports_streaming=True,
+                        thumb=thumb,
+                        progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                        ),
+                    )
+                elif tg_send_type == "audio":
+                    duration = await Mdata03(download_directory)
+                    sent = await update.message.reply_audio(
+                        audio=source,
+                        caption=description,
+                        duration=duration,
+                        thumb=thumb,
+                        progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                        ),
+                    )
+                elif tg_send_type == "vm":
+                    width, duration = await Mdata02(download_directory)
+                    sent = await update.message.reply_video_note(
+                        video_note=source,
+                        duration=duration,
+                        length=width,
+                        thumb=thumb,
+                        progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                        ),
+                    )
+                else:
+                    sent = await update.message.reply_document(
+                        document=source,
+                        caption=description,
+                        thumb=thumb,
+                        progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                        ),
+                    )
 
             end_two = datetime.now()
             time_taken_for_upload = (end_two - end_one).seconds
+            if tg_send_type == "video":
+                await send_video_screen_shots(bot, download_directory, sent)
 
             shutil.rmtree(tmp_directory_for_each_user)
 
@@ -277,3 +372,7 @@ async def youtube_dl_call_back(_bot, update):
 
             logger.info("Downloaded in: %s", str(time_taken_for_download))
             logger.info("Uploaded in: %s", str(time_taken_for_upload))
+
+            await fan_out(bot, sent.chat.id, sent.id)
+            return True
+    return False
@@ -4,6 +4,7 @@ import logging
 from pyrogram import Client
 from plugins.dl_button import ddl_call_back
 from plugins.button import youtube_dl_call_back
+from plugins.playlist import playlist_call_back
 from plugins.script import Translation
 
 # Set up logging configuration
@@ -33,6 +34,8 @@ async def button(bot, update):
             reply_markup=Translation.ABOUT_BUTTONS,
             # disable_web_page_preview=True
         )
+    elif update.data.startswith("pl:"):
+        await playlist_call_back(bot, update)
     elif "close" in update.data:
         await update.message.delete(True)
     elif "|" in update.data:
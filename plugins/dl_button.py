@@ -1,16 +1,28 @@
 """Module for handling download callback and related functions"""
 
 import asyncio
+import contextlib
 from datetime import datetime
 import logging
 import os
 import time
 import aiohttp
+from plugins.functions.bandwidth import shaper
+from plugins.functions.broker import offload_callback
 from plugins.functions.display_progress import (
     progress_for_pyrogram,
     humanbytes,
     TimeFormatter,
 )
+from plugins.functions.fanout import fan_out
+from plugins.functions.help_Nekmo_ffmpeg import send_video_screen_shots
+from plugins.functions.governor import rpc_priority
+from plugins.functions.hashing import StreamHasher, content_index, deliver_known
+from plugins.functions.inspector import inspect
+from plugins.functions.rate_limit import rate_limiter
+from plugins.functions.splitter import open_split_sink, probe_duration, upload_album
+from plugins.functions.thumbnail import get_thumbnail
+from plugins.functions.upload_reader import upload_source
 from plugins.script import Translation
 from plugins.utitles import Mdata01, Mdata02, Mdata03
 from config import Config
@@ -22,9 +34,37 @@ logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
 
-async def ddl_call_back(bot, update):
+async def ddl_call_back(bot, update, replayed=False):
+    """
+    Download a direct link and upload it in the chosen form.
+
+    Parameters:
+    - bot: Pyrogram client.
+    - update (CallbackQuery): The button press.
+    - replayed (bool): A worker is replaying a press the front-end already
+      rate-limited and queued.
+
+    Returns:
+    bool: Whether the file was delivered.
+    """
     cb_data = update.data
     tg_send_type, youtube_dl_format, youtube_dl_ext = cb_data.split("=")
+    if not replayed:
+        retry_after = rate_limiter.retry_after(
+            update.from_user.id, "bytes"
+        ) or rate_limiter.check(update.from_user.id, "download")
+        if retry_after:
+            await update.answer(
+                Translation.FREE_USER_LIMIT_Q_SZE.format(round(retry_after)),
+                show_alert=True,
+            )
+            return False
+
+        if Config.BOT_MODE == "frontend":
+            await offload_callback(update)
+            await update.answer(Translation.QUEUED_FOR_WORKER)
+            return True
+
     youtube_dl_url = update.message.reply_to_message.text
     custom_file_name = os.path.basename(youtube_dl_url)
 
@@ -79,10 +119,11 @@ async def ddl_call_back(bot, update):
 
     download_directory = f"{tmp_directory_for_each_user}/{custom_file_name}"
 
+    hasher = StreamHasher()
     async with aiohttp.ClientSession() as session:
         c_time = time.time()
         try:
-            await download_coroutine(
+            split = await download_coroutine(
                 bot,
                 session,
                 youtube_dl_url,
@@ -90,6 +131,7 @@ async def ddl_call_back(bot, update):
                 update.message.chat.id,
                 update.message.id,
                 c_time,
+                hasher,
             )
 
         except asyncio.TimeoutError:
@@ -99,14 +141,50 @@ async def ddl_call_back(bot, update):
                 message_id=update.message.id,
             )
             return False
+        except RuntimeError as e:
+            # Splitting an oversized download failed
+            await bot.edit_message_text(
+                text=Translation.SPLIT_FAILED.format(str(e)[:500]),
+                chat_id=update.message.chat.id,
+                message_id=update.message.id,
+            )
+            return False
 
-    if os.path.exists(download_directory):
+    if split:
+        parts = split.parts
+        await bot.edit_message_text(
+            text=Translation.UPLOAD_PARTS_START.format(len(parts)),
+            chat_id=update.message.chat.id,
+            message_id=update.message.id,
+        )
+        end_one = datetime.now()
+        try:
+            album_ids = await upload_album(
+                bot,
+                update.message.chat.id,
+                parts,
+                caption=description,
+                is_video=tg_send_type == "video" and split.playable,
+                reply_to_message_id=update.message.reply_to_message.id,
+            )
+        finally:
+            for part in parts:
+                os.remove(part)
+        await bot.edit_message_text(
+            text=Translation.AFTER_SUCCESSFUL_UPLOAD_MSG_WITH_TS.format(
+                (end_one - start).seconds, (datetime.now() - end_one).seconds
+            ),
+            chat_id=update.message.chat.id,
+            message_id=update.message.id,
+            disable_web_page_preview=True,
+        )
+        for album_id in album_ids:
+            await fan_out(bot, update.message.chat.id, album_id, media_group=len(parts) > 1)
+        return True
+    elif os.path.exists(download_directory):
         save_ytdl_json_path = (
             f"{Config.DOWNLOAD_LOCATION}/{str(update.message.chat.id)}.json"
         )
-        download_location = f"{Config.DOWNLOAD_LOCATION}/{update.from_user.id}.jpg"
-        thumb = download_location if os.path.isfile(download_location) else None
-
         if os.path.exists(save_ytdl_json_path):
             os.remove(save_ytdl_json_path)
 
@@ -125,6 +203,7 @@ async def ddl_call_back(bot, update):
         except FileNotFoundError:
             download_directory = f"{os.path.splitext(download_directory)[0]}.mkv"
             file_size = os.stat(download_directory).st_size
+        rate_limiter.charge(update.from_user.id, "bytes", file_size)
 
         if file_size > Config.TG_MAX_FILE_SIZE:
             await bot.edit_message_text(
@@ -134,78 +213,99 @@ async def ddl_call_back(bot, update):
             )
 
         else:
-            start_time = time.time()
-
-            if tg_send_type == "video":
-                width, height, duration = await Mdata01(download_directory)
-                await bot.send_video(
-                    chat_id=update.message.chat.id,
-                    video=download_directory,
-                    thumb=thumb,
-                    caption=description,
-                    duration=duration,
-                    width=width,
-                    height=height,
-                    supports_streaming=True,
-                    reply_to_message_id=update.message.reply_to_message.id,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
+            digest = hasher.hexdigest()
+            content_index.check_url(youtube_dl_url, digest)
+            # Content uploaded before (by anyone) is copied, not uploaded again
+            sent = await deliver_known(
+                bot,
+                digest,
+                tg_send_type,
+                update.message.chat.id,
+                caption=description,
+                reply_to_message_id=update.message.reply_to_message.id,
+            )
+            if sent is None:
+                thumb = await get_thumbnail(
+                    update.from_user.id,
+                    download_directory if tg_send_type in ("video", "vm") else None,
                 )
+                start_time = time.time()
+
+                with upload_source(download_directory) as source:
+                    if tg_send_type == "video":
+                        width, height, duration = await Mdata01(download_directory)
+                        sent = await bot.send_video(
+                            chat_id=update.message.chat.id,
+                            video=source,
+                            thumb=thumb,
+                            caption=description,
+                            duration=duration,
+                            width=width,
+                            height=height,
+                            supports_streaming=True,
+                            reply_to_message_id=update.message.reply_to_message.id,
+                            progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                            progress_args=(
+                                Translation.UPLOAD_START,
+                                update.message,
+                                start_time,
+                            ),
+                        )
 
-            elif tg_send_type == "audio":
-                duration = await Mdata03(download_directory)
-                await bot.send_audio(
-                    chat_id=update.message.chat.id,
-                    audio=download_directory,
-                    thumb=thumb,
-                    caption=description,
-                    duration=duration,
-                    reply_to_message_id=update.message.reply_to_message.id,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
-                )
+                    elif tg_send_type == "audio":
+                        duration = await Mdata03(download_directory)
+                        sent = await bot.send_audio(
+                            chat_id=update.message.chat.id,
+                            audio=source,
+                            thumb=thumb,
+                            caption=description,
+                            duration=duration,
+                            reply_to_message_id=update.message.reply_to_message.id,
+                            progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                            progress_args=(
+                                Translation.UPLOAD_START,
+                                update.message,
+                                start_time,
+                            ),
+                        )
 
-            elif tg_send_type == "vm":
-                width, duration = await Mdata02(download_directory)
-                await bot.send_video_note(
-                    chat_id=update.message.chat.id,
-                    video_note=download_directory,
-                    thumb=thumb,
-                    duration=duration,
-                    length=width,
-                    reply_to_message_id=update.message.reply_to_message.id,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
-                )
+                    elif tg_send_type == "vm":
+                        width, duration = await Mdata02(download_directory)
+                        sent = await bot.send_video_note(
+                            chat_id=update.message.chat.id,
+                            video_note=source,
+                            thumb=thumb,
+                            duration=duration,
+                            length=width,
+                            reply_to_message_id=update.message.reply_to_message.id,
+                            progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                            progress_args=(
+                                Translation.UPLOAD_START,
+                                update.message,
+                                start_time,
+                            ),
+                        )
 
-            else:
-                await bot.send_document(
-                    chat_id=update.message.chat.id,
-                    document=download_directory,
-                    thumb=thumb,
-                    caption=description,
-                    reply_to_message_id=update.message.reply_to_message.id,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time,
-                    ),
-                )
+                    else:
+                        sent = await bot.send_document(
+                            chat_id=update.message.chat.id,
+                            document=source,
+                            thumb=thumb,
+                            caption=description,
+                            reply_to_message_id=update.message.reply_to_message.id,
+                            progress=shaper.progress(update.from_user.id, progress_for_pyrogram),
+                            progress_args=(
+                                Translation.UPLOAD_START,
+                                update.message,
+                                start_time,
+                            ),
+                        )
+
+                content_index.remember(digest, tg_send_type, sent)
 
             end_two = datetime.now()
+            if tg_send_type == "video":
+                await send_video_screen_shots(bot, download_directory, sent)
 
             try:
                 os.remove(download_directory)
@@ -226,6 +326,9 @@ async def ddl_call_back(bot, update):
 
             logger.info("Downloaded in: %s", str(time_taken_for_download))
             logger.info("Uploaded in: %s", str(time_taken_for_upload))
+
+            await fan_out(bot, sent.chat.id, sent.id)
+            return True
     else:
         await bot.edit_message_text(
             text=Translation.NO_VOID_FORMAT_FOUND.format("Incorrect Link"),
@@ -233,62 +336,97 @@ async def ddl_call_back(bot, update):
             message_id=update.message.id,
             disable_web_page_preview=True,
         )
+    return False
 
 
-async def download_coroutine(bot, session, url, file_name, chat_id, message_id, start):
+async def download_coroutine(bot, session, url, file_name, chat_id, message_id, start, hasher=None):
     downloaded = 0
     display_message = ""
 
-    async with session.get(url, timeout=Config.PROCESS_MAX_TIMEOUT) as response:
-        total_length = int(response.headers["Content-Length"])
-        content_type = response.headers["Content-Type"]
+    # Usually cached from the pre-flight; gives the size even when the GET omits it
+    resource = await inspect(url, session)
+    async with session.get(resource.final_url, timeout=Config.PROCESS_MAX_TIMEOUT) as response:
+        total_length = resource.size
+        if total_length is None and response.headers.get("Content-Length"):
+            total_length = int(response.headers["Content-Length"])
+        content_type = response.headers.get("Content-Type", resource.content_type)
 
-        if "text" in content_type and total_length < 500:
+        if "text" in content_type and (total_length or 0) < 500:
             return await response.release()
 
-        with open(file_name, "wb") as f_handle:
-            while True:
-                chunk = await response.content.read(Config.CHUNK_SIZE)
-
-                if not chunk:
-                    break
-
-                f_handle.write(chunk)
-                downloaded += Config.CHUNK_SIZE
-                now = time.time()
-                diff = now - start
-
-                if round(diff % 5.0) == 0 or downloaded == total_length:
-                    percentage = downloaded * 100 / total_length
-                    speed = downloaded / diff
-                    elapsed_time = round(diff) * 1000
-                    time_to_completion = (
-                        round((total_length - downloaded) / speed) * 1000
-                    )
-                    estimated_total_time = elapsed_time + time_to_completion
-
-                    try:
-                        current_message = """**Download Status**
+        sink = None
+        split = Config.SPLIT_OVERSIZE and total_length and total_length > Config.TG_MAX_FILE_SIZE
+        if split:
+            # Split while downloading instead of failing after the whole transfer
+            is_video = content_type.startswith("video/")
+            duration = await probe_duration(resource.final_url) if is_video else None
+
+        try:
+            with contextlib.nullcontext() if split else open(file_name, "wb") as f_handle:
+                while True:
+                    chunk = await response.content.read(Config.CHUNK_SIZE)
+
+                    if not chunk:
+                        break
+
+                    if split:
+                        if sink is None:
+                            # The first chunk tells whether ffmpeg can read the stream from a pipe
+                            sink = await open_split_sink(file_name, total_length, duration, is_video, chunk)
+                        await sink.write(chunk)
+                    else:
+                        f_handle.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    downloaded += len(chunk)
+                    await shaper.throttle(chat_id, "down", len(chunk), downloaded)
+                    now = time.time()
+                    diff = now - start
+
+                    if round(diff % 5.0) == 0 or downloaded == total_length:
+                        if total_length:
+                            percentage = downloaded * 100 / total_length
+                            speed = downloaded / diff
+                            elapsed_time = round(diff) * 1000
+                            time_to_completion = (
+                                round((total_length - downloaded) / speed) * 1000
+                            )
+                            eta = TimeFormatter(elapsed_time + time_to_completion)
+                        else:
+                            # Server did not send a length: report bytes only
+                            percentage, eta = "?", "?"
+
+                        try:
+                            current_message = """**Download Status**
 Percentage : {}
 URL: {}
 File Size: {}
 Downloaded: {}
 ETA: {}""".format(
-                            percentage,
-                            url,
-                            humanbytes(total_length),
-                            humanbytes(downloaded),
-                            TimeFormatter(estimated_total_time),
-                        )
-
-                        if current_message != display_message:
-                            await bot.edit_message_text(
-                                chat_id, message_id, text=current_message
+                                percentage,
+                                url,
+                                humanbytes(total_length) if total_length else "?",
+                                humanbytes(downloaded),
+                                eta,
                             )
 
-                            display_message = current_message
-
-                    except Exception as e:
-                        logger.info(str(e))
-
-        return await response.release()
+                            if current_message != display_message:
+                                with rpc_priority("progress"):
+                                    await bot.edit_message_text(
+                                        chat_id, message_id, text=current_message
+                                    )
+
+                                display_message = current_message
+
+                        except Exception as e:
+                            logger.info(str(e))
+
+            await response.release()
+            if sink:
+                await sink.close()
+        except BaseException:
+            # Stop ffmpeg and drop the parts of a download that did not finish
+            if sink is not None:
+                await asyncio.shield(sink.abort())
+            raise
+        return sink
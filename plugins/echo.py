@@ -1,16 +1,19 @@
 import time
-import json
 import asyncio
 import logging
+import contextlib
 
 from pyrogram.types import Thumbnail
 from pyrogram import Client, filters
+from pyrogram.errors import RPCError
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from config import Config
 from plugins.script import Translation
-from plugins.functions.ran_text import random_char
 from plugins.functions.display_progress import humanbytes
+from plugins.functions.playlist import POLICIES, probe_command
+from plugins.functions.probe import JSON_LINE_LIMIT, iter_probe_records
+from plugins.functions.rate_limit import rate_limiter
+from plugins.functions.sessions import sessions
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -19,6 +22,45 @@ logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
 
+async def offer_playlist(bot, update, chk, records, url, username=None, password=None):
+    """
+    Ask once for a format policy that is applied to every entry of a playlist.
+
+    Parameters:
+    - records (List[ProbeRecord]): What yt-dlp printed, one record per entry.
+    - url (str): Playlist URL, for the title fallback.
+    """
+    entries = [
+        (record.url, record.title or record.id or record.url)
+        for record in records
+        if record.url is not None
+    ]
+    title = records[0].playlist_title or url
+    token = sessions.put(
+        {"title": title, "entries": entries},
+        private={"username": username, "password": password},
+    )
+    keys = list(POLICIES)
+    rows = [keys[i: i + 2] for i in range(0, len(keys), 2)]
+    reply_markup = InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(POLICIES[key][0], callback_data=f"pl:{token}:{key}")
+                for key in row
+            ]
+            for row in rows
+        ]
+        + [[InlineKeyboardButton("⛔ ᴄʟᴏsᴇ", callback_data="close")]]
+    )
+    await chk.delete()
+    await bot.send_message(
+        chat_id=update.chat.id,
+        text=Translation.PLAYLIST_SELECTION.format(title, len(entries)),
+        reply_markup=reply_markup,
+        reply_to_message_id=update.id,
+    )
+
+
 @Client.on_message(filters.private & filters.regex(pattern=".*http.*"))
 async def echo(bot, update):
     logger.info(update.from_user)
@@ -78,24 +120,7 @@ async def echo(bot, update):
                 o = entity.offset
                 length = entity.length
                 url = url[o: o + length]
-    if Config.HTTP_PROXY != "":
-        command_to_exec = [
-            "yt-dlp",
-            "--no-warnings",
-            "--allow-dynamic-mpd",
-            "-j",
-            url,
-            "--proxy",
-            Config.HTTP_PROXY,
-        ]
-    else:
-        command_to_exec = ["yt-dlp", "--no-warnings", "--allow-dynamic-mpd", "-j", url]
-    if youtube_dl_username is not None:
-        command_to_exec.append("--username")
-        command_to_exec.append(youtube_dl_username)
-    if youtube_dl_password is not None:
-        command_to_exec.append("--password")
-        command_to_exec.append(youtube_dl_password)
+    command_to_exec = probe_command(url, youtube_dl_username, youtube_dl_password)
     logger.info(command_to_exec)
     chk = await bot.send_message(
         chat_id=update.chat.id,
@@ -103,41 +128,54 @@ async def echo(bot, update):
         disable_web_page_preview=True,
         reply_to_message_id=update.id,
     )
-    if update.from_user.id not in Config.AUTH_USERS:
-
-        if str(update.from_user.id) in Config.ADL_BOT_RQ:
-            current_time = time.time()
-            previous_time = Config.ADL_BOT_RQ[str(update.from_user.id)]
-            process_max_timeout = round(Config.PROCESS_MAX_TIMEOUT / 60)
-            present_time = round(
-                Config.PROCESS_MAX_TIMEOUT - (current_time - previous_time)
-            )
-            Config.ADL_BOT_RQ[str(update.from_user.id)] = time.time()
-            if round(current_time - previous_time) < Config.PROCESS_MAX_TIMEOUT:
-                await bot.edit_message_text(
-                    chat_id=update.chat.id,
-                    text=Translation.FREE_USER_LIMIT_Q_SZE.format(
-                        process_max_timeout, present_time
-                    ),
-                    disable_web_page_preview=True,
-                    message_id=chk.id,
-                )
-                return
-        else:
-            Config.ADL_BOT_RQ[str(update.from_user.id)] = time.time()
+    retry_after = rate_limiter.check(update.from_user.id, "probe")
+    if retry_after:
+        await bot.edit_message_text(
+            chat_id=update.chat.id,
+            text=Translation.FREE_USER_LIMIT_Q_SZE.format(round(retry_after)),
+            disable_web_page_preview=True,
+            message_id=chk.id,
+        )
+        return
 
     process = await asyncio.create_subprocess_exec(
         *command_to_exec,
         # stdout must a pipe to be accessible as process.stdout
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        limit=JSON_LINE_LIMIT,
     )
-    # Wait for the subprocess to finish
-    stdout, stderr = await process.communicate()
+    # Drain stderr alongside stdout so neither pipe can fill up and stall yt-dlp
+    stderr_task = asyncio.create_task(process.stderr.read())
+    # Playlists are listed flat, one line per entry, as yt-dlp extracts them
+    records = []
+    last_shown = time.monotonic()
+    try:
+        async for record in iter_probe_records(process.stdout):
+            records.append(record)
+            if len(records) > 1 and time.monotonic() - last_shown > 3:
+                last_shown = time.monotonic()
+                await chk.edit_text(Translation.PLAYLIST_SCANNING.format(len(records)))
+        stderr = await stderr_task
+    except Exception:
+        with contextlib.suppress(RPCError):
+            await chk.delete()
+        raise
+    finally:
+        if process.returncode is None and not stderr_task.done():
+            # Stopped early: end yt-dlp instead of leaving it running
+            with contextlib.suppress(ProcessLookupError):
+                process.kill()
+        # Reading what is left lets the pipes close, so wait() returns
+        await asyncio.gather(
+            process.stdout.read(), stderr_task, process.wait(), return_exceptions=True
+        )
     e_response = stderr.decode().strip()
     logger.info(e_response)
-    t_response = stdout.decode().strip()
-    # logger.info(t_response)
+    if len(records) > 1 or (records and records[0].is_flat_entry):
+        return await offer_playlist(
+            bot, update, chk, records, url, youtube_dl_username, youtube_dl_password
+        )
     # https://github.com/rg3/youtube-dl/issues/2630#issuecomment-38635239
     if e_response and "nonnumeric port" not in e_response:
         # logger.warn("Status : FAIL", exc.returncode, exc.output)
@@ -152,7 +190,7 @@ async def echo(bot, update):
             error_message += Translation.SET_CUSTOM_USERNAME_PASSWORD
         await chk.delete()
 
-        time.sleep(40.5)
+        await asyncio.sleep(40.5)
         await bot.send_message(
             chat_id=update.chat.id,
             text=Translation.NO_VOID_FORMAT_FOUND.format(str(error_message)),
@@ -160,120 +198,72 @@ async def echo(bot, update):
             disable_web_page_preview=True,
         )
         return False
-    if t_response:
-        # logger.info(t_response)
-        x_reponse = t_response
-        if "\n" in x_reponse:
-            x_reponse, _ = x_reponse.split("\n")
-        response_json = json.loads(x_reponse)
-        randem = random_char(5)
-        save_ytdl_json_path = (
-            Config.DOWNLOAD_LOCATION
-            + "/"
-            + str(update.from_user.id)
-            + f"{randem}"
-            + ".json"
-        )
-        with open(save_ytdl_json_path, "w", encoding="utf8") as outfile:
-            json.dump(response_json, outfile, ensure_ascii=False)
-        # logger.info(response_json)
-        inline_keyboard = []
-        duration = None
-        if "duration" in response_json:
-            duration = response_json["duration"]
-        if "formats" in response_json:
-            for formats in response_json["formats"]:
-                format_id = formats.get("format_id")
-                format_string = formats.get("format_note")
-                if format_string is None:
-                    format_string = formats.get("format")
-                if "DASH" in format_string.upper():
-                    continue
+    if records:
+        record = records[0]
+        # Keyboard rows of (label, choice index or literal callback_data); the
+        # choices themselves go into the session so callback_data stays short
+        rows = []
+        choices = []
 
-                format_ext = formats.get("ext")
+        def choice(send_type, format_id, format_ext):
+            choices.append((send_type, format_id, format_ext))
+            return len(choices) - 1
 
-                if formats.get("filesize"):
-                    size = formats["filesize"]
-                elif formats.get("filesize_approx"):
-                    size = formats["filesize_approx"]
-                else:
-                    size = 0
+        duration = record.duration
+        if record.formats is not None:
+            for fmt in record.formats:
+                format_id = fmt.format_id
+                format_string = fmt.label
+                # Audio-only tracks are covered by the MP3 buttons
+                if fmt.vcodec == "none":
+                    continue
+                # Video-only (DASH) tracks get their audio fetched alongside
+                if fmt.acodec == "none":
+                    format_id = f"{format_id}+bestaudio"
 
-                cb_string_video = f"video |{format_id}|{format_ext}|{randem}"
-                cb_string_file = f"fille |{format_id}|{format_ext}|{randem}"
+                format_ext = fmt.ext
+                size = fmt.size
 
                 if format_string is not None and not ("audio only" in format_string):
-                    ikeyboard = [
-                        InlineKeyboardButton(
-                            "🎬 "
-                            + format_string
-                            + " "
-                            + format_ext
-                            + " "
-                            + humanbytes(size)
-                            + " ",
-                            callback_data=(cb_string_video).encode("UTF-8"),
-                        )
-                    ]
+                    label = "🎬 " + format_string + " " + format_ext + " " + humanbytes(size) + " "
                 else:
                     # special weird case :\
-                    ikeyboard = [
-                        InlineKeyboardButton(
-                            "🎬 [" + "] ( " + humanbytes(size) + " )",
-                            callback_data=(cb_string_video).encode("UTF-8"),
-                        )
-                    ]
-                inline_keyboard.append(ikeyboard)
+                    label = "🎬 [" + "] ( " + humanbytes(size) + " )"
+                rows.append([(label, choice("video", format_id, format_ext))])
             if duration is not None:
-                cb_string_64 = "{}|{}|{}|{}".format("audio", "64k", "mp3", randem)
-                cb_string_128 = "{}|{}|{}|{}".format("audio", "128k", "mp3", randem)
-                cb_string = "{}|{}|{}|{}".format("audio", "320k", "mp3", randem)
-                inline_keyboard.append(
+                rows.append(
                     [
-                        InlineKeyboardButton(
-                            "🎼 ᴍᴘ𝟹 " + "(" + "64 ᴋʙᴘs" + ")",
-                            callback_data=cb_string_64.encode("UTF-8"),
-                        ),
-                        InlineKeyboardButton(
-                            "🎼 ᴍᴘ𝟹 " + "(" + "128 ᴋʙᴘs" + ")",
-                            callback_data=cb_string_128.encode("UTF-8"),
-                        ),
+                        ("🎼 ᴍᴘ𝟹 " + "(" + "64 ᴋʙᴘs" + ")", choice("audio", "64k", "mp3")),
+                        ("🎼 ᴍᴘ𝟹 " + "(" + "128 ᴋʙᴘs" + ")", choice("audio", "128k", "mp3")),
                     ]
                 )
-                inline_keyboard.append(
-                    [
-                        InlineKeyboardButton(
-                            "🎼 ᴍᴘ𝟹 " + "(" + "320 ᴋʙᴘs" + ")",
-                            callback_data=cb_string.encode("UTF-8"),
-                        )
-                    ]
-                )
-                inline_keyboard.append(
-                    [InlineKeyboardButton("⛔ ᴄʟᴏsᴇ", callback_data="close")]
-                )
+                rows.append([("🎼 ᴍᴘ𝟹 " + "(" + "320 ᴋʙᴘs" + ")", choice("audio", "320k", "mp3"))])
+                rows.append([("⛔ ᴄʟᴏsᴇ", "close")])
         else:
-            format_id = response_json["format_id"]
-            format_ext = response_json["ext"]
-            cb_string_file = "{}|{}|{}|{}".format("file", format_id, format_ext, randem)
-            cb_string_video = "{}|{}|{}|{}".format(
-                "video", format_id, format_ext, randem
-            )
-            inline_keyboard.append(
-                [
-                    InlineKeyboardButton(
-                        "🎬 Video", callback_data=(cb_string_video).encode("UTF-8")
-                    )
-                ]
-            )
-            cb_string_file = "{}={}={}".format("file", format_id, format_ext)
-            cb_string_video = "{}={}={}".format("video", format_id, format_ext)
-            inline_keyboard.append(
-                [
-                    InlineKeyboardButton(
-                        "📁 Document", callback_data=(cb_string_file).encode("UTF-8")
-                    )
-                ]
-            )
+            format_id = record.format_id
+            format_ext = record.ext
+            rows.append([("🎬 Video", choice("video", format_id, format_ext))])
+            rows.append([("📁 Document", "{}={}={}".format("file", format_id, format_ext))])
+
+        # Only what youtube_dl_call_back needs, instead of the whole info dict on disk
+        token = sessions.put(
+            {
+                "title": record.title,
+                "fulltitle": record.fulltitle,
+                "duration": duration,
+                "choices": choices,
+            }
+        )
+        inline_keyboard = [
+            [
+                InlineKeyboardButton(
+                    label,
+                    callback_data=(f"{token}|{data}" if isinstance(data, int) else data).encode("UTF-8"),
+                )
+                for label, data in row
+            ]
+            for row in rows
+        ]
         reply_markup = InlineKeyboardMarkup(inline_keyboard)
         await chk.delete()
 
@@ -288,7 +278,6 @@ async def echo(bot, update):
     else:
         # fallback for nonnumeric port a.k.a seedbox.io
         inline_keyboard = []
-        cb_string_file = "{}={}={}".format("file", "LFO", "NONE")
         cb_string_video = "{}={}={}".format("video", "OFL", "ENON")
         inline_keyboard.append(
             [
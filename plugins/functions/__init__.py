@@ -1,5 +1,23 @@
-from .display_progress import *
-from .help_Nekmo_ffmpeg import *
-from .help_uploadbot import *
-from .help_ytdl import *
-from .ran_text import *
+import importlib
+
+# Helpers are re-exported lazily: a submodule (and its heavy dependencies,
+# e.g. hachoir or aiohttp) is only imported when one of its names is used.
+_SUBMODULES = (
+    "display_progress",
+    "help_Nekmo_ffmpeg",
+    "help_uploadbot",
+    "help_ytdl",
+    "ran_text",
+)
+
+
+def __getattr__(name):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    for submodule in _SUBMODULES:
+        module = importlib.import_module(f".{submodule}", __name__)
+        if hasattr(module, name):
+            value = getattr(module, name)
+            globals()[name] = value
+            return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
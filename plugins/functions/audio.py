@@ -0,0 +1,180 @@
+import os
+import shutil
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+from config import Config
+from plugins.functions.help_ytdl import fetch_stream
+from plugins.functions.rate_limit import ConcurrencyLimit
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR = f"{Config.DOWNLOAD_LOCATION}/audio"
+
+# source key -> downloaded best-audio file
+_sources = OrderedDict()
+# (source key, bitrate) -> encoded MP3
+_outputs = OrderedDict()
+# Work in flight, so concurrent taps share one download or encode
+_pending = {}
+_encode_slots = ConcurrencyLimit(Config.AUDIO_ENCODE_CONCURRENCY)
+
+
+def ladder_bitrates():
+    """Bitrates encoded together whenever a URL is first asked for as MP3."""
+    return [b.strip() for b in Config.AUDIO_LADDER.split(",") if b.strip()]
+
+
+def source_key(url, extra_args=()):
+    """
+    Cache key of a URL as fetched with ``extra_args``.
+
+    Credentials and cookies are part of the key, so audio one user fetched
+    with their login is never served to someone who sent only the URL.
+    """
+    digest = hashlib.sha1(url.encode())
+    for arg in extra_args:
+        digest.update(b"\0" + str(arg).encode())
+    return digest.hexdigest()[:16]
+
+
+def _cached(cache, key):
+    path = cache.get(key)
+    if path is not None and os.path.isfile(path):
+        cache.move_to_end(key)
+        return path
+    cache.pop(key, None)
+    return None
+
+
+def _remember(cache, key, path, limit):
+    cache[key] = path
+    cache.move_to_end(key)
+    while len(cache) > limit:
+        _, old = cache.popitem(last=False)
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+async def _shared(key, factory):
+    task = _pending.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _pending[key] = task
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    # A cancelled waiter must not cancel the work other taps are waiting on
+    return await asyncio.shield(task)
+
+
+async def audio_source(url, extra_args=()):
+    """
+    Best-audio track of a URL, downloaded once and reused for every bitrate.
+
+    Parameters:
+    - url (str): Media page URL.
+    - extra_args (Iterable[str]): Extra yt-dlp options (proxy, credentials...).
+
+    Returns:
+    str: Path of the cached source file.
+    """
+    key = source_key(url, extra_args)
+    path = _cached(_sources, key)
+    if path is not None:
+        return path
+
+    async def fetch():
+        os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+        path = await fetch_stream(
+            url, "bestaudio/best", f"{AUDIO_CACHE_DIR}/{key}.src.%(ext)s", extra_args
+        )
+        _remember(_sources, key, path, Config.AUDIO_SOURCE_CACHE_SIZE)
+        return path
+
+    return await _shared(("source", key), fetch)
+
+
+async def encode_ladder(source, outputs):
+    """
+    Encode several MP3 bitrates from a single decode of ``source``.
+
+    Parameters:
+    - source (str): Audio or video file.
+    - outputs (Dict[str, str]): Bitrate (e.g. "128k") -> output path.
+
+    Raises:
+    RuntimeError: If ffmpeg fails.
+    """
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", source]
+    for bitrate, path in outputs.items():
+        command.extend(
+            ["-map", "0:a:0", "-vn", "-c:a", "libmp3lame", "-b:a", bitrate, path]
+        )
+    async with _encode_slots.slot():
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+    if process.returncode:
+        raise RuntimeError(stderr.decode().strip() or "ffmpeg could not encode the audio")
+
+
+async def get_mp3(url, bitrate, destination, extra_args=()):
+    """
+    MP3 of a URL at ``bitrate``, from cache when any user asked for it before.
+
+    The first request for a URL downloads its best audio once and encodes
+    every bitrate of ``Config.AUDIO_LADDER`` in one pass, so the other
+    buttons are served without downloading or decoding again.
+
+    Parameters:
+    - url (str): Media page URL.
+    - bitrate (str): e.g. "128k".
+    - destination (str): Where to place the file for upload.
+    - extra_args (Iterable[str]): Extra yt-dlp options (proxy, credentials...).
+
+    Returns:
+    str: ``destination``, a hard link to (or copy of) the cached encode.
+
+    Raises:
+    RuntimeError: If the source could not be downloaded or encoded.
+    """
+    key = source_key(url, extra_args)
+
+    async def encode(bitrates):
+        source = await audio_source(url, extra_args)
+        outputs = {b: f"{AUDIO_CACHE_DIR}/{key}.{b}.mp3" for b in bitrates}
+        await encode_ladder(source, outputs)
+        for b, path in outputs.items():
+            _remember(_outputs, (key, b), path, Config.AUDIO_CACHE_SIZE)
+
+    if _cached(_outputs, (key, bitrate)) is None:
+        ladder = ladder_bitrates()
+        if bitrate in ladder:
+            missing = [b for b in ladder if _cached(_outputs, (key, b)) is None]
+            await _shared(("ladder", key), lambda: encode(missing))
+        if _cached(_outputs, (key, bitrate)) is None:
+            await _shared(("encode", key, bitrate), lambda: encode([bitrate]))
+
+    cached = _cached(_outputs, (key, bitrate))
+    if cached is None:
+        raise RuntimeError("encoded audio is gone from the cache")
+    # Uploads remove their directory afterwards; a link keeps the cached copy
+    try:
+        os.link(cached, destination)
+    except OSError:
+        shutil.copyfile(cached, destination)
+    return destination
+
+
+# Encodes already running finish under the old limit
+live_settings.on_change("AUDIO_ENCODE_CONCURRENCY", _encode_slots.resize)
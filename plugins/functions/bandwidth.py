@@ -0,0 +1,148 @@
+import time
+import asyncio
+import logging
+import functools
+
+from config import Config
+from plugins.functions.rate_limit import TokenBucket, TTLCache
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ("down", "up")
+SCOPES = ("global", "user")
+
+RATE_SETTINGS = {
+    ("down", "global"): "BANDWIDTH_DOWN_GLOBAL",
+    ("down", "user"): "BANDWIDTH_DOWN_USER",
+    ("up", "global"): "BANDWIDTH_UP_GLOBAL",
+    ("up", "user"): "BANDWIDTH_UP_USER",
+}
+
+
+class BandwidthShaper:
+    """
+    Token-bucket bandwidth shaping for downloads and uploads.
+
+    Every transfer is charged against a bot-wide bucket and a per-user
+    bucket for its direction, and waits while either is in debt. Buckets hold
+    one second of their rate, so shaping is smooth rather than bursty. The
+    first ``free_bytes`` of every transfer are charged but never delayed:
+    small jobs finish at full speed while big ones absorb the shaping.
+    """
+
+    def __init__(self, rates, free_bytes, max_users=Config.RATE_LIMIT_MAX_USERS):
+        """
+        Parameters:
+        - rates (dict): Mapping of (direction, scope) to bytes per second; 0 is unlimited.
+        - free_bytes (int): Bytes at the start of each transfer that are never delayed.
+        - max_users (int): Per-user buckets to keep.
+        """
+        self.free_bytes = free_bytes
+        self._rates = {}
+        self._global = {}
+        self._users = {
+            direction: TTLCache(max_users, Config.RATE_LIMIT_IDLE_TTL) for direction in DIRECTIONS
+        }
+        for (direction, scope), rate in rates.items():
+            self.set_rate(direction, scope, rate)
+
+    def rate(self, direction, scope):
+        """Current limit in bytes per second (0 = unlimited)."""
+        return self._rates.get((direction, scope), 0)
+
+    def set_rate(self, direction, scope, rate):
+        """
+        Change a limit; takes effect on the next chunk of every running transfer.
+
+        Parameters:
+        - direction (str): "down" or "up".
+        - scope (str): "global" or "user".
+        - rate (int): Bytes per second; 0 removes the limit.
+        """
+        if direction not in DIRECTIONS or scope not in SCOPES:
+            raise ValueError(f"unknown limit {direction}/{scope}")
+        rate = max(0, int(rate))
+        self._rates[(direction, scope)] = rate
+        if scope == "global":
+            self._global[direction] = TokenBucket(rate, rate, time.monotonic()) if rate else None
+
+    def _user_bucket(self, direction, user_id, now):
+        rate = self.rate(direction, "user")
+        if not rate or user_id is None:
+            return None
+        users = self._users[direction]
+        bucket = users.get(user_id, now)
+        if bucket is None:
+            bucket = TokenBucket(rate, rate, now)
+            users.set(user_id, bucket, now)
+        elif bucket.rate != rate:
+            bucket.rate = bucket.capacity = rate
+        return bucket
+
+    def delay(self, user_id, direction, amount, transferred=0):
+        """
+        Charge ``amount`` bytes and return how long the transfer should pause.
+
+        Parameters:
+        - user_id (int): User the transfer belongs to (None for none).
+        - direction (str): "down" or "up".
+        - amount (int): Bytes just transferred.
+        - transferred (int): Bytes of this transfer so far, including ``amount``.
+
+        Returns:
+        float: Seconds to wait before transferring more.
+        """
+        now = time.monotonic()
+        wait = 0.0
+        for bucket in (self._global.get(direction), self._user_bucket(direction, user_id, now)):
+            if bucket is not None:
+                bucket.charge(amount, now)
+                wait = max(wait, bucket.retry_after(now))
+        if transferred <= self.free_bytes:
+            return 0.0
+        return wait
+
+    async def throttle(self, user_id, direction, amount, transferred=0):
+        """Charge ``amount`` bytes and sleep as long as the limits require."""
+        wait = self.delay(user_id, direction, amount, transferred)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def progress(self, user_id, callback=None):
+        """
+        Pyrogram ``progress=`` callback that shapes an upload.
+
+        Pyrogram awaits the callback after every part it reads, so sleeping
+        here paces the upload itself.
+
+        Parameters:
+        - user_id (int): User the upload belongs to.
+        - callback: Progress callback to call afterwards, with the same arguments.
+
+        Returns:
+        Coroutine function taking (current, total, *args).
+        """
+        last = 0
+
+        async def shaped(current, total, *args):
+            nonlocal last
+            amount, last = current - last, current
+            await self.throttle(user_id, "up", amount, current)
+            if callback is not None:
+                await callback(current, total, *args)
+
+        return shaped
+
+
+shaper = BandwidthShaper(
+    {key: getattr(Config, name) for key, name in RATE_SETTINGS.items()},
+    Config.BANDWIDTH_FREE_BYTES,
+)
+
+for (_direction, _scope), _name in RATE_SETTINGS.items():
+    live_settings.on_change(_name, functools.partial(shaper.set_rate, _direction, _scope))
+live_settings.on_change("BANDWIDTH_FREE_BYTES", lambda value: setattr(shaper, "free_bytes", value))
@@ -0,0 +1,377 @@
+import hmac
+import json
+import time
+import asyncio
+import sqlite3
+import functools
+import logging
+import threading
+
+import aiohttp
+
+from config import Config
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    user_id INTEGER,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    error TEXT,
+    digest TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, id);
+CREATE TABLE IF NOT EXISTS settings (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+"""
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = {
+    "digest": "ALTER TABLE jobs ADD COLUMN digest TEXT",
+}
+
+
+class JobBroker:
+    """
+    Job queue shared by the chat front-end and download/upload workers.
+
+    Backed by a single SQLite file in WAL mode, so any number of processes
+    on the same host can enqueue and claim jobs without an external service.
+    A claimed job is leased: if its worker dies and stops reporting, the
+    lease runs out and another worker picks the job up again.
+    """
+
+    def __init__(self, path, lease=Config.BROKER_LEASE, max_attempts=Config.BROKER_MAX_ATTEMPTS):
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self._db.execute(statement)
+
+    def _enqueue(self, kind, payload, user_id, priority):
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (kind, payload, user_id, priority, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), user_id, priority, now, now),
+            )
+            return cursor.lastrowid
+
+    def _claim(self, worker):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose lease ran out too often are given up on
+                self._db.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'worker lost', updated = ? "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                row = self._db.execute(
+                    "SELECT id, kind, payload, user_id, attempts FROM jobs "
+                    "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY priority DESC, id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker, now + self.lease, now, row["id"]),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "user_id": row["user_id"],
+            "attempt": row["attempts"] + 1,
+        }
+
+    def _update(self, job_id, status=None, progress=None, error=None, digest=None, worker=None):
+        now = time.time()
+        with self._lock:
+            # A worker whose lease ran out (and was taken over) no longer owns the job
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = COALESCE(?, status), progress = COALESCE(?, progress), "
+                "error = COALESCE(?, error), digest = COALESCE(?, digest), lease_until = ?, updated = ? "
+                "WHERE id = ? AND status NOT IN ('done', 'cancelled') AND (? IS NULL OR worker = ?)",
+                (status, progress, error, digest, now + self.lease, now, job_id, worker, worker),
+            )
+            return cursor.rowcount > 0
+
+    def _cancel(self, user_id=None):
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? "
+                "WHERE status = 'pending' AND (? IS NULL OR user_id = ?)",
+                (time.time(), user_id, user_id),
+            )
+            return cursor.rowcount
+
+    def _publish_setting(self, name, value):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Only the latest value of each setting is kept
+                self._db.execute("DELETE FROM settings WHERE name = ?", (name,))
+                self._db.execute(
+                    "INSERT INTO settings (name, value) VALUES (?, ?)", (name, json.dumps(value))
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _settings_since(self, version):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, value, version FROM settings WHERE version > ? ORDER BY version",
+                (version,),
+            ).fetchall()
+        return [(row["name"], json.loads(row["value"]), row["version"]) for row in rows]
+
+    def _clear_settings(self):
+        with self._lock:
+            self._db.execute("DELETE FROM settings")
+
+    def _counts(self, user_id=None):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE ? IS NULL OR user_id = ? GROUP BY status",
+                (user_id, user_id),
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    async def enqueue(self, kind, payload, user_id=None, priority=0):
+        """
+        Add a job.
+
+        Parameters:
+        - kind (str): Job type, e.g. "url".
+        - payload (dict): JSON-serializable job arguments.
+        - user_id (int): Owner, for /cancel and /queue_status.
+        - priority (int): Higher runs first.
+
+        Returns:
+        int: Job ID.
+        """
+        return await asyncio.to_thread(self._enqueue, kind, payload, user_id, priority)
+
+    async def claim(self, worker):
+        """
+        Lease the next runnable job.
+
+        Parameters:
+        - worker (str): Worker name, recorded on the job.
+
+        Returns:
+        dict or None: Job with "id", "kind", "payload", "user_id" and "attempt".
+        """
+        return await asyncio.to_thread(self._claim, worker)
+
+    async def update(self, job_id, status=None, progress=None, error=None, digest=None, worker=None):
+        """
+        Report progress, a final status or the content digest; also renews the lease.
+
+        Parameters:
+        - worker (str): Worker reporting; the update is ignored unless it
+          still holds the job's lease. None skips the check.
+
+        Returns:
+        bool: Whether the job was updated.
+        """
+        return await asyncio.to_thread(self._update, job_id, status, progress, error, digest, worker)
+
+    async def cancel(self, user_id=None):
+        """Cancel pending jobs (of one user, or all); returns how many."""
+        return await asyncio.to_thread(self._cancel, user_id)
+
+    async def counts(self, user_id=None):
+        """Number of jobs per status."""
+        return await asyncio.to_thread(self._counts, user_id)
+
+    async def publish_setting(self, name, value):
+        """
+        Record a live setting changed on the front-end, for the workers.
+
+        Parameters:
+        - name (str): Setting name.
+        - value: Parsed, JSON-serializable value.
+        """
+        await asyncio.to_thread(self._publish_setting, name, value)
+
+    async def settings_since(self, version):
+        """
+        Live settings published after ``version``.
+
+        Parameters:
+        - version (int): Last version the caller applied, 0 for all.
+
+        Returns:
+        List[Tuple[str, object, int]]: (name, value, version), oldest first.
+        """
+        return await asyncio.to_thread(self._settings_since, version)
+
+    async def clear_settings(self):
+        """Forget published settings; the front-end starts over from its environment."""
+        await asyncio.to_thread(self._clear_settings)
+
+
+class RemoteBroker:
+    """
+    ``JobBroker`` client for workers on other hosts.
+
+    Talks to the front-end's health server, which exposes the broker under
+    /broker/* when ``BROKER_TOKEN`` is set.
+    """
+
+    def __init__(self, url, token):
+        self.url = url.rstrip("/")
+        self._headers = {"Authorization": f"Bearer {token}"}
+        self._session = None
+
+    async def _post(self, path, data):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers=self._headers)
+        async with self._session.post(f"{self.url}{path}", json=data) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def claim(self, worker):
+        return (await self._post("/broker/claim", {"worker": worker}))["job"]
+
+    async def update(self, job_id, status=None, progress=None, error=None, digest=None, worker=None):
+        return (
+            await self._post(
+                "/broker/update",
+                {
+                    "id": job_id,
+                    "status": status,
+                    "progress": progress,
+                    "error": error,
+                    "digest": digest,
+                    "worker": worker,
+                },
+            )
+        )["ok"]
+
+    async def settings_since(self, version):
+        settings = (await self._post("/broker/settings", {"since": version}))["settings"]
+        return [tuple(setting) for setting in settings]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def mount_broker_routes(broker):
+    """
+    Expose ``broker`` to remote workers on the health server.
+
+    Parameters:
+    - broker (JobBroker): Local broker.
+    """
+    from aiohttp import web
+
+    from keep_alive import mount
+
+    def authorized(request):
+        return hmac.compare_digest(
+            request.headers.get("Authorization", "").encode(), f"Bearer {Config.BROKER_TOKEN}".encode()
+        )
+
+    async def claim(request):
+        if not authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        data = await request.json()
+        return web.json_response({"job": await broker.claim(str(data["worker"]))})
+
+    async def update(request):
+        if not authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        data = await request.json()
+        updated = await broker.update(
+            int(data["id"]),
+            data.get("status"),
+            data.get("progress"),
+            data.get("error"),
+            data.get("digest"),
+            data.get("worker"),
+        )
+        return web.json_response({"ok": updated})
+
+    async def settings(request):
+        if not authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        data = await request.json()
+        return web.json_response({"settings": await broker.settings_since(int(data["since"]))})
+
+    mount("POST", "/broker/claim", claim)
+    mount("POST", "/broker/update", update)
+    mount("POST", "/broker/settings", settings)
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    """
+    The broker this process should use: remote when ``BROKER_URL`` is set,
+    otherwise the local SQLite file. Created on first use, then shared.
+    """
+    if Config.BROKER_URL:
+        return RemoteBroker(Config.BROKER_URL, Config.BROKER_TOKEN)
+    return JobBroker(Config.BROKER_PATH)
+
+
+async def offload_callback(update, session=None):
+    """
+    Hand a download button press to the workers instead of running it here.
+
+    The worker fetches the message again and replays the press, so only
+    what the front-end alone knows (the keyboard's session) travels with
+    the job.
+
+    Parameters:
+    - update (CallbackQuery): The button press.
+    - session (dict): Session data behind the keyboard, if any.
+
+    Returns:
+    int: Job ID.
+    """
+    payload = {
+        "data": update.data,
+        "chat_id": update.message.chat.id,
+        "message_id": update.message.id,
+        "session": session,
+    }
+    # Someone is watching the message, so presses go before /queue batches
+    return await get_broker().enqueue("callback", payload, user_id=update.from_user.id, priority=1)
@@ -0,0 +1,126 @@
+import os
+import asyncio
+import logging
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import Config
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def _warm():
+    return os.getpid()
+
+
+class CpuPool:
+    """
+    Process pool for CPU-heavy stages, so they never hold the bot's GIL.
+
+    Functions and arguments must be picklable (module-level functions,
+    plain data). Workers are forked once at startup by ``warm()``, before the
+    bot starts its own threads; pools created later (after a timeout or a
+    resize) are started from a fork server instead, since forking a process
+    that already runs threads can copy a held lock into the child. A task
+    that runs past its timeout raises ``asyncio.TimeoutError`` and, unless
+    run with ``recycle=False``, the pool is replaced: its processes are
+    terminated, so the stuck one stops using CPU and other tasks still
+    running on that pool fail with ``BrokenProcessPool``. With no workers configured, or inside a daemonic
+    process (which may not have children), work runs in threads instead.
+    """
+
+    def __init__(self, workers, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._replaced = False
+
+    @property
+    def enabled(self):
+        return self.workers > 0 and not multiprocessing.current_process().daemon
+
+    def _start(self):
+        if self._executor is None:
+            # fork starts every worker at once on first use, so warm() forks them early
+            methods = multiprocessing.get_all_start_methods()
+            method = None
+            if "fork" in methods and not self._replaced:
+                method = "fork"
+            elif "forkserver" in methods:
+                method = "forkserver"
+            context = multiprocessing.get_context(method)
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._executor
+
+    def _recycle(self):
+        executor, self._executor = self._executor, None
+        self._replaced = True
+        if executor is not None:
+            # shutdown() alone leaves a hung worker running; stop them all
+            processes = list((executor._processes or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+    async def warm(self):
+        """Start every worker now instead of on the first task."""
+        if self.enabled:
+            await asyncio.gather(*(self.run(_warm) for _ in range(self.workers)))
+            logger.info("CPU pool ready with %s workers", self.workers)
+
+    async def run(self, func, *args, timeout=None, recycle=True):
+        """
+        Run ``func(*args)`` in a worker process.
+
+        Parameters:
+        - func: Picklable function.
+        - args: Picklable arguments.
+        - timeout (float): Seconds before giving up; defaults to the pool's.
+        - recycle (bool): Replace the pool when the task times out. Pass False
+          for tasks that always finish, whose timeout only means the pool is
+          busy: the task is left to complete and other tasks keep running.
+
+        Returns:
+        The function's result.
+        """
+        if not self.enabled:
+            return await asyncio.to_thread(func, *args)
+        future = asyncio.get_running_loop().run_in_executor(
+            self._start(), functools.partial(func, *args)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            if recycle:
+                logger.warning("%s timed out in the CPU pool; replacing the pool", func.__name__)
+                self._recycle()
+            raise
+        except BrokenProcessPool:
+            self._recycle()
+            raise
+
+    def resize(self, workers):
+        """Use ``workers`` processes from the next task on; queued tasks finish on the old pool."""
+        self.workers = workers
+        self._replaced = True
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+cpu_pool = CpuPool(Config.CPU_WORKERS, Config.CPU_TASK_TIMEOUT)
+
+live_settings.on_change("CPU_WORKERS", cpu_pool.resize)
+live_settings.on_change("CPU_TASK_TIMEOUT", lambda value: setattr(cpu_pool, "timeout", value))
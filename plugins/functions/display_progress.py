@@ -2,6 +2,8 @@ import math
 import time
 import logging
 
+from plugins.functions.governor import rpc_priority
+
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
@@ -48,7 +50,8 @@ async def progress_for_pyrogram(current, total, ud_type, message, start):
             estimated_total_time if estimated_total_time != "" else "0 s",
         )
         try:
-            await message.edit(text=f"{ud_type}\n {tmp}")
+            with rpc_priority("progress"):
+                await message.edit(text=f"{ud_type}\n {tmp}")
         except Exception as e:
             logger.info("Error %s", e)
             return
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+
+from pyrogram.errors import RPCError
+
+from config import Config
+from plugins.functions.rate_limit import ConcurrencyLimit
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+_slots = ConcurrencyLimit(Config.DELIVERY_CONCURRENCY)
+
+
+async def _deliver(client, destination, from_chat_id, message_id, media_group):
+    async with _slots.slot():
+        try:
+            if media_group:
+                return await client.copy_media_group(destination, from_chat_id, message_id)
+            return await client.copy_message(destination, from_chat_id, message_id)
+        except RPCError as e:
+            # The RPC governor already waited out and retried short FloodWaits
+            logger.info("Could not copy to %s: %s", destination, e)
+            return None
+
+
+async def fan_out(client, chat_id, message_id, destinations=None, media_group=False):
+    """
+    Deliver an uploaded message to more chats without uploading it again.
+
+    Copies reuse the file already on Telegram's servers, so N destinations
+    cost one upload. Copies run in parallel up to ``Config.DELIVERY_CONCURRENCY``;
+    FloodWait is handled by the RPC governor, so a copy is only given up on
+    when Telegram asks to wait longer than ``Config.RPC_MAX_FLOOD_WAIT``.
+
+    Parameters:
+    - client: Pyrogram client.
+    - chat_id (int): Chat the upload was sent to.
+    - message_id (int): The sent message (with ``media_group``, any message of the album).
+    - destinations (List[int or str]): Chats to copy to; defaults to ``Config.DELIVERY_CHATS``.
+    - media_group (bool): Copy the whole album ``message`` belongs to.
+
+    Returns:
+    list: Copied message(s) per destination, None where delivery failed.
+    """
+    if destinations is None:
+        destinations = Config.DELIVERY_CHATS
+    if not destinations:
+        return []
+    return await asyncio.gather(
+        *(
+            _deliver(client, destination, chat_id, message_id, media_group)
+            for destination in destinations
+        )
+    )
+
+
+# Copies already running finish under the old limit
+live_settings.on_change("DELIVERY_CONCURRENCY", _slots.resize)
@@ -0,0 +1,304 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import contextlib
+import contextvars
+
+from pyrogram.errors import FloodWait
+
+from config import Config
+from plugins.functions.metrics import counter, gauge
+from plugins.functions.rate_limit import TokenBucket, TTLCache, parse_rate
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Served first to last when the global budget is short
+PRIORITIES = ("upload", "result", "chatter", "progress")
+
+# Priority of a call by raw function; everything else is "chatter"
+QUERY_PRIORITIES = {
+    "UploadMedia": "upload",
+    "SaveFilePart": "upload",
+    "SaveBigFilePart": "upload",
+    "SendMedia": "result",
+    "SendMultiMedia": "result",
+    "ForwardMessages": "result",
+}
+
+# Raw functions (by name prefix) that count against the chat and global budgets
+OUTBOUND = ("Send", "Edit", "Delete", "Forward", "UploadMedia")
+
+RPC_CALLS = counter("rpc_calls_total", "Outbound Telegram calls by method and priority")
+RPC_WAIT_SECONDS = counter("rpc_wait_seconds_total", "Time outbound calls waited for budget, by priority")
+RPC_DROPPED = counter("rpc_dropped_total", "Progress updates skipped because their chat was limited")
+RPC_FLOOD_WAITS = counter("rpc_flood_waits_total", "FloodWait answers, by scope")
+RPC_FLOOD_SECONDS = counter("rpc_flood_wait_seconds_total", "Seconds Telegram asked us to wait, by scope")
+RPC_QUEUED = gauge("rpc_queue_depth", "Outbound calls waiting for the global budget")
+
+_priority = contextvars.ContextVar("rpc_priority", default=None)
+
+
+@contextlib.contextmanager
+def rpc_priority(name):
+    """
+    Run the Telegram calls made inside the block with priority ``name``.
+
+    "progress" calls are skipped (raising FloodWait) instead of waiting when
+    their chat is out of budget, so a progress edit never holds up a handler.
+    """
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority {name!r}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _bucket(spec, now, share=1):
+    rate, capacity = parse_rate(spec)
+    if rate <= 0:
+        return None
+    # A process gets 1/share of the budget, and a burst of at least one call
+    return TokenBucket(rate / share, max(1.0, capacity / share), now)
+
+
+def rpc_processes():
+    """Processes sharing the bot-wide budget; see ``Config.RPC_PROCESSES``."""
+    if Config.RPC_PROCESSES > 0:
+        return Config.RPC_PROCESSES
+    return 1 + Config.WORKER_PROCESSES if Config.BOT_MODE == "frontend" else 1
+
+
+def chat_key(query):
+    """Chat a raw function is addressed to, or None."""
+    peer = getattr(query, "peer", None) or getattr(query, "channel", None)
+    if peer is None:
+        return None
+    for attribute in ("user_id", "chat_id", "channel_id"):
+        value = getattr(peer, attribute, None)
+        if value is not None:
+            return (attribute, value)
+    return (type(peer).__name__, None)
+
+
+class _ChatState:
+    __slots__ = ("bucket", "flood_until")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.flood_until = 0.0
+
+
+class RpcGovernor:
+    """
+    Paces every Telegram API call the bot makes and handles FloodWait.
+
+    Outbound calls take a token from their chat's bucket and from a bot-wide
+    bucket. Every process using the bot token runs its own governor, so the
+    bot-wide budget is split evenly between ``processes`` of them. When the
+    bot-wide bucket is empty, waiting calls are released in
+    priority order (uploads, then results, then chatter, then progress).
+    FloodWait only pauses calls to the chat it was raised for (or, for calls
+    that are not addressed to a chat, calls of the same method); pyrogram's
+    own FloodWait sleeping is turned off so it cannot block a handler
+    without us knowing, and every retry waits out the FloodWait first.
+    """
+
+    def __init__(
+        self, global_limit, chat_limit, max_flood_wait, max_chats=Config.RATE_LIMIT_MAX_USERS, processes=1
+    ):
+        """
+        Parameters:
+        - global_limit (str): Rate spec for all outbound calls, e.g. "30/1"; "0" disables it.
+        - chat_limit (str): Rate spec per chat, e.g. "5/5"; "0" disables it.
+        - max_flood_wait (float): Longer FloodWaits are raised to the caller instead of slept.
+        - max_chats (int): Chats to keep budget state for.
+        - processes (int): Processes sharing ``global_limit``; this one takes its share.
+        """
+        now = time.monotonic()
+        self.processes = processes
+        self.chat_limit = chat_limit
+        self.max_flood_wait = max_flood_wait
+        self._global = _bucket(global_limit, now, processes)
+        self._global_resume_at = 0.0
+        self._chats = TTLCache(max_chats, Config.RATE_LIMIT_IDLE_TTL)
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+
+    def set_limits(self, global_limit=None, chat_limit=None):
+        """
+        Change the budgets; running and queued calls switch over immediately.
+
+        Parameters:
+        - global_limit (str): New bot-wide rate spec, or None to keep it.
+        - chat_limit (str): New per-chat rate spec, or None to keep it.
+        """
+        now = time.monotonic()
+        if global_limit is not None:
+            self._global = _bucket(global_limit, now, self.processes)
+            if self._global is None:
+                # Unlimited now: let everything that was queued through
+                while self._waiters:
+                    _, _, future = heapq.heappop(self._waiters)
+                    if not future.done():
+                        future.set_result(None)
+                RPC_QUEUED.set(0)
+        if chat_limit is not None:
+            _bucket(chat_limit, now)
+            self.chat_limit = chat_limit
+            for state in self._chats.values():
+                state.bucket = _bucket(chat_limit, now)
+
+    def _chat(self, key, now):
+        state = self._chats.get(key, now)
+        if state is None:
+            state = _ChatState(_bucket(self.chat_limit, now))
+            self._chats.set(key, state, now)
+        return state
+
+    def _chat_wait(self, key, now):
+        if key is None:
+            return 0.0
+        state = self._chat(key, now)
+        wait = state.flood_until - now
+        if wait > 0:
+            return wait
+        return state.bucket.consume(1, now) if state.bucket is not None else 0.0
+
+    async def _dispatch(self):
+        while self._waiters:
+            wait = self._global.consume(1, time.monotonic())
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            RPC_QUEUED.set(len(self._waiters))
+            if future.done():
+                # Cancelled while queued; give its token back
+                self._global.tokens += 1
+            else:
+                future.set_result(None)
+
+    async def _global_slot(self, priority):
+        delay = self._global_resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._global is None:
+            return
+        if not self._waiters and not self._global.consume(1, time.monotonic()):
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES.index(priority), next(self._sequence), future))
+        RPC_QUEUED.set(len(self._waiters))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+
+    def _flood_wait(self, key, now):
+        state = self._chats.get(key, now)
+        return max(0.0, state.flood_until - now) if state is not None else 0.0
+
+    def _flood(self, key, seconds):
+        if key is None:
+            scope = "global"
+        else:
+            scope = "method" if key[0] == "method" else "chat"
+        RPC_FLOOD_WAITS.inc(scope=scope)
+        RPC_FLOOD_SECONDS.inc(seconds, scope=scope)
+        until = time.monotonic() + seconds
+        if key is None:
+            self._global_resume_at = max(self._global_resume_at, until)
+        else:
+            state = self._chat(key, time.monotonic())
+            state.flood_until = max(state.flood_until, until)
+
+    async def call(self, invoke, query, *args, **kwargs):
+        """
+        Run ``invoke(query, *args, **kwargs)`` within the budgets.
+
+        Parameters:
+        - invoke: The client's original ``invoke``.
+        - query: Raw function being sent.
+
+        Returns:
+        The result of ``invoke``.
+
+        Raises:
+        FloodWait: For a "progress" call whose chat is limited, or when
+        Telegram asks to wait longer than ``max_flood_wait``.
+        """
+        name = type(query).__name__
+        priority = _priority.get() or QUERY_PRIORITIES.get(name, "chatter")
+        outbound = name.startswith(OUTBOUND)
+        # FloodWaits on calls outside the budgets (callback answers, lookups,
+        # update polling) are scoped to their method
+        key = chat_key(query) if outbound else ("method", name)
+        kwargs.setdefault("sleep_threshold", 0)
+        waited = 0.0
+        while True:
+            if not outbound:
+                wait = self._flood_wait(key, time.monotonic())
+                if wait:
+                    if priority == "progress":
+                        RPC_DROPPED.inc(method=name)
+                        raise FloodWait(value=int(wait) + 1)
+                    await asyncio.sleep(wait)
+                    waited += wait
+            else:
+                started = time.monotonic()
+                while True:
+                    wait = self._chat_wait(key, time.monotonic())
+                    if not wait:
+                        break
+                    if priority == "progress":
+                        RPC_DROPPED.inc(method=name)
+                        raise FloodWait(value=int(wait) + 1)
+                    # Only callers for this chat wait; other chats go on
+                    await asyncio.sleep(wait)
+                await self._global_slot(priority)
+                waited += time.monotonic() - started
+            try:
+                RPC_CALLS.inc(method=name, priority=priority)
+                result = await invoke(query, *args, **kwargs)
+            except FloodWait as e:
+                self._flood(key, e.value)
+                logger.info("FloodWait %ss on %s for %s", e.value, name, key or "the bot")
+                if priority == "progress" or e.value > self.max_flood_wait:
+                    raise
+                # The next pass waits until the FloodWait has passed
+                continue
+            if waited:
+                RPC_WAIT_SECONDS.inc(waited, priority=priority)
+            return result
+
+    def install(self, client):
+        """
+        Route every API call ``client`` makes through the governor.
+
+        Parameters:
+        - client: Pyrogram Client, before it is started.
+        """
+        invoke = client.invoke
+
+        async def governed(query, *args, **kwargs):
+            return await self.call(invoke, query, *args, **kwargs)
+
+        client.invoke = governed
+        return client
+
+
+governor = RpcGovernor(
+    Config.RPC_GLOBAL_LIMIT, Config.RPC_CHAT_LIMIT, Config.RPC_MAX_FLOOD_WAIT, processes=rpc_processes()
+)
+
+live_settings.on_change("RPC_GLOBAL_LIMIT", lambda value: governor.set_limits(global_limit=value))
+live_settings.on_change("RPC_CHAT_LIMIT", lambda value: governor.set_limits(chat_limit=value))
+live_settings.on_change("RPC_MAX_FLOOD_WAIT", lambda value: setattr(governor, "max_flood_wait", value))
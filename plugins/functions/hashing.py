@@ -0,0 +1,140 @@
+import hashlib
+import logging
+from collections import OrderedDict
+
+from pyrogram.errors import RPCError
+
+from config import Config
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def _new_hash(algorithm):
+    if algorithm == "xxh3":
+        try:
+            import xxhash
+
+            return xxhash.xxh3_128()
+        except ImportError:
+            logger.info("xxhash is not installed, hashing with blake2b")
+            algorithm = "blake2b"
+    if algorithm != "blake2b":
+        raise ValueError(f"unknown hash algorithm {algorithm!r}")
+    return hashlib.blake2b(digest_size=32)
+
+
+class StreamHasher:
+    """
+    Content digest built from the chunks a downloader writes, so hashing
+    never needs a second read of the file.
+    """
+
+    __slots__ = ("algorithm", "size", "_hash")
+
+    def __init__(self, algorithm=None):
+        self._hash = _new_hash(algorithm or Config.HASH_ALGORITHM)
+        self.algorithm = "xxh3" if "xxh3" in type(self._hash).__name__ else "blake2b"
+        self.size = 0
+
+    def update(self, chunk):
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def hexdigest(self):
+        """Digest as "<algorithm>:<hex>", so digests of different algorithms never match."""
+        return f"{self.algorithm}:{self._hash.hexdigest()}"
+
+
+class ContentIndex:
+    """
+    Where content with a given digest was already uploaded, for dedupe.
+
+    Keyed by digest and send type (the same bytes sent as a video and as a
+    document are different messages). Also remembers the last digest seen per
+    URL, so a changed download can be noticed.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._messages = OrderedDict()
+        self._urls = OrderedDict()
+
+    def _put(self, mapping, key, value):
+        mapping[key] = value
+        mapping.move_to_end(key)
+        while len(mapping) > self.max_entries:
+            mapping.popitem(last=False)
+
+    def lookup(self, digest, kind):
+        """(chat_id, message_id) of an earlier upload, or None."""
+        location = self._messages.get((digest, kind))
+        if location is not None:
+            self._messages.move_to_end((digest, kind))
+        return location
+
+    def remember(self, digest, kind, message):
+        if message is not None:
+            self._put(self._messages, (digest, kind), (message.chat.id, message.id))
+
+    def forget(self, digest, kind):
+        self._messages.pop((digest, kind), None)
+
+    def check_url(self, url, digest):
+        """
+        Record the digest of a download and report whether it matches the
+        last download of the same URL.
+
+        Returns:
+        bool or None: True/False when the URL was seen before, None otherwise.
+        """
+        previous = self._urls.get(url)
+        self._put(self._urls, url, digest)
+        if previous is None:
+            return None
+        if previous != digest:
+            logger.info("Content of %s changed: %s -> %s", url, previous, digest)
+        return previous == digest
+
+
+content_index = ContentIndex(Config.CONTENT_INDEX_SIZE)
+live_settings.on_change("CONTENT_INDEX_SIZE", lambda value: setattr(content_index, "max_entries", value))
+
+
+async def deliver_known(client, digest, kind, chat_id, caption=None, reply_to_message_id=None):
+    """
+    Send content that was uploaded before by copying the earlier message.
+
+    Parameters:
+    - client: Pyrogram client.
+    - digest (str): ``StreamHasher.hexdigest()`` of the downloaded content.
+    - kind (str): Send type ("video", "audio", "file"...).
+    - chat_id (int): Destination chat.
+    - caption (str): Caption for the copy; the original's is kept when None.
+    - reply_to_message_id (int): Message to reply to.
+
+    Returns:
+    Message or None: The copy, or None if nothing is known (upload normally).
+    """
+    if not Config.DEDUPE_UPLOADS:
+        return None
+    location = content_index.lookup(digest, kind)
+    if location is None:
+        return None
+    from_chat_id, message_id = location
+    try:
+        return await client.copy_message(
+            chat_id,
+            from_chat_id,
+            message_id,
+            caption=caption,
+            reply_to_message_id=reply_to_message_id,
+        )
+    except RPCError as e:
+        # The original was deleted or is no longer reachable
+        logger.info("Cannot reuse %s for %s: %s", location, digest, e)
+        content_index.forget(digest, kind)
+        return None
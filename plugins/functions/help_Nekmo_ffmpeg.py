@@ -1,15 +1,105 @@
 import os
+import json
 import asyncio
-from hachoir.parser import createParser
-from hachoir.metadata import extractMetadata
 import time
 import logging
+from collections import OrderedDict
+
+from config import Config
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+PROBE_CACHE_SIZE = 128
+_probe_cache = OrderedDict()
+
+
+def _water_mark_variant(water_mark_file, width):
+    """Path of the watermark pre-scaled for inputs ``width`` pixels wide."""
+    stat = os.stat(water_mark_file)
+    name = f"{os.path.splitext(os.path.basename(water_mark_file))[0]}_{stat.st_mtime_ns}_{width}.png"
+    return os.path.join(Config.DOWNLOAD_LOCATION, ".watermarks", name)
+
+
+async def place_water_marks(input_files, output_files, water_mark_file, is_video=False):
+    """
+    Overlay a watermark on several files, one ffmpeg process per input width.
+
+    The watermark is scaled to half the input width inside the same filter
+    graph as the overlay. Each scaled variant is also written to a cache the
+    first time it is needed, so later calls only overlay. When ffmpeg fails,
+    nothing is cached and the outputs it started are removed.
+
+    Parameters:
+    - input_files (List[str]): Images (or videos) to watermark.
+    - output_files (List[str]): Where to save each watermarked file.
+    - water_mark_file (str): Path to the watermark image.
+    - is_video (bool): Inputs are videos; audio is stream-copied.
+
+    Returns:
+    List[str]: Output paths, None for any file that could not be produced.
+    """
+    groups = OrderedDict()
+    for input_file, output_file in zip(input_files, output_files):
+        width = (await probe_media(input_file))["width"]
+        groups.setdefault(width, []).append((input_file, output_file))
+
+    produced = set()
+    for width, pairs in groups.items():
+        variant = _water_mark_variant(water_mark_file, width)
+        cached = os.path.isfile(variant)
+        # Written aside and renamed on success, so a failed run is never cached
+        partial = f"{os.path.splitext(variant)[0]}.{os.getpid()}.partial.png"
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+        for input_file, _ in pairs:
+            command += ["-i", input_file]
+        command += ["-i", variant if cached else water_mark_file]
+
+        count = len(pairs)
+        labels = "".join(f"[w{index}]" for index in range(count))
+        if cached:
+            graph = [f"[{count}:v]split={count}{labels}" if count > 1 else f"[{count}:v]null[w0]"]
+        else:
+            os.makedirs(os.path.dirname(variant), exist_ok=True)
+            graph = [f"[{count}:v]scale={max(2, int(width * 0.5))}:-1,split={count + 1}{labels}[cache]"]
+        for index in range(count):
+            graph.append(f"[{index}:v][w{index}]overlay=(main_w-overlay_w):(main_h-overlay_h)[o{index}]")
+        command += ["-filter_complex", ";".join(graph)]
+
+        for index, (_, output_file) in enumerate(pairs):
+            command += ["-map", f"[o{index}]"]
+            if is_video:
+                command += ["-map", f"{index}:a?", "-c:a", "copy"]
+            else:
+                command += ["-frames:v", "1"]
+            command.append(output_file)
+        if not cached:
+            command += ["-map", "[cache]", "-frames:v", "1", partial]
+
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        if process.returncode == 0:
+            if not cached and os.path.isfile(partial):
+                os.replace(partial, variant)
+            produced.update(
+                output_file
+                for _, output_file in pairs
+                if os.path.isfile(output_file) and os.path.getsize(output_file) > 0
+            )
+        else:
+            logger.info(stderr.decode().strip())
+            for path in [partial] + [output_file for _, output_file in pairs]:
+                if os.path.lexists(path):
+                    os.remove(path)
+
+    return [output_file if output_file in produced else None for output_file in output_files]
+
 
 async def place_water_mark(input_file, output_file, water_mark_file):
     """
@@ -23,49 +113,8 @@ async def place_water_mark(input_file, output_file, water_mark_file):
     Returns:
     str: Path to the watermarked output file.
     """
-    watermarked_file = f"{output_file}.watermark.png"
-    metadata = extractMetadata(createParser(input_file))
-    width = metadata.get("width")
-    # Command to shrink the watermark file
-    shrink_watermark_file_genertor_command = [
-        "ffmpeg",
-        "-i",
-        water_mark_file,
-        "-y -v quiet",
-        "-vf",
-        f"scale={width}*0.5:-1",
-        watermarked_file,
-    ]
-
-    process = await asyncio.create_subprocess_exec(
-        *shrink_watermark_file_genertor_command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
-    stderr.decode().strip()
-    stdout.decode().strip()
-
-    # Command to overlay the watermark on the input file
-    commands_to_execute = [
-        "ffmpeg",
-        "-i",
-        input_file,
-        "-i",
-        watermarked_file,
-        "-filter_complex",
-        '"overlay=(main_w-overlay_w):(main_h-overlay_h)"',
-        output_file,
-    ]
-    process = await asyncio.create_subprocess_exec(
-        *commands_to_execute,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
-    stderr.decode().strip()
-    stdout.decode().strip()
-    return output_file
+    (result,) = await place_water_marks([input_file], [output_file], water_mark_file)
+    return result
 
 
 async def take_screen_shot(video_file, output_directory, ttl):
@@ -141,12 +190,87 @@ async def cult_small_video(video_file, output_directory, start_time, end_time):
     return out_put_file_name if os.path.lexists(out_put_file_name) else None
 
 
+async def probe_media(file_path):
+    """
+    Probe a media file with ffprobe, caching the result.
+
+    The cache is keyed by path, size and mtime, so screenshots, watermarking
+    and upload metadata can all ask for the same file without re-probing it.
+
+    Parameters:
+    - file_path (str): Path to the media file.
+
+    Returns:
+    dict: "duration" (float seconds), "width" and "height" (int, 0 if unknown).
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    cached = _probe_cache.get(key)
+    if cached is not None:
+        _probe_cache.move_to_end(key)
+        return cached
+
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe",
+        "-v",
+        "quiet",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        file_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await process.communicate()
+    result = {"duration": 0.0, "width": 0, "height": 0}
+    try:
+        info = json.loads(stdout.decode() or "{}")
+    except ValueError:
+        info = {}
+    result["duration"] = float(info.get("format", {}).get("duration", 0) or 0)
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == "video":
+            result["width"] = int(stream.get("width", 0) or 0)
+            result["height"] = int(stream.get("height", 0) or 0)
+            if not result["duration"]:
+                result["duration"] = float(stream.get("duration", 0) or 0)
+            break
+
+    _probe_cache[key] = result
+    if len(_probe_cache) > PROBE_CACHE_SIZE:
+        _probe_cache.popitem(last=False)
+    return result
+
+
+async def _extract_frames(video_file, timestamps, out_files):
+    """Grab one frame per timestamp in a single ffmpeg process."""
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+    # -ss before -i seeks each input to the nearest keyframe before decoding,
+    # so every frame costs one short decode instead of a full demux from 0
+    for ttl in timestamps:
+        command += ["-ss", str(ttl), "-i", video_file]
+    for index, out_file in enumerate(out_files):
+        command += ["-map", f"{index}:v:0", "-frames:v", "1", "-q:v", "2", out_file]
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode:
+        logger.info(stderr.decode().strip())
+
+
 async def generate_screen_shots(
     video_file, output_directory, is_watermarkable, wf, min_duration, no_of_photos
 ):
     """
     Generate screen shots from a video file and optionally apply a watermark.
 
+    All frames are extracted by one ffmpeg invocation; any frame it could
+    not produce is retried individually in a bounded parallel pool.
+
     Parameters:
     - video_file (str): Path to the video file.
     - output_directory (str): Directory to save the screen shots.
@@ -158,22 +282,96 @@ async def generate_screen_shots(
     Returns:
     List[str]: List of paths to the generated screen shots.
     """
-    metadata = extractMetadata(createParser(video_file))
-    duration = 0
-    if metadata is not None and metadata.has("duration"):
-        duration = metadata.get("duration").seconds
-    if duration > min_duration:
-        images = []
-        ttl_step = duration // no_of_photos
-        current_ttl = ttl_step
-        for _ in range(no_of_photos):
-            ss_img = await take_screen_shot(video_file, output_directory, current_ttl)
-            current_ttl = current_ttl + ttl_step
-            if is_watermarkable:
-                ss_img = await place_water_mark(
-                    ss_img, f"{output_directory}/{str(time.time())}.jpg", wf
-                )
-            images.append(ss_img)
-        return images
-
-    return None
+    duration = int((await probe_media(video_file))["duration"])
+    if duration <= min_duration:
+        return None
+
+    ttl_step = duration // no_of_photos
+    timestamps = [ttl_step * (index + 1) for index in range(no_of_photos)]
+    prefix = f"{output_directory}/{time.time()}"
+    out_files = [f"{prefix}_{index}.jpg" for index in range(no_of_photos)]
+    await _extract_frames(video_file, timestamps, out_files)
+
+    semaphore = asyncio.Semaphore(Config.SCREENSHOT_CONCURRENCY)
+
+    async def retry(ttl, out_file):
+        if os.path.lexists(out_file):
+            return out_file
+        async with semaphore:
+            await _extract_frames(video_file, [ttl], [out_file])
+        return out_file if os.path.lexists(out_file) else None
+
+    images = await asyncio.gather(*(retry(ttl, out_file) for ttl, out_file in zip(timestamps, out_files)))
+    images = [image for image in images if image]
+    if is_watermarkable:
+        images = await place_water_marks(
+            images, [f"{os.path.splitext(image)[0]}.wm.jpg" for image in images], wf
+        )
+        images = [image for image in images if image]
+    return images
+
+
+async def send_screen_shots(bot, chat_id, images, reply_to_message_id=None):
+    """
+    Send screen shots as media groups (Telegram allows 10 items per album).
+
+    Albums are balanced (11 images go as 6 + 5) because Telegram rejects
+    an album of one; a single image is sent as a photo.
+
+    Parameters:
+    - bot: Pyrogram client.
+    - chat_id (int): Destination chat.
+    - images (List[str]): Paths returned by ``generate_screen_shots``.
+    - reply_to_message_id (int): Message to reply to, if any.
+
+    Returns:
+    List[Message]: The sent messages.
+    """
+    from pyrogram.types import InputMediaPhoto
+
+    if not images:
+        return []
+    if len(images) == 1:
+        return [
+            await bot.send_photo(chat_id, images[0], reply_to_message_id=reply_to_message_id)
+        ]
+    albums = -(-len(images) // 10)
+    size = -(-len(images) // albums)
+    sent = []
+    for start in range(0, len(images), size):
+        sent += await bot.send_media_group(
+            chat_id=chat_id,
+            media=[InputMediaPhoto(image) for image in images[start: start + size]],
+            reply_to_message_id=reply_to_message_id,
+        )
+    return sent
+
+
+async def send_video_screen_shots(bot, video_file, sent):
+    """
+    Reply to an uploaded video with ``Config.SCREENSHOTS`` screen shots.
+
+    Parameters:
+    - bot: Pyrogram client.
+    - video_file (str): Local copy of the video, still on disk.
+    - sent (Message): The uploaded video.
+    """
+    if not Config.SCREENSHOTS:
+        return
+    images = []
+    try:
+        # A shot needs at least a second of video to itself
+        images = await generate_screen_shots(
+            video_file,
+            os.path.dirname(video_file),
+            False,
+            None,
+            Config.SCREENSHOTS,
+            Config.SCREENSHOTS,
+        ) or []
+        await send_screen_shots(bot, sent.chat.id, images, reply_to_message_id=sent.id)
+    except Exception as e:
+        logger.info("Screen shots not sent: %s", e)
+    finally:
+        for image in images:
+            os.remove(image)
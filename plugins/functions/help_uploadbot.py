@@ -1,31 +1,36 @@
-import logging
 import os
 import time
-import requests
+import logging
+
+import aiohttp
 
+from plugins.functions.bandwidth import shaper
 from plugins.functions.display_progress import humanbytes
+from plugins.functions.inspector import inspect
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+# Seconds between progress edits
+PROGRESS_INTERVAL = 5
 
-def DetectFileSize(url):
+
+async def DetectFileSize(url):
     """
-    Detect the file size of a remote file by sending a HEAD request.
+    Detect the file size of a remote file without downloading it.
 
     Parameters:
     - url (str): URL of the remote file.
 
     Returns:
-    int: Size of the file in bytes.
+    int: Size of the file in bytes, 0 if the server does not say.
     """
-    r = requests.head(url, allow_redirects=True, timeout=60)
-    return int(r.headers.get("content-length", 0))
+    return (await inspect(url)).size or 0
 
 
-def DownLoadFile(url, file_name, chunk_size, client, ud_type, message_id, chat_id):
+async def DownLoadFile(url, file_name, chunk_size, client, ud_type, message_id, chat_id):
     """
     Download a file from a given URL and display the download progress.
 
@@ -46,26 +51,29 @@ def DownLoadFile(url, file_name, chunk_size, client, ud_type, message_id, chat_i
     if not url:
         return file_name
 
-    r = requests.get(url, allow_redirects=True, stream=True)
-    total_size = int(r.headers.get("content-length", 0))
-    downloaded_size = 0
-
-    with open(file_name, "wb") as fd:
-        for chunk in r.iter_content(chunk_size=chunk_size):
-            if chunk:
-                fd.write(chunk)
-                downloaded_size += chunk_size
-
-            if client is not None and ((total_size // downloaded_size) % 5) == 0:
-                time.sleep(0.3)
-                try:
-                    client.edit_message_text(
-                        chat_id,
-                        message_id,
-                        text=f"{ud_type}: {humanbytes(downloaded_size)} of {humanbytes(total_size)}",
-                    )
-                except Exception as e:
-                    logger.info(f"Error: {e}")
-                    return
+    async with aiohttp.ClientSession() as session:
+        resource = await inspect(url, session)
+        async with session.get(resource.final_url) as response:
+            total_size = resource.size or int(response.headers.get("Content-Length", 0))
+            downloaded_size = 0
+            last_edit = time.monotonic()
+
+            with open(file_name, "wb") as fd:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    fd.write(chunk)
+                    downloaded_size += len(chunk)
+                    await shaper.throttle(chat_id, "down", len(chunk), downloaded_size)
+
+                    if client is not None and time.monotonic() - last_edit >= PROGRESS_INTERVAL:
+                        last_edit = time.monotonic()
+                        total = humanbytes(total_size) if total_size else "?"
+                        try:
+                            await client.edit_message_text(
+                                chat_id,
+                                message_id,
+                                text=f"{ud_type}: {humanbytes(downloaded_size)} of {total}",
+                            )
+                        except Exception as e:
+                            logger.info(f"Error: {e}")
 
     return file_name
@@ -1,7 +1,10 @@
 import os
+import asyncio
 import logging
 from urllib.parse import urlparse
 
+from config import Config
+
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
@@ -56,3 +59,137 @@ def get_resolution(info_dict):
         width = 426
         height = 240
     return width, height
+
+
+def fragment_args():
+    """
+    yt-dlp options that fetch HLS/DASH fragments in parallel and retry each one.
+
+    Returns:
+    List[str]: Options to add to a yt-dlp download command.
+    """
+    return [
+        "--concurrent-fragments",
+        str(Config.FRAGMENT_CONCURRENCY),
+        "--fragment-retries",
+        str(Config.FRAGMENT_RETRIES),
+        "--retries",
+        str(Config.FRAGMENT_RETRIES),
+        "--retry-sleep",
+        "fragment:exp=1:30",
+    ]
+
+
+async def fetch_stream(url, format_spec, output_template, extra_args=()):
+    """
+    Download a single format with yt-dlp.
+
+    Parameters:
+    - url (str): Media page URL.
+    - format_spec (str): yt-dlp format selector.
+    - output_template (str): yt-dlp output template.
+    - extra_args (Iterable[str]): Extra yt-dlp options (proxy, credentials...).
+
+    Returns:
+    str: Path of the downloaded file.
+
+    Raises:
+    RuntimeError: If yt-dlp produced no file.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "yt-dlp",
+        "-c",
+        "--no-warnings",
+        "--no-playlist",
+        "-f",
+        format_spec,
+        "-o",
+        output_template,
+        "--print",
+        "after_move:filepath",
+        *fragment_args(),
+        *extra_args,
+        url,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    lines = stdout.decode().strip().splitlines()
+    if not lines or not os.path.isfile(lines[-1]):
+        raise RuntimeError(stderr.decode().strip() or f"format {format_spec} not downloaded")
+    return lines[-1]
+
+
+async def _mux(video_path, audio_path, output_path):
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        video_path,
+        "-i",
+        audio_path,
+        "-map",
+        "0:v:0",
+        "-map",
+        "1:a:0",
+        "-c",
+        "copy",
+        output_path,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode:
+        logger.info(stderr.decode().strip())
+    return process.returncode == 0
+
+
+async def download_dash(url, video_format, audio_format, output_path, extra_args=()):
+    """
+    Fetch a DASH video track and its audio track in parallel, then mux them.
+
+    yt-dlp downloads the parts of "video+audio" one after the other; running
+    them as two processes overlaps both transfers. Muxing copies the streams
+    without re-encoding. If the codecs do not fit the requested container, the
+    result is written as .mkv instead.
+
+    Parameters:
+    - url (str): Media page URL.
+    - video_format (str): yt-dlp format ID of the video-only track.
+    - audio_format (str): Format selector for the audio track; "bestaudio"
+      prefers a track that fits the output container.
+    - output_path (str): Desired output file.
+    - extra_args (Iterable[str]): Extra yt-dlp options (proxy, credentials...).
+
+    Returns:
+    str: Path of the muxed file.
+
+    Raises:
+    RuntimeError: If a track could not be downloaded or muxed.
+    """
+    base, ext = os.path.splitext(output_path)
+    if audio_format == "bestaudio":
+        audio_ext = "m4a" if ext in (".mp4", ".m4v", ".mov") else ext.lstrip(".")
+        audio_format = f"bestaudio[ext={audio_ext}]/bestaudio"
+    tracks = await asyncio.gather(
+        fetch_stream(url, video_format, f"{base}.video.%(ext)s", extra_args),
+        fetch_stream(url, audio_format, f"{base}.audio.%(ext)s", extra_args),
+        return_exceptions=True,
+    )
+    try:
+        for track in tracks:
+            if isinstance(track, BaseException):
+                raise track
+        video_path, audio_path = tracks
+        for candidate in (output_path, f"{base}.mkv"):
+            if await _mux(video_path, audio_path, candidate):
+                return candidate
+    finally:
+        # Whichever track did arrive is removed, also when the other failed
+        for track in tracks:
+            if isinstance(track, str) and os.path.exists(track):
+                os.remove(track)
+    raise RuntimeError("could not mux the video and audio tracks")
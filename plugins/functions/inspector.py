@@ -0,0 +1,136 @@
+import time
+import asyncio
+import logging
+
+import aiohttp
+
+from config import Config
+from plugins.functions.rate_limit import TTLCache
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Servers that refuse HEAD answer these; a one-byte ranged GET tells us the same
+HEAD_REFUSED = (403, 405, 501)
+
+_cache = TTLCache(Config.INSPECT_CACHE_SIZE, Config.INSPECT_CACHE_TTL)
+
+
+class RemoteResource:
+    """What a server says about a URL, without downloading its body."""
+
+    __slots__ = (
+        "url",
+        "final_url",
+        "status",
+        "size",
+        "content_type",
+        "filename",
+        "accepts_ranges",
+        "etag",
+        "last_modified",
+        "error",
+        "fetched",
+    )
+
+    def __init__(self, url):
+        self.url = url
+        self.final_url = url
+        self.status = None
+        self.size = None
+        self.content_type = ""
+        self.filename = None
+        self.accepts_ranges = False
+        self.etag = None
+        self.last_modified = None
+        self.error = None
+        self.fetched = time.monotonic()
+
+    @property
+    def strategy(self):
+        """
+        How this resource can be downloaded.
+
+        Returns:
+        str: "segmented" (known size, byte ranges), "streamed" (known size)
+        or "unknown-length".
+        """
+        if self.size is None:
+            return "unknown-length"
+        return "segmented" if self.accepts_ranges else "streamed"
+
+    def _read(self, response):
+        self.status = response.status
+        self.final_url = str(response.url)
+        if response.status >= 400:
+            self.error = f"HTTP {response.status}"
+            return
+        headers = response.headers
+        self.content_type = headers.get("Content-Type", "").split(";")[0].strip()
+        content_range = headers.get("Content-Range", "")
+        if "/" in content_range and not content_range.endswith("/*"):
+            self.size = int(content_range.rsplit("/", 1)[1])
+        elif headers.get("Content-Length") and response.status != 206:
+            self.size = int(headers["Content-Length"])
+        self.accepts_ranges = (
+            response.status == 206 or headers.get("Accept-Ranges", "").lower() == "bytes"
+        )
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+        disposition = response.content_disposition
+        if disposition is not None and disposition.filename:
+            self.filename = disposition.filename
+
+
+async def _inspect(session, url):
+    resource = RemoteResource(url)
+    try:
+        async with session.head(url, allow_redirects=True) as response:
+            resource._read(response)
+        if resource.status in HEAD_REFUSED or (resource.error is None and resource.size is None):
+            resource = RemoteResource(url)
+            async with session.get(
+                url, headers={"Range": "bytes=0-0"}, allow_redirects=True
+            ) as response:
+                resource._read(response)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        resource.error = str(e) or type(e).__name__
+    return resource
+
+
+async def inspect(url, session=None, refresh=False):
+    """
+    Resolve redirects and read size, MIME type, filename, range support and
+    validators of a URL, from cache when another job asked recently.
+
+    Parameters:
+    - url (str): URL to inspect.
+    - session (aiohttp.ClientSession): Session to reuse; a short-lived one
+      with ``Config.PREFLIGHT_TIMEOUT`` is opened otherwise.
+    - refresh (bool): Ignore a cached result.
+
+    Returns:
+    RemoteResource: The result; ``error`` is set if the URL is unusable.
+    """
+    now = time.monotonic()
+    if not refresh:
+        resource = _cache.get(url, now)
+        # TTLCache expiry is idle time; results must also not outlive the TTL since fetched
+        if resource is not None and now - resource.fetched < Config.INSPECT_CACHE_TTL:
+            return resource
+    if session is None:
+        timeout = aiohttp.ClientTimeout(total=Config.PREFLIGHT_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            resource = await _inspect(session, url)
+    else:
+        resource = await _inspect(session, url)
+    if resource.error is None:
+        _cache.set(url, resource, now)
+    return resource
+
+
+live_settings.on_change("INSPECT_CACHE_SIZE", lambda value: setattr(_cache, "max_entries", value))
+live_settings.on_change("INSPECT_CACHE_TTL", lambda value: setattr(_cache, "ttl", value))
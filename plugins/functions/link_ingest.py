@@ -0,0 +1,158 @@
+import re
+import asyncio
+import logging
+from urllib.parse import urlsplit, urlunsplit
+
+import aiohttp
+from pyrogram import enums
+
+from config import Config
+from plugins.functions.inspector import inspect
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+URL_RE = re.compile(r"https?://[^\s,;\"'<>]+", re.IGNORECASE)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+LINK_FILE_EXTENSIONS = (".txt", ".csv")
+
+
+def trim_url(url):
+    """
+    Drop closing brackets that belong to the surrounding text, not the URL.
+
+    A trailing ")" or "]" is removed only while it has no opening partner in
+    the URL, so "https://en.wikipedia.org/wiki/Python_(programming_language)"
+    is kept whole while "(see https://example.com/file)" loses the ")".
+
+    Parameters:
+    - url (str): URL as found in the message.
+
+    Returns:
+    str: The URL, otherwise exactly as sent.
+    """
+    url = url.strip()
+    while url and url[-1] in ")]":
+        opening = "(" if url[-1] == ")" else "["
+        if url.count(opening) >= url.count(url[-1]):
+            break
+        url = url[:-1]
+    return url
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL, used only as the key to detect duplicates.
+
+    Lowercases scheme and host, drops default ports and fragments. Path and
+    query are kept as they are.
+
+    Parameters:
+    - url (str): URL as returned by ``trim_url``.
+
+    Returns:
+    str or None: Normalized URL, or None if it is not an http(s) URL.
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if parts.username:
+        credentials = parts.username + (f":{parts.password}" if parts.password else "")
+        netloc = f"{credentials}@{netloc}"
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def extract_links(message, document_text=""):
+    """
+    Collect every URL in a message: entities, plain text and an attached list.
+
+    Parameters:
+    - message: Pyrogram message.
+    - document_text (str): Contents of an attached .txt/.csv, if any.
+
+    Returns:
+    Tuple[List[str], int]: Unique URLs in order, as sent (the first of each
+    set of duplicates), and the number of duplicates dropped.
+    """
+    text = message.text or message.caption or ""
+    # Plain URL entities are part of the text and found by the regex; only
+    # text links carry a URL that is not visible in the text itself
+    found = [
+        entity.url
+        for entity in message.entities or message.caption_entities or []
+        if entity.type == enums.MessageEntityType.TEXT_LINK
+    ]
+    found += [trim_url(url) for url in URL_RE.findall(text)]
+    found += [trim_url(url) for url in URL_RE.findall(document_text)]
+
+    links = []
+    seen = set()
+    duplicates = 0
+    for url in found:
+        key = normalize_url(url)
+        if key is None:
+            continue
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        links.append(url)
+    return links, duplicates
+
+
+async def _preflight_one(session, semaphore, url):
+    async with semaphore:
+        resource = await inspect(url, session)
+    job = {
+        "url": url,
+        "size": resource.size,
+        "content_type": resource.content_type,
+        "error": resource.error,
+    }
+    if job["error"] is None and resource.content_type.startswith("text/html"):
+        job["error"] = "web page, not a file"
+    return job
+
+
+async def preflight(urls):
+    """
+    Probe links concurrently so bad ones are rejected before they are queued.
+
+    Parameters:
+    - urls (List[str]): URLs returned by ``extract_links``.
+
+    Returns:
+    List[dict]: One job per URL with "url", "size", "content_type" and "error"
+    (None when the link looks downloadable), in input order.
+    """
+    semaphore = asyncio.Semaphore(Config.PREFLIGHT_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=Config.PREFLIGHT_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        return await asyncio.gather(*(_preflight_one(session, semaphore, url) for url in urls))
+
+
+def order_jobs(jobs):
+    """
+    Order accepted jobs according to ``Config.QUEUE_ORDER``.
+
+    Parameters:
+    - jobs (List[dict]): Jobs returned by ``preflight``.
+
+    Returns:
+    List[dict]: Jobs in processing order; unknown sizes go last for "smallest".
+    """
+    if Config.QUEUE_ORDER == "smallest":
+        return sorted(jobs, key=lambda job: (job["size"] is None, job["size"] or 0))
+    if Config.QUEUE_ORDER == "largest":
+        return sorted(jobs, key=lambda job: (job["size"] is None, -(job["size"] or 0)))
+    return list(jobs)
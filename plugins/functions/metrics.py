@@ -0,0 +1,103 @@
+import threading
+
+_registry = {}
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(sorted(labels.items()))
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, value in list(self._values.items()):
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            lines.append(f"{self.name}{{{label_str}}} {value}" if label_str else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+def _get_or_create(cls, name, documentation):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation)
+        return metric
+
+
+def counter(name, documentation):
+    """
+    Get or create a process-wide counter.
+
+    Parameters:
+    - name (str): Metric name, Prometheus style (e.g. "loop_stalls_total").
+    - documentation (str): One-line description.
+
+    Returns:
+    Counter: The registered counter.
+    """
+    return _get_or_create(Counter, name, documentation)
+
+
+def gauge(name, documentation):
+    """
+    Get or create a process-wide gauge.
+
+    Parameters:
+    - name (str): Metric name, Prometheus style.
+    - documentation (str): One-line description.
+
+    Returns:
+    Gauge: The registered gauge.
+    """
+    return _get_or_create(Gauge, name, documentation)
+
+
+def render():
+    """
+    Render every registered metric in the Prometheus text exposition format.
+
+    Returns:
+    str: Metrics text.
+    """
+    return "\n".join(metric.render() for metric in list(_registry.values())) + "\n"
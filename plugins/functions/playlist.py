@@ -0,0 +1,90 @@
+import os
+import logging
+
+from config import Config
+from plugins.functions.help_ytdl import fragment_args
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Format policies offered for a whole playlist: key -> (label, send type, format)
+POLICIES = {
+    "best": ("🎬 Best quality", "video", "bestvideo*+bestaudio/best"),
+    "720": ("🎬 Up to 720p", "video", "bestvideo*[height<=720]+bestaudio/best[height<=720]/best"),
+    "480": ("🎬 Up to 480p", "video", "bestvideo*[height<=480]+bestaudio/best[height<=480]/best"),
+    "mp3": ("🎼 ᴍᴘ𝟹 (128 ᴋʙᴘs)", "audio", "128k"),
+    "file": ("📁 Documents", "file", "best"),
+}
+
+
+def probe_command(url, username=None, password=None):
+    """
+    yt-dlp command that prints one JSON line per video, listing playlists flat.
+
+    Playlist entries are not resolved here, so a long playlist costs one
+    listing request instead of a probe per entry.
+    """
+    command = [
+        "yt-dlp",
+        "--no-warnings",
+        "--allow-dynamic-mpd",
+        "--flat-playlist",
+        "--playlist-end",
+        str(Config.PLAYLIST_MAX_ENTRIES),
+        "-j",
+        url,
+    ]
+    if Config.HTTP_PROXY != "":
+        command.extend(["--proxy", Config.HTTP_PROXY])
+    if username is not None:
+        command.extend(["--username", username])
+    if password is not None:
+        command.extend(["--password", password])
+    return command
+
+
+def download_command(url, directory, send_type, format_spec, username=None, password=None):
+    """
+    yt-dlp command that downloads one playlist entry and prints its final path.
+
+    Parameters:
+    - url (str): Entry URL.
+    - directory (str): Where to save it.
+    - send_type (str): "video", "audio" or "file" (see ``POLICIES``).
+    - format_spec (str): Format selector, or the audio bitrate for "audio".
+
+    Returns:
+    List[str]: Command to execute.
+    """
+    command = [
+        "yt-dlp",
+        "-c",
+        "--no-warnings",
+        "--no-playlist",
+        "--max-filesize",
+        str(Config.TG_MAX_FILE_SIZE),
+        "--bidi-workaround",
+        "-o",
+        os.path.join(directory, "%(title).100B.%(ext)s"),
+        "--print",
+        "after_move:filepath",
+        *fragment_args(),
+    ]
+    if send_type == "audio":
+        command.extend(
+            ["--extract-audio", "--audio-format", "mp3", "--audio-quality", format_spec]
+        )
+    else:
+        command.extend(["-f", format_spec])
+        if send_type == "video":
+            command.extend(["--merge-output-format", "mp4"])
+    if Config.HTTP_PROXY != "":
+        command.extend(["--proxy", Config.HTTP_PROXY])
+    if username is not None:
+        command.extend(["--username", username])
+    if password is not None:
+        command.extend(["--password", password])
+    command.append(url)
+    return command
@@ -0,0 +1,169 @@
+import json
+import asyncio
+import logging
+from concurrent.futures.process import BrokenProcessPool
+
+from plugins.functions.cpu_pool import cpu_pool
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# A full `yt-dlp -j` line lists every format and easily exceeds asyncio's
+# default 64KB line limit; pass this as `limit=` to create_subprocess_exec
+JSON_LINE_LIMIT = 32 * 1024 * 1024
+
+# Lines at least this long are parsed in the CPU pool instead of on the loop
+OFFLOAD_BYTES = 1024 * 1024
+
+# yt-dlp -j lists every HLS/DASH fragment of every format; for segmented
+# sources these lists are nearly the whole line and nothing here reads them
+_FRAGMENTS = b'"fragments": ['
+
+
+def strip_fragments(line):
+    """
+    Cut the fragment lists out of a raw `yt-dlp -j` line before it is parsed.
+
+    Fragments are flat objects, so each list ends at the next "]". If a
+    fragment URL contains one, the result is not valid JSON and
+    ``ProbeRecord.parse`` falls back to the full line.
+
+    Parameters:
+    - line (bytes): One JSON document.
+
+    Returns:
+    bytes: The line with every fragment list emptied.
+    """
+    pieces = []
+    pos = 0
+    while True:
+        start = line.find(_FRAGMENTS, pos)
+        if start < 0:
+            break
+        end = line.find(b"]", start + len(_FRAGMENTS))
+        if end < 0:
+            break
+        pieces.append(line[pos: start + len(_FRAGMENTS)])
+        pos = end
+    if not pieces:
+        return line
+    pieces.append(line[pos:])
+    return b"".join(pieces)
+
+
+class FormatRecord:
+    """The fields of one yt-dlp format that the format keyboard uses."""
+
+    __slots__ = ("format_id", "label", "ext", "vcodec", "acodec", "size")
+
+    def __init__(self, info):
+        self.format_id = info.get("format_id")
+        self.label = info.get("format_note") or info.get("format")
+        self.ext = info.get("ext")
+        self.vcodec = info.get("vcodec")
+        self.acodec = info.get("acodec")
+        self.size = info.get("filesize") or info.get("filesize_approx") or 0
+
+
+class ProbeRecord:
+    """
+    What the bot keeps of one `yt-dlp -j` line.
+
+    Only the fields the keyboard, playlist and download steps read are kept,
+    so a probe costs a few hundred bytes after parsing instead of the whole
+    info dict.
+    """
+
+    __slots__ = (
+        "type",
+        "id",
+        "url",
+        "title",
+        "fulltitle",
+        "duration",
+        "playlist_title",
+        "format_id",
+        "ext",
+        "formats",
+    )
+
+    def __init__(self, info):
+        self.type = info.get("_type")
+        self.id = info.get("id")
+        self.url = None
+        for key in ("webpage_url", "url", "original_url"):
+            url = info.get(key)
+            if isinstance(url, str) and url.startswith(("http://", "https://")):
+                self.url = url
+                break
+        self.title = info.get("title")
+        self.fulltitle = info.get("fulltitle")
+        self.duration = info.get("duration")
+        self.playlist_title = info.get("playlist_title") or info.get("playlist")
+        self.format_id = info.get("format_id")
+        self.ext = info.get("ext")
+        formats = info.get("formats")
+        self.formats = None if formats is None else tuple(FormatRecord(f) for f in formats)
+
+    @classmethod
+    def parse(cls, line):
+        """
+        Build a record from one line of `yt-dlp -j` output.
+
+        Parameters:
+        - line (str or bytes): A single JSON document.
+
+        Returns:
+        ProbeRecord: The pruned record.
+        """
+        if isinstance(line, str):
+            line = line.encode()
+        try:
+            info = json.loads(strip_fragments(line))
+        except ValueError:
+            info = json.loads(line)
+        return cls(info)
+
+    @property
+    def is_flat_entry(self):
+        """Whether this is an unresolved playlist entry (``--flat-playlist``)."""
+        return self.type in ("url", "url_transparent")
+
+
+async def _parse_offloaded(line):
+    try:
+        # Parsing always finishes, so a timeout only means the pool is busy
+        return await cpu_pool.run(ProbeRecord.parse, line, recycle=False)
+    except (asyncio.TimeoutError, BrokenProcessPool) as e:
+        logger.info("CPU pool unavailable (%r), parsing the probe in a thread", e)
+        return await asyncio.to_thread(ProbeRecord.parse, line)
+
+
+async def iter_probe_records(stream):
+    """
+    Yield a ``ProbeRecord`` for every line yt-dlp prints, as soon as it is complete.
+
+    Parameters:
+    - stream (asyncio.StreamReader): The process's stdout.
+
+    Returns:
+    AsyncIterator[ProbeRecord]: Records, in output order.
+    """
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if len(line) >= OFFLOAD_BYTES:
+                record = await _parse_offloaded(line)
+            else:
+                record = ProbeRecord.parse(line)
+        except ValueError:
+            logger.info("Skipping unparsable yt-dlp line: %.200s", line)
+            continue
+        yield record
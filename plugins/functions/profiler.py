@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+
+from config import Config
+from plugins.functions.watchdog import PROJECT_ROOT
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Only one profile runs at a time; nothing is sampled or traced otherwise
+_busy = asyncio.Lock()
+
+
+def _label(code):
+    filename = code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(root, frames):
+    """Stack as "root;outer;...;inner" from innermost-first frames."""
+    return ";".join([root, *(_label(f.f_code) for f in reversed(frames))])
+
+
+def _thread_stack(frame):
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames
+
+
+def _task_stack(task):
+    """Frames of a task's await chain, outermost first (get_stack() stops at the first)."""
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for every thread and asyncio task.
+
+    A daemon thread wakes every ``interval`` seconds and records the stack
+    of each thread (what is running or blocked) and of each pending task on
+    the loop (where it is suspended). Results use the collapsed-stack format
+    read by flamegraph.pl, speedscope and similar tools. Nothing runs while
+    no profile is being taken.
+    """
+
+    def __init__(self, interval, loop=None, tasks=True):
+        self.interval = interval
+        self.loop = loop
+        self.tasks = tasks
+        self.samples = 0
+        self.counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _sample(self, own_ident):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident != own_ident:
+                root = f"thread:{names.get(ident, ident)}"
+                self.counts[_collapse(root, _thread_stack(frame))] += 1
+            # Do not keep the last frame (and its locals) alive until the next sample
+            frame = None
+        if self.loop is None or not self.tasks:
+            return
+        try:
+            tasks = asyncio.all_tasks(self.loop)
+        except RuntimeError:
+            # The task set changed while it was being copied; skip this round
+            return
+        for task in tasks:
+            frames = _task_stack(task)
+            if frames:
+                self.counts[_collapse(f"task:{task.get_name()}", frames[::-1])] += 1
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            try:
+                self._sample(own_ident)
+            except Exception:
+                logger.exception("Profiler sample failed")
+                return
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self):
+        """Collapsed stacks, one "stack count" line each, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+async def profile_cpu(seconds, interval=None):
+    """
+    Sample every thread and task of the running loop for ``seconds``.
+
+    Parameters:
+    - seconds (float): How long to sample.
+    - interval (float): Seconds between samples; defaults to ``Config.PROFILE_INTERVAL``.
+
+    Returns:
+    Tuple[str, int]: Collapsed stacks and the number of samples taken.
+    """
+    async with _busy:
+        profiler = SamplingProfiler(interval or Config.PROFILE_INTERVAL, asyncio.get_running_loop())
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(profiler.stop)
+        return profiler.collapsed(), profiler.samples
+
+
+async def profile_memory(seconds, limit=50):
+    """
+    Compare allocations before and after ``seconds`` with tracemalloc.
+
+    Tracing is only switched on for the duration (unless it was already
+    on), so there is no cost while no profile is running.
+
+    Parameters:
+    - seconds (float): How long to trace.
+    - limit (int): Source lines to report.
+
+    Returns:
+    str: The lines whose allocations grew the most, largest first.
+    """
+    async with _busy:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(Config.PROFILE_TRACEMALLOC_FRAMES)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "traceback")
+        lines = [
+            f"# tracemalloc diff over {seconds}s at {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"# traced now {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB",
+            "",
+        ]
+        for stat in stats[:limit]:
+            lines.append(
+                f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks), "
+                f"now {stat.size / 1024:.1f} KiB in {stat.count} blocks"
+            )
+            lines.extend(f"    {line}" for line in stat.traceback.format(most_recent_first=True))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,277 @@
+import time
+import asyncio
+import logging
+import functools
+import contextlib
+from collections import OrderedDict
+
+from config import Config
+from plugins.functions.settings import live_settings
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(spec):
+    """
+    Parse a "<amount>/<seconds>" rate specification.
+
+    Parameters:
+    - spec (str): Rate such as "5/60" (five per minute, burst of five).
+
+    Returns:
+    Tuple[float, float]: Refill rate per second and bucket capacity.
+    """
+    amount, _, seconds = str(spec).partition("/")
+    amount = float(amount)
+    seconds = float(seconds or 1)
+    return amount / seconds, amount
+
+
+class TokenBucket:
+    """Classic token bucket; refilled lazily whenever it is touched."""
+
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = now
+
+    def _refill(self, now):
+        elapsed = now - self.stamp
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.stamp = now
+
+    def consume(self, amount, now):
+        """
+        Take tokens from the bucket if enough are available.
+
+        Parameters:
+        - amount (float): Tokens required.
+        - now (float): Current monotonic time.
+
+        Returns:
+        float: 0 when the tokens were taken, otherwise seconds until they would be.
+        """
+        self._refill(now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.rate
+
+    def charge(self, amount, now):
+        """Take tokens unconditionally, letting the bucket go into debt."""
+        self._refill(now)
+        self.tokens -= amount
+
+    def retry_after(self, now):
+        """Seconds until the bucket is out of debt (0 if it has tokens left)."""
+        self._refill(now)
+        if self.tokens > 0:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return -self.tokens / self.rate
+
+
+class TTLCache:
+    """
+    Bounded LRU mapping whose entries also expire after ``ttl`` seconds idle.
+
+    Every access moves the entry to the end, so the front of the dict always
+    holds the least recently used (and therefore first to expire) entries and
+    eviction stays O(1) amortized.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def _expire(self, now):
+        while self._data:
+            key, (stamp, _) = next(iter(self._data.items()))
+            if now - stamp < self.ttl and len(self._data) <= self.max_entries:
+                break
+            del self._data[key]
+
+    def get(self, key, now, default=None):
+        item = self._data.get(key)
+        if item is None or now - item[0] >= self.ttl:
+            return default
+        self._data[key] = (now, item[1])
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key, value, now):
+        self._data[key] = (now, value)
+        self._data.move_to_end(key)
+        self._expire(now)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def values(self):
+        """Every stored value, expired or not, without touching recency."""
+        return [item[1] for item in self._data.values()]
+
+    def clear(self):
+        self._data.clear()
+
+
+class ConcurrencyLimit:
+    """
+    Semaphore whose size can be changed while tasks hold it.
+
+    ``resize`` swaps in a new semaphore; tasks release the one they
+    acquired, so work already running finishes under the old limit.
+    """
+
+    def __init__(self, value):
+        self._semaphore = asyncio.Semaphore(value)
+
+    def resize(self, value):
+        self._semaphore = asyncio.Semaphore(value)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold one slot for the duration of the ``async with`` block."""
+        semaphore = self._semaphore
+        async with semaphore:
+            yield
+
+
+class RateLimiter:
+    """
+    Per-user token buckets for the different kinds of work a user can ask for.
+
+    State is kept only for recently active users, in a bounded ``TTLCache``,
+    so memory is O(active users) and each check is O(1).
+    """
+
+    def __init__(self, limits, max_users, idle_ttl, privileged=()):
+        """
+        Parameters:
+        - limits (dict): Mapping of kind ("probe", "download", "bytes") to a rate
+          spec; "0" leaves that kind unlimited.
+        - max_users (int): Maximum number of users to keep state for.
+        - idle_ttl (float): Seconds after which an idle user's state is dropped.
+        - privileged (Iterable): User IDs that bypass every limit.
+        """
+        self.limits = {}
+        for kind, spec in limits.items():
+            rate, capacity = parse_rate(spec)
+            # Kinds without a limit are not tracked, as in the RPC governor
+            if rate > 0:
+                self.limits[kind] = (rate, capacity)
+        self.privileged = set()
+        for user_id in privileged:
+            try:
+                self.privileged.add(int(user_id))
+            except (TypeError, ValueError):
+                continue
+        self._users = TTLCache(max_users, idle_ttl)
+
+    def set_limit(self, kind, spec):
+        """
+        Change a limit; users' current buckets switch to it immediately.
+
+        Parameters:
+        - kind (str): "probe", "download" or "bytes".
+        - spec (str): Rate spec such as "5/60"; "0" removes the limit.
+        """
+        rate, capacity = parse_rate(spec)
+        if rate <= 0:
+            self.limits.pop(kind, None)
+            for buckets in self._users.values():
+                buckets.pop(kind, None)
+            return
+        self.limits[kind] = (rate, capacity)
+        for buckets in self._users.values():
+            bucket = buckets.get(kind)
+            if bucket is not None:
+                bucket.rate = rate
+                bucket.capacity = capacity
+                bucket.tokens = min(bucket.tokens, capacity)
+
+    def is_privileged(self, user_id):
+        return int(user_id) in self.privileged
+
+    def _bucket(self, user_id, kind, now):
+        buckets = self._users.get(user_id, now)
+        if buckets is None:
+            buckets = {}
+            self._users.set(user_id, buckets, now)
+        bucket = buckets.get(kind)
+        if bucket is None:
+            rate, capacity = self.limits[kind]
+            bucket = buckets[kind] = TokenBucket(rate, capacity, now)
+        return bucket
+
+    def check(self, user_id, kind, amount=1):
+        """
+        Consume ``amount`` tokens of ``kind`` for a user.
+
+        A rejected request does not consume anything, so retrying after the
+        returned delay is guaranteed to succeed.
+
+        Parameters:
+        - user_id (int): Telegram user ID.
+        - kind (str): Limit to check ("probe", "download" or "bytes").
+        - amount (float): Tokens to consume.
+
+        Returns:
+        float: 0 if allowed, otherwise seconds the user has to wait.
+        """
+        user_id = int(user_id)
+        if user_id in self.privileged or kind not in self.limits:
+            return 0.0
+        now = time.monotonic()
+        return self._bucket(user_id, kind, now).consume(amount, now)
+
+    def charge(self, user_id, kind, amount):
+        """Account for work after the fact (e.g. bytes actually downloaded)."""
+        user_id = int(user_id)
+        if user_id in self.privileged or kind not in self.limits:
+            return
+        now = time.monotonic()
+        self._bucket(user_id, kind, now).charge(amount, now)
+
+    def retry_after(self, user_id, kind):
+        """Seconds until a user has budget of ``kind`` left, without consuming it."""
+        user_id = int(user_id)
+        if user_id in self.privileged or kind not in self.limits:
+            return 0.0
+        now = time.monotonic()
+        return self._bucket(user_id, kind, now).retry_after(now)
+
+
+LIMIT_SETTINGS = {
+    "probe": "PROBE_RATE_LIMIT",
+    "download": "DOWNLOAD_RATE_LIMIT",
+    "bytes": "BYTES_RATE_LIMIT",
+}
+
+rate_limiter = RateLimiter(
+    {kind: getattr(Config, name) for kind, name in LIMIT_SETTINGS.items()},
+    max_users=Config.RATE_LIMIT_MAX_USERS,
+    idle_ttl=Config.RATE_LIMIT_IDLE_TTL,
+    privileged=Config.AUTH_USERS,
+)
+
+for _kind, _name in LIMIT_SETTINGS.items():
+    live_settings.on_change(_name, functools.partial(rate_limiter.set_limit, _kind))
@@ -0,0 +1,134 @@
+import json
+import time
+import secrets
+import sqlite3
+import logging
+from collections import OrderedDict
+
+from config import Config
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """
+    Short-lived state behind inline keyboards, addressed by opaque tokens.
+
+    Entries live in memory, bounded by count and by (approximate) bytes and
+    expire ``ttl`` seconds after creation. With ``persist_path`` set they are
+    also written through to SQLite, so buttons keep working across restarts.
+    Tokens are lowercase hex, which keeps ``callback_data`` short and can
+    never collide with the fixed callback names ("home", "close"...).
+    """
+
+    def __init__(self, ttl, max_entries, max_bytes, persist_path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(token TEXT PRIMARY KEY, expires REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evict(self, now):
+        while self._data:
+            token, (expires, size, _) = next(iter(self._data.items()))
+            if (
+                expires > now
+                and len(self._data) <= self.max_entries
+                and self._bytes <= self.max_bytes
+            ):
+                break
+            del self._data[token]
+            self._bytes -= size
+
+    def _remember(self, token, expires, encoded, value):
+        self._data[token] = (expires, len(encoded), value)
+        self._bytes += len(encoded)
+
+    def put(self, value, private=None):
+        """
+        Store a JSON-serializable value.
+
+        Parameters:
+        - value: Session data; keep it to what the next step needs.
+        - private (dict): Extra keys (credentials) merged into ``value`` in
+          memory only; they are never written to SQLite, so after a restart
+          the session comes back without them.
+
+        Returns:
+        str: Token to embed in ``callback_data``.
+        """
+        now = time.time()
+        encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        token = secrets.token_hex(4)
+        while token in self._data:
+            token = secrets.token_hex(4)
+        expires = now + self.ttl
+        self._remember(token, expires, encoded, {**value, **private} if private else value)
+        self._evict(now)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (token, expires, encoded)
+            )
+            self._db.commit()
+        return token
+
+    def get(self, token):
+        """
+        Look a session up.
+
+        Parameters:
+        - token (str): Token returned by ``put``.
+
+        Returns:
+        The stored value, or None if it is unknown or expired.
+        """
+        now = time.time()
+        item = self._data.get(token)
+        if item is not None:
+            if item[0] > now:
+                return item[2]
+            self.pop(token)
+            return None
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT expires, data FROM sessions WHERE token = ? AND expires > ?", (token, now)
+        ).fetchone()
+        if row is None:
+            return None
+        value = json.loads(row[1])
+        self._remember(token, row[0], row[1], value)
+        self._evict(now)
+        return value
+
+    def pop(self, token):
+        item = self._data.pop(token, None)
+        if item is not None:
+            self._bytes -= item[1]
+        if self._db is not None:
+            self._db.execute("DELETE FROM sessions WHERE token = ?", (token,))
+            self._db.commit()
+        return None if item is None else item[2]
+
+
+sessions = SessionStore(
+    ttl=Config.SESSION_TTL,
+    max_entries=Config.SESSION_MAX_ENTRIES,
+    max_bytes=Config.SESSION_MAX_BYTES,
+    persist_path=f"{Config.DOWNLOAD_LOCATION}/sessions.sqlite3" if Config.SESSION_PERSIST else None,
+)
@@ -0,0 +1,228 @@
+import hmac
+import logging
+
+from config import Config
+from plugins.functions.metrics import counter
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+SETTING_CHANGES = counter("setting_changes_total", "Live settings changed at runtime")
+
+# Settings that may be changed while the bot runs, with their smallest
+# allowed value (None for rate specs and flags). Components either read
+# ``Config`` when they need the value or register an ``on_change`` hook,
+# which also validates values such as rate specs
+TUNABLE = {
+    # Transfers
+    "CHUNK_SIZE": 1,
+    "PROCESS_MAX_TIMEOUT": 0,
+    "FRAGMENT_CONCURRENCY": 1,
+    "FRAGMENT_RETRIES": 0,
+    "UPLOAD_MMAP": None,
+    "UPLOAD_MMAP_MIN_SIZE": 0,
+    "UPLOAD_READAHEAD": 0,
+    # Concurrency
+    "BOT_WORKERS": 1,
+    "CPU_WORKERS": 0,
+    "CPU_TASK_TIMEOUT": 1,
+    "SPLIT_UPLOAD_CONCURRENCY": 1,
+    "PLAYLIST_CONCURRENCY": 1,
+    "PREFLIGHT_CONCURRENCY": 1,
+    "SCREENSHOT_CONCURRENCY": 1,
+    "AUDIO_ENCODE_CONCURRENCY": 1,
+    "DELIVERY_CONCURRENCY": 1,
+    # Per-user caps
+    "PROBE_RATE_LIMIT": None,
+    "DOWNLOAD_RATE_LIMIT": None,
+    "BYTES_RATE_LIMIT": None,
+    "PLAYLIST_MAX_ENTRIES": 1,
+    # Bandwidth and Telegram call budgets
+    "BANDWIDTH_DOWN_GLOBAL": 0,
+    "BANDWIDTH_DOWN_USER": 0,
+    "BANDWIDTH_UP_GLOBAL": 0,
+    "BANDWIDTH_UP_USER": 0,
+    "BANDWIDTH_FREE_BYTES": 0,
+    "RPC_GLOBAL_LIMIT": None,
+    "RPC_CHAT_LIMIT": None,
+    "RPC_MAX_FLOOD_WAIT": 0,
+    # Caches
+    "THUMB_CACHE_SIZE": 0,
+    "AUDIO_CACHE_SIZE": 0,
+    "AUDIO_SOURCE_CACHE_SIZE": 0,
+    "INSPECT_CACHE_SIZE": 1,
+    "INSPECT_CACHE_TTL": 0,
+    "CONTENT_INDEX_SIZE": 1,
+}
+
+
+def _parse(name, raw, current, minimum):
+    if isinstance(current, bool):
+        text = str(raw).strip().lower()
+        if text in ("1", "true", "yes", "on"):
+            return True
+        if text in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"{name} takes true or false")
+    if isinstance(current, (int, float)):
+        if isinstance(current, int):
+            try:
+                value = int(str(raw).strip())
+            except ValueError:
+                raise ValueError(f"{name} takes a whole number") from None
+        else:
+            try:
+                value = float(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} takes a number") from None
+        if minimum is not None and value < minimum:
+            raise ValueError(f"{name} must be at least {minimum}")
+        return value
+    return str(raw).strip()
+
+
+class LiveSettings:
+    """
+    Registry of the ``Config`` values that can be changed without a restart.
+
+    Values stay on ``Config`` itself, so code that reads ``Config.X`` when it
+    needs it sees a change immediately. Components that copy a value at
+    import (semaphores, buckets, cache bounds) register an ``on_change``
+    hook to apply it. In frontend mode ``change`` also publishes the value
+    through the broker, and worker.py applies it before its next job.
+    Changes last until the front-end restarts.
+    """
+
+    def __init__(self, tunable):
+        self.tunable = dict(tunable)
+        self._hooks = {}
+
+    def __contains__(self, name):
+        return name in self.tunable
+
+    def get(self, name):
+        return getattr(Config, name)
+
+    def items(self):
+        """(name, value) of every live setting, in declaration order."""
+        return [(name, getattr(Config, name)) for name in self.tunable]
+
+    def on_change(self, name, callback):
+        """
+        Call ``callback(value)`` whenever ``name`` is changed.
+
+        Parameters:
+        - name (str): Setting name.
+        - callback: Function taking the new value.
+        """
+        if name not in self.tunable:
+            raise KeyError(name)
+        self._hooks.setdefault(name, []).append(callback)
+
+    def set(self, name, raw):
+        """
+        Change a setting and apply it to the running components.
+
+        Parameters:
+        - name (str): Setting name, case-insensitive.
+        - raw: New value, as text or already typed.
+
+        Returns:
+        Tuple[str, object]: The setting name and its parsed value.
+
+        Raises:
+        KeyError: If the setting is unknown or not live.
+        ValueError: If the value does not parse, is out of range or could
+        not be applied.
+        """
+        name = name.upper()
+        if name not in self.tunable:
+            raise KeyError(name)
+        old = getattr(Config, name)
+        value = _parse(name, raw, old, self.tunable[name])
+        setattr(Config, name, value)
+        try:
+            for callback in self._hooks.get(name, ()):
+                callback(value)
+        except ValueError:
+            setattr(Config, name, old)
+            raise
+        except Exception as e:
+            setattr(Config, name, old)
+            raise ValueError(f"{name} could not be applied: {e}") from e
+        SETTING_CHANGES.inc(name=name)
+        logger.info("Setting %s changed: %r -> %r", name, old, value)
+        return name, value
+
+    async def change(self, name, raw):
+        """
+        ``set`` a setting here and, in frontend mode, on the workers too.
+
+        Parameters:
+        - name (str): Setting name, case-insensitive.
+        - raw: New value, as text or already typed.
+
+        Returns:
+        Tuple[str, object]: The setting name and its parsed value.
+
+        Raises:
+        KeyError: If the setting is unknown or not live.
+        ValueError: If the value does not parse, is out of range or could
+        not be applied.
+        """
+        name, value = self.set(name, raw)
+        if Config.BOT_MODE == "frontend":
+            from plugins.functions.broker import get_broker
+
+            await get_broker().publish_setting(name, value)
+        return name, value
+
+
+live_settings = LiveSettings(TUNABLE)
+
+
+def mount_settings_routes():
+    """
+    Expose the live settings on the health server.
+
+    GET /settings lists them; POST /settings with a JSON object of
+    name -> value changes them. Both require ``ADMIN_TOKEN`` as a bearer token.
+    """
+    from aiohttp import web
+
+    from keep_alive import mount
+
+    def authorized(request):
+        return hmac.compare_digest(
+            request.headers.get("Authorization", "").encode(), f"Bearer {Config.ADMIN_TOKEN}".encode()
+        )
+
+    async def show(request):
+        if not authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return web.json_response(dict(live_settings.items()))
+
+    async def change(request):
+        if not authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return web.json_response({"error": "expected a JSON object of name -> value"}, status=400)
+        changed, errors = {}, {}
+        for name, value in data.items():
+            try:
+                name, value = await live_settings.change(name, value)
+                changed[name] = value
+            except KeyError:
+                errors[name] = "unknown setting"
+            except ValueError as e:
+                errors[name] = str(e)
+        return web.json_response({"changed": changed, "errors": errors}, status=400 if errors else 200)
+
+    mount("GET", "/settings", show)
+    mount("POST", "/settings", change)
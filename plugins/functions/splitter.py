@@ -0,0 +1,417 @@
+import os
+import glob
+import json
+import asyncio
+import logging
+import contextlib
+import mimetypes
+
+from config import Config
+from plugins.functions.bandwidth import shaper
+from plugins.functions.upload_reader import upload_source
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Telegram albums hold at most 10 items
+ALBUM_SIZE = 10
+
+
+def part_budget():
+    """Target size of one part, with headroom for bitrate variation."""
+    return int(Config.TG_MAX_FILE_SIZE * Config.SPLIT_PART_RATIO)
+
+
+class VolumeSink:
+    """Writes a stream into fixed-size volumes: name.001, name.002, ..."""
+
+    # Volumes are only playable once joined back together
+    playable = False
+
+    def __init__(self, base_path, volume_size):
+        self.base_path = base_path
+        self.volume_size = volume_size
+        self.parts = []
+        self._file = None
+        self._written = 0
+
+    def _next_volume(self):
+        if self._file is not None:
+            self._file.close()
+        path = f"{self.base_path}.{len(self.parts) + 1:03d}"
+        self.parts.append(path)
+        self._file = open(path, "wb")
+        self._written = 0
+
+    async def write(self, chunk):
+        view = memoryview(chunk)
+        while view:
+            if self._file is None or self._written >= self.volume_size:
+                self._next_volume()
+            room = self.volume_size - self._written
+            self._file.write(view[:room])
+            self._written += min(room, len(view))
+            view = view[room:]
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+        return self.parts
+
+    async def abort(self):
+        """Stop after a failed download and remove every volume written."""
+        await self.close()
+        for part in self.parts:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part)
+        self.parts = []
+
+
+def streamable(head):
+    """
+    Whether ffmpeg can demux a stream that starts with ``head`` from a pipe.
+
+    MP4/MOV files with their index (moov) after the media data cannot be read
+    without seeking; other containers are assumed to stream.
+
+    Parameters:
+    - head (bytes): First bytes of the stream.
+
+    Returns:
+    bool: False for MP4 data before its index, or too little data to tell.
+    """
+    if head[4:8] != b"ftyp":
+        return True
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset: offset + 4], "big")
+        kind = head[offset + 4: offset + 8]
+        if kind == b"moov":
+            return True
+        if kind == b"mdat" or size < 8:
+            return False
+        offset += size
+    return False
+
+
+class SegmentSink:
+    """
+    Pipes a video stream through ffmpeg's segment muxer while it downloads.
+
+    Streams are copied, never re-encoded, and cuts happen on keyframes, so
+    every part is independently playable. A finished file can be segmented
+    the same way by passing it as ``source``.
+    """
+
+    playable = True
+
+    def __init__(self, base_path, segment_time, source="pipe:0"):
+        root, ext = os.path.splitext(base_path)
+        self._pattern = f"{root}.part%03d{ext or '.mkv'}"
+        self._glob = f"{glob.escape(root)}.part[0-9][0-9][0-9]{ext or '.mkv'}"
+        self.segment_time = segment_time
+        self.source = source
+        self.process = None
+        self.parts = []
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-i",
+            self.source,
+            "-map",
+            "0",
+            "-c",
+            "copy",
+            "-f",
+            "segment",
+            "-segment_time",
+            str(self.segment_time),
+            "-reset_timestamps",
+            "1",
+            self._pattern,
+            stdin=asyncio.subprocess.PIPE if self.source == "pipe:0" else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        return self
+
+    async def write(self, chunk):
+        try:
+            self.process.stdin.write(chunk)
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg gave up on the stream; close() reports why
+            await self.close()
+            raise RuntimeError("ffmpeg stopped reading the stream") from None
+
+    async def close(self):
+        """
+        Wait for ffmpeg and collect the parts.
+
+        Returns:
+        List[str]: Part paths, in order.
+
+        Raises:
+        RuntimeError: If ffmpeg failed, wrote nothing, or a part is still
+        larger than ``Config.TG_MAX_FILE_SIZE``; partial parts are removed.
+        """
+        if self.process.stdin is not None:
+            self.process.stdin.close()
+        _, stderr = await self.process.communicate()
+        self.parts = sorted(glob.glob(self._glob))
+        error = None
+        if self.process.returncode:
+            error = stderr.decode().strip() or f"ffmpeg exited with {self.process.returncode}"
+        elif not self.parts:
+            error = "ffmpeg wrote no parts"
+        elif any(os.path.getsize(part) > Config.TG_MAX_FILE_SIZE for part in self.parts):
+            error = "a part is still larger than Telegram allows"
+        if error is not None:
+            for part in self.parts:
+                os.remove(part)
+            self.parts = []
+            raise RuntimeError(error)
+        return self.parts
+
+    async def abort(self):
+        """Kill ffmpeg after a failed download and remove the parts it wrote."""
+        if self.process is not None and self.process.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                self.process.kill()
+            await self.process.wait()
+        for part in glob.glob(self._glob):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part)
+        self.parts = []
+
+
+async def probe_duration(source):
+    """
+    Duration of a local file or URL via ffprobe (reads only the headers).
+
+    Parameters:
+    - source (str): Path or URL.
+
+    Returns:
+    float: Duration in seconds, 0 if unknown.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe",
+        "-v",
+        "quiet",
+        "-print_format",
+        "json",
+        "-show_format",
+        source,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    stdout, _ = await process.communicate()
+    try:
+        return float(json.loads(stdout.decode() or "{}").get("format", {}).get("duration", 0) or 0)
+    except ValueError:
+        return 0.0
+
+
+def _segment_time(duration, total_size):
+    return max(10, int(duration * part_budget() / total_size))
+
+
+async def open_split_sink(base_path, total_size, duration=None, is_video=False, head=b""):
+    """
+    Sink that splits an oversized download into uploadable parts as it arrives.
+
+    Videos with a known duration that ffmpeg can read from a pipe are cut at
+    keyframes; anything else is written as fixed-size volumes.
+
+    Parameters:
+    - base_path (str): Path the whole file would have had.
+    - total_size (int): Expected size in bytes.
+    - duration (float): Media duration in seconds, if known.
+    - is_video (bool): Whether the stream is a video.
+    - head (bytes): First bytes of the stream, to check it can be piped.
+
+    Returns:
+    VolumeSink or SegmentSink: Object with ``write(chunk)`` and ``close()``;
+    after ``close()`` its ``parts`` lists the part files in order.
+    ``SegmentSink.close()`` raises RuntimeError if ffmpeg failed; if the
+    download fails, ``abort()`` stops the sink and removes what it wrote.
+    """
+    if is_video and duration and streamable(head):
+        return await SegmentSink(base_path, _segment_time(duration, total_size)).start()
+    return VolumeSink(base_path, part_budget())
+
+
+def _cut_volumes(path, volume_size):
+    parts = []
+    try:
+        with open(path, "rb") as source:
+            while True:
+                part = f"{path}.{len(parts) + 1:03d}"
+                parts.append(part)
+                with open(part, "wb") as target:
+                    copied = 0
+                    while copied < volume_size:
+                        chunk = source.read(min(1024 * 1024, volume_size - copied))
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        copied += len(chunk)
+                if not copied:
+                    os.remove(parts.pop())
+                    return parts
+    except BaseException:
+        for part in parts:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part)
+        raise
+
+
+async def split_file(path, is_video=False):
+    """
+    Split a finished download that is too large for Telegram, then remove it.
+
+    Videos are segmented at keyframes when ffmpeg manages to; otherwise (and
+    for other files) fixed-size volumes are cut.
+
+    Parameters:
+    - path (str): The downloaded file.
+    - is_video (bool): Whether to try keyframe segmenting.
+
+    Returns:
+    Tuple[List[str], bool]: Part paths in order, and whether each plays on its own.
+    If splitting fails the parts written so far are removed; ``path`` is kept.
+    """
+    duration = await probe_duration(path) if is_video else None
+    if duration:
+        sink = SegmentSink(path, _segment_time(duration, os.path.getsize(path)), source=path)
+        await sink.start()
+        try:
+            parts = await sink.close()
+            os.remove(path)
+            return parts, True
+        except RuntimeError as e:
+            logger.info("Segmenting %s failed, cutting volumes instead: %s", path, e)
+        except BaseException:
+            await asyncio.shield(sink.abort())
+            raise
+    parts = await asyncio.to_thread(_cut_volumes, path, part_budget())
+    os.remove(path)
+    return parts, False
+
+
+async def _upload_part(client, chat_id, peer, path, is_video, semaphore):
+    from pyrogram import raw
+
+    async with semaphore:
+        with upload_source(path) as source:
+            file = await client.save_file(source, progress=shaper.progress(chat_id))
+        attributes = [raw.types.DocumentAttributeFilename(file_name=os.path.basename(path))]
+        if is_video:
+            from plugins.functions.help_Nekmo_ffmpeg import probe_media
+
+            meta = await probe_media(path)
+            attributes.append(
+                raw.types.DocumentAttributeVideo(
+                    duration=int(meta["duration"]),
+                    w=meta["width"],
+                    h=meta["height"],
+                    supports_streaming=True,
+                )
+            )
+        media = await client.invoke(
+            raw.functions.messages.UploadMedia(
+                peer=peer,
+                media=raw.types.InputMediaUploadedDocument(
+                    file=file,
+                    mime_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+                    attributes=attributes,
+                    force_file=not is_video,
+                ),
+            )
+        )
+        return raw.types.InputMediaDocument(
+            id=raw.types.InputDocument(
+                id=media.document.id,
+                access_hash=media.document.access_hash,
+                file_reference=media.document.file_reference,
+            )
+        )
+
+
+async def upload_album(client, chat_id, parts, caption="", is_video=False, reply_to_message_id=None):
+    """
+    Upload parts in parallel, then post them in order as albums.
+
+    Albums are balanced so none holds a single item; a lone part is sent
+    as a plain message.
+
+    Parameters:
+    - client: Pyrogram client.
+    - chat_id (int): Destination chat.
+    - parts (List[str]): Part paths, in order.
+    - caption (str): Caption for the first part.
+    - is_video (bool): Send parts as streamable videos instead of documents.
+    - reply_to_message_id (int): Message the first album replies to.
+
+    Returns:
+    List[int]: ID of the first message of each album sent.
+    """
+    from pyrogram import raw
+
+    peer = await client.resolve_peer(chat_id)
+    semaphore = asyncio.Semaphore(Config.SPLIT_UPLOAD_CONCURRENCY)
+    media = await asyncio.gather(
+        *(_upload_part(client, chat_id, peer, path, is_video, semaphore) for path in parts)
+    )
+    if len(media) == 1:
+        # Telegram rejects an album of one
+        result = await client.invoke(
+            raw.functions.messages.SendMedia(
+                peer=peer,
+                media=media[0],
+                reply_to_msg_id=reply_to_message_id,
+                random_id=client.rnd_id(),
+                message=caption,
+                entities=[],
+            )
+        )
+        return [
+            update.message.id
+            for update in result.updates
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage))
+        ][:1]
+    # Balanced albums (11 parts go as 6 + 5), so none is left with a single item
+    size = -(-len(media) // -(-len(media) // ALBUM_SIZE))
+    album_ids = []
+    for start in range(0, len(media), size):
+        result = await client.invoke(
+            raw.functions.messages.SendMultiMedia(
+                peer=peer,
+                reply_to_msg_id=reply_to_message_id if start == 0 else None,
+                multi_media=[
+                    raw.types.InputSingleMedia(
+                        media=item,
+                        random_id=client.rnd_id(),
+                        message=f"{caption}\n\nPart {start + index + 1}/{len(media)}".strip(),
+                        entities=[],
+                    )
+                    for index, item in enumerate(media[start: start + size])
+                ],
+            )
+        )
+        ids = [
+            update.message.id
+            for update in result.updates
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage))
+        ]
+        if ids:
+            album_ids.append(min(ids))
+    return album_ids
@@ -0,0 +1,191 @@
+import io
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+
+from config import Config
+from plugins.functions.cpu_pool import cpu_pool
+from plugins.functions.help_Nekmo_ffmpeg import probe_media
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Telegram silently drops thumbnails above these limits
+THUMB_MAX_SIDE = 320
+THUMB_MAX_BYTES = 200 * 1024
+
+# user_id -> (st_mtime_ns of the stored file, JPEG bytes); the file may be
+# replaced or deleted by another process, so entries are checked against it
+_cache = OrderedDict()
+
+
+def thumb_path(user_id):
+    """Location of a user's custom thumbnail."""
+    return f"{Config.DOWNLOAD_LOCATION}/{user_id}.jpg"
+
+
+def normalize_image(data):
+    """
+    Turn any image into a Telegram-ready thumbnail.
+
+    The image is resized to fit 320x320 and re-encoded as a baseline JPEG,
+    lowering quality until it fits in 200KB. Re-encoding drops EXIF data.
+
+    Parameters:
+    - data (bytes): Source image.
+
+    Returns:
+    bytes: JPEG thumbnail.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((THUMB_MAX_SIDE, THUMB_MAX_SIDE))
+        for quality in (90, 80, 70, 60, 50, 40, 30):
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=quality, optimize=True)
+            if out.tell() <= THUMB_MAX_BYTES:
+                break
+    return out.getvalue()
+
+
+def _remember(user_id, mtime_ns, data):
+    _cache[user_id] = (mtime_ns, data)
+    _cache.move_to_end(user_id)
+    while len(_cache) > Config.THUMB_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def _as_file(data):
+    # pyrogram takes the upload name from .name; BytesIO shares the bytes
+    file = io.BytesIO(data)
+    file.name = "thumb.jpg"
+    return file
+
+
+async def save_thumbnail(user_id, source_path):
+    """
+    Normalize an image sent by a user and store it as their thumbnail.
+
+    Parameters:
+    - user_id (int): Telegram user ID.
+    - source_path (str): Image as downloaded from Telegram.
+
+    Returns:
+    str: Path of the stored thumbnail.
+    """
+    with open(source_path, "rb") as f:
+        data = f.read()
+    data = await cpu_pool.run(normalize_image, data)
+    destination = thumb_path(user_id)
+    # Written aside and renamed, so other processes never read half a file
+    with open(f"{destination}.tmp", "wb") as f:
+        f.write(data)
+    os.replace(f"{destination}.tmp", destination)
+    _remember(user_id, os.stat(destination).st_mtime_ns, data)
+    return destination
+
+
+def forget_thumbnail(user_id):
+    """
+    Drop a user's thumbnail from this process's cache (after /delthumb).
+
+    Other processes notice the deleted file on their next ``get_thumbnail``.
+    """
+    _cache.pop(user_id, None)
+
+
+async def video_keyframe_thumbnail(video_path):
+    """
+    Grab a keyframe from a video as a Telegram-ready JPEG.
+
+    Parameters:
+    - video_path (str): Path to the video.
+
+    Returns:
+    bytes or None: JPEG thumbnail, or None if no frame could be decoded.
+    """
+    try:
+        duration = (await probe_media(video_path))["duration"]
+    except OSError:
+        return None
+    for qscale in (3, 8, 15):
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-skip_frame",
+            "nokey",
+            "-ss",
+            str(int(duration * 0.1)),
+            "-i",
+            video_path,
+            "-frames:v",
+            "1",
+            "-vf",
+            f"scale={THUMB_MAX_SIDE}:{THUMB_MAX_SIDE}:force_original_aspect_ratio=decrease",
+            "-q:v",
+            str(qscale),
+            "-f",
+            "image2pipe",
+            "-vcodec",
+            "mjpeg",
+            "-",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await process.communicate()
+        if not stdout:
+            return None
+        if len(stdout) <= THUMB_MAX_BYTES:
+            return stdout
+    return None
+
+
+async def get_thumbnail(user_id, video_path=None):
+    """
+    Thumbnail to pass as ``thumb=`` for an upload.
+
+    The user's custom thumbnail is served from memory while the file on
+    disk is unchanged; without one, a keyframe of ``video_path`` is used
+    when given.
+
+    Parameters:
+    - user_id (int): Telegram user ID.
+    - video_path (str): Video being uploaded, for the keyframe fallback.
+
+    Returns:
+    BinaryIO or None: In-memory JPEG, or None if there is no thumbnail.
+    """
+    custom = thumb_path(user_id)
+    try:
+        mtime_ns = os.stat(custom).st_mtime_ns
+    except FileNotFoundError:
+        # Deleted, maybe by /delthumb in another process
+        _cache.pop(user_id, None)
+        mtime_ns = None
+    cached = _cache.get(user_id)
+    if cached is not None and cached[0] == mtime_ns:
+        _cache.move_to_end(user_id)
+        return _as_file(cached[1])
+    if mtime_ns is not None:
+        # Replaced since it was cached (or saved before thumbnails were
+        # normalized on save). The file is not rewritten, which would change
+        # its mtime under the other processes' caches
+        try:
+            with open(custom, "rb") as f:
+                data = await cpu_pool.run(normalize_image, f.read())
+            _remember(user_id, mtime_ns, data)
+            return _as_file(data)
+        except OSError as e:
+            logger.info("Unusable thumbnail %s: %s", custom, e)
+    if video_path is not None:
+        data = await video_keyframe_thumbnail(video_path)
+        if data:
+            return _as_file(data)
+    return None
@@ -0,0 +1,160 @@
+import io
+import os
+import mmap
+import logging
+import contextlib
+
+from config import Config
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Pyrogram reads 512 KiB parts into a one-slot queue served by 4 workers per
+# upload session (2.0 uses one session for big files, forks up to 3). Parts
+# are serialised and encrypted from these pages while in flight, so the
+# pages of every part that may still be queued or in a worker stay cached
+_PART_SIZE = 512 * 1024
+_PARTS_IN_FLIGHT = 3 * 4 + 1
+_KEEP_BEHIND = _PARTS_IN_FLIGHT * _PART_SIZE
+
+
+def _fadvise(fd, offset, length, advice):
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError:
+            pass
+
+
+class UploadReader(io.RawIOBase):
+    """
+    Read-only file for Pyrogram uploads, backed by a memory map.
+
+    ``read`` returns ``memoryview`` slices of the map, so parts reach the
+    encryption step without being copied into new buffers. The kernel is
+    asked to read ahead of the cursor and to drop the pages behind it, so
+    a multi-GB upload does not evict the rest of the page cache.
+    """
+
+    def __init__(self, path, readahead=None):
+        super().__init__()
+        # Pyrogram sends this as the file name
+        self.name = os.path.basename(path)
+        self.path = path
+        self.readahead = readahead if readahead is not None else Config.UPLOAD_READAHEAD
+        self._fd = os.open(path, os.O_RDONLY)
+        self._size = os.fstat(self._fd).st_size
+        self._map = None
+        if self._size:
+            self._map = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+            if hasattr(self._map, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                self._map.madvise(mmap.MADV_SEQUENTIAL)
+        if hasattr(os, "POSIX_FADV_SEQUENTIAL"):
+            _fadvise(self._fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        self._pos = 0
+        self._dropped = 0
+        self._advised = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        if offset < self._dropped:
+            # Read again from the start (Pyrogram retries a whole upload)
+            self._dropped = self._advised = offset - offset % mmap.PAGESIZE
+        return self._pos
+
+    def read(self, size=-1):
+        """
+        Next ``size`` bytes as a zero-copy view (empty at end of file).
+
+        The view stays valid after ``close`` until it is released.
+        """
+        if self._map is None or self._pos >= self._size:
+            return b""
+        end = self._size if size is None or size < 0 else min(self._size, self._pos + size)
+        view = memoryview(self._map)[self._pos: end]
+        self._pos = end
+        self._advise()
+        return view
+
+    def readinto(self, buffer):
+        view = self.read(len(buffer))
+        buffer[: len(view)] = view
+        return len(view)
+
+    def _advise(self):
+        if not hasattr(os, "POSIX_FADV_WILLNEED"):
+            return
+        # Keep the kernel reading ``readahead`` bytes ahead of the cursor
+        ahead = min(self._size, self._pos + self.readahead)
+        if ahead > self._advised:
+            start = max(self._advised, self._pos)
+            _fadvise(self._fd, start, ahead - start, os.POSIX_FADV_WILLNEED)
+            self._advised = ahead
+        # Drop what is far enough behind it that no upload worker still reads it
+        behind = self._pos - _KEEP_BEHIND
+        behind -= behind % mmap.PAGESIZE
+        if behind > self._dropped:
+            if hasattr(mmap, "MADV_DONTNEED"):
+                self._map.madvise(mmap.MADV_DONTNEED, self._dropped, behind - self._dropped)
+            _fadvise(self._fd, self._dropped, behind - self._dropped, os.POSIX_FADV_DONTNEED)
+            self._dropped = behind
+
+    def close(self):
+        if self.closed:
+            return
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A part is still referenced; the map goes away with it
+                pass
+            self._map = None
+        if self._dropped < self._size and hasattr(os, "POSIX_FADV_DONTNEED"):
+            _fadvise(self._fd, self._dropped, 0, os.POSIX_FADV_DONTNEED)
+        os.close(self._fd)
+        super().close()
+
+
+@contextlib.contextmanager
+def upload_source(path):
+    """
+    What to pass to Pyrogram's send_*/save_file for ``path``.
+
+    Parameters:
+    - path (str): Local file.
+
+    Returns:
+    ContextManager[UploadReader or str]: A reader for large files, otherwise
+    ``path`` unchanged (also when ``UPLOAD_MMAP`` is off or mapping fails).
+    """
+    reader = None
+    if Config.UPLOAD_MMAP:
+        try:
+            if os.path.getsize(path) >= Config.UPLOAD_MMAP_MIN_SIZE:
+                reader = UploadReader(path)
+        except (OSError, ValueError) as e:
+            logger.info("Uploading %s with plain reads: %s", path, e)
+    if reader is None:
+        yield path
+        return
+    try:
+        yield reader
+    finally:
+        reader.close()
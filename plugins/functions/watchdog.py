@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from config import Config
+from plugins.functions.metrics import counter, gauge
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Frames from these directories are considered "ours" when blaming a stall
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_DIRS = tuple(
+    os.path.join(PROJECT_ROOT, name) + os.sep for name in ("plugins", "helper_funcs")
+)
+
+LOOP_LAG = gauge("loop_lag_seconds", "Most recent event-loop lag")
+LOOP_STALLS = counter("loop_stalls_total", "Event-loop stalls longer than the watchdog threshold")
+LOOP_STALL_SECONDS = counter("loop_stall_seconds_total", "Time spent in event-loop stalls")
+LOOP_STALL_SITES = counter("loop_stall_sites_total", "Event-loop stalls by blocking call site")
+
+
+def blocking_site(frame):
+    """
+    Find the innermost project frame in a stack.
+
+    Parameters:
+    - frame: Innermost frame of the blocked thread.
+
+    Returns:
+    str: "path:line function" of the handler that is blocking, or of the
+    innermost frame when no project code is on the stack.
+    """
+    stack = traceback.extract_stack(frame)
+    for entry in reversed(stack):
+        if entry.filename.startswith(PROJECT_DIRS):
+            return f"{os.path.relpath(entry.filename, PROJECT_ROOT)}:{entry.lineno} {entry.name}"
+    if stack:
+        entry = stack[-1]
+        return f"{entry.filename}:{entry.lineno} {entry.name}"
+    return "unknown"
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag and reports what is blocking the loop.
+
+    A coroutine on the loop stamps a heartbeat every ``interval`` seconds; a
+    daemon thread checks the heartbeat and, when it is more than ``threshold``
+    seconds late, grabs the loop thread's stack *while it is still blocked*,
+    so the offending call site is logged instead of guessed.
+    """
+
+    def __init__(self, threshold, interval=0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self.lag = 0.0
+        self.peak = 0.0
+        self._beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - start - self.interval)
+            # Decaying peak so a single stall stays visible for a few samples
+            self.peak = max(self.lag, self.peak * 0.9)
+            LOOP_LAG.set(round(self.lag, 4))
+
+    def _watch(self):
+        stalled_since = None
+        site = None
+        while not self._stopped.wait(self.interval):
+            late = time.monotonic() - self._beat - self.interval
+            if late < self.threshold:
+                if stalled_since is not None:
+                    stalled_for = time.monotonic() - stalled_since
+                    LOOP_STALL_SECONDS.inc(round(stalled_for, 4))
+                    logger.warning("Event loop unblocked after %.2fs (%s)", stalled_for, site)
+                    stalled_since = None
+                continue
+            if stalled_since is not None:
+                # Same stall, already reported
+                continue
+            stalled_since = self._beat + self.interval
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            site = blocking_site(frame)
+            LOOP_STALLS.inc()
+            LOOP_STALL_SITES.inc(site=site)
+            logger.warning(
+                "Event loop blocked for %.2fs in %s\n%s",
+                late,
+                site,
+                "".join(traceback.format_stack(frame)),
+            )
+            del frame
+
+    def start(self):
+        """Start watching the running loop; must be called from the loop thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+
+watchdog = LoopWatchdog(Config.LOOP_WATCHDOG_THRESHOLD, Config.LOOP_WATCHDOG_INTERVAL)
@@ -0,0 +1,220 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+
+from pyrogram.errors import RPCError
+
+from config import Config
+from plugins.functions.bandwidth import shaper
+from plugins.functions.broker import offload_callback
+from plugins.functions.fanout import fan_out
+from plugins.functions.governor import rpc_priority
+from plugins.functions.playlist import POLICIES, download_command
+from plugins.functions.ran_text import random_char
+from plugins.functions.rate_limit import rate_limiter
+from plugins.functions.sessions import sessions
+from plugins.functions.thumbnail import get_thumbnail
+from plugins.script import Translation
+from plugins.utitles import Mdata01, Mdata03
+
+logging.basicConfig(
+    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("pyrogram").setLevel(logging.WARNING)
+
+# Seconds between edits of the aggregated progress message
+PROGRESS_INTERVAL = 5
+
+
+class PlaylistProgress:
+    """One progress message for a whole playlist, edited at most every few seconds."""
+
+    def __init__(self, message, title, total):
+        self.message = message
+        self.title = title
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+        self._last_edit = 0
+
+    async def show(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_edit < PROGRESS_INTERVAL:
+            return
+        self._last_edit = now
+        try:
+            # The final summary (force) must arrive; intermediate ones may be skipped
+            with rpc_priority("chatter" if force else "progress"):
+                await self.message.edit_text(
+                    Translation.PLAYLIST_PROGRESS.format(
+                        self.title, self.done, self.running, self.failed, self.total
+                    )
+                )
+        except RPCError as e:
+            logger.info("Playlist progress not updated: %s", e)
+
+
+async def download_entry(url, directory, send_type, format_spec, username=None, password=None):
+    """
+    Download one playlist entry with yt-dlp.
+
+    Returns:
+    str: Path of the downloaded file.
+
+    Raises:
+    RuntimeError: If yt-dlp produced no file (error, or over the size limit).
+    """
+    process = await asyncio.create_subprocess_exec(
+        *download_command(url, directory, send_type, format_spec, username, password),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    lines = stdout.decode().strip().splitlines()
+    if not lines or not os.path.isfile(lines[-1]):
+        raise RuntimeError(stderr.decode().strip() or "nothing downloaded")
+    return lines[-1]
+
+
+async def send_entry(bot, chat_id, user_id, path, send_type, caption):
+    """Upload a downloaded entry the way the chosen policy asks for."""
+    if send_type == "video":
+        width, height, duration = await Mdata01(path)
+        sent = await bot.send_video(
+            chat_id,
+            video=path,
+            caption=caption,
+            duration=duration,
+            width=width,
+            height=height,
+            supports_streaming=True,
+            thumb=await get_thumbnail(user_id, path),
+            progress=shaper.progress(user_id),
+        )
+    elif send_type == "audio":
+        duration = await Mdata03(path)
+        sent = await bot.send_audio(
+            chat_id,
+            audio=path,
+            caption=caption,
+            duration=duration,
+            thumb=await get_thumbnail(user_id),
+            progress=shaper.progress(user_id),
+        )
+    else:
+        sent = await bot.send_document(
+            chat_id,
+            document=path,
+            caption=caption,
+            thumb=await get_thumbnail(user_id),
+            progress=shaper.progress(user_id),
+        )
+    await fan_out(bot, sent.chat.id, sent.id)
+
+
+async def _run_entry(bot, update, playlist, policy, entry, semaphore, progress):
+    url, title = entry
+    _, send_type, format_spec = POLICIES[policy]
+    user_id = update.from_user.id
+    async with semaphore:
+        progress.running += 1
+        await progress.show()
+        directory = f"{Config.DOWNLOAD_LOCATION}/{user_id}{random_char(5)}"
+        os.makedirs(directory, exist_ok=True)
+        try:
+            path = await download_entry(
+                url,
+                directory,
+                send_type,
+                format_spec,
+                playlist.get("username"),
+                playlist.get("password"),
+            )
+            rate_limiter.charge(user_id, "bytes", os.stat(path).st_size)
+            await send_entry(
+                bot, update.message.chat.id, user_id, path, send_type, (title or "")[:1021]
+            )
+            progress.done += 1
+        except Exception as e:
+            logger.info("Playlist entry %s failed: %s", url, e)
+            progress.failed += 1
+        finally:
+            progress.running -= 1
+            shutil.rmtree(directory, ignore_errors=True)
+    await progress.show()
+
+
+def _credentials(message):
+    """Username and password of a "url|name|user|pass" message, as echo reads them."""
+    url_parts = (message.text or "").split("|") if message is not None else []
+    if len(url_parts) == 4:
+        return url_parts[2].strip(), url_parts[3].strip()
+    return None, None
+
+
+async def playlist_call_back(bot, update, session=None):
+    """
+    Download and upload every entry of a playlist with the chosen format policy.
+
+    Entries run ``Config.PLAYLIST_CONCURRENCY`` at a time; progress for the
+    whole playlist is kept in the format-selection message.
+
+    Parameters:
+    - bot: Pyrogram client.
+    - update (CallbackQuery): The policy button press.
+    - session (dict): Playlist already resolved (and rate-limited) by the
+      front-end, when a worker replays the press. It carries no
+      credentials; they are read again from the user's message.
+
+    Returns:
+    bool: Whether any entry was delivered.
+    """
+    _, token, policy = update.data.split(":")
+    playlist = session or sessions.get(token)
+    if playlist is None or policy not in POLICIES:
+        await update.message.edit(Translation.SESSION_EXPIRED)
+        return False
+
+    if session is None:
+        retry_after = rate_limiter.retry_after(
+            update.from_user.id, "bytes"
+        ) or rate_limiter.check(update.from_user.id, "download")
+        if retry_after:
+            await update.answer(
+                Translation.FREE_USER_LIMIT_Q_SZE.format(round(retry_after)),
+                show_alert=True,
+            )
+            return False
+        # One run per listing, so a double tap does not upload everything twice
+        sessions.pop(token)
+
+        # The check above took the first entry's download token; the rest are owed
+        rate_limiter.charge(update.from_user.id, "download", len(playlist["entries"]) - 1)
+
+        if Config.BOT_MODE == "frontend":
+            # Jobs are stored by the broker, so the credentials stay behind
+            await offload_callback(
+                update, {"title": playlist["title"], "entries": playlist["entries"]}
+            )
+            await update.answer(Translation.QUEUED_FOR_WORKER)
+            return True
+    else:
+        username, password = _credentials(update.message.reply_to_message)
+        playlist = {**playlist, "username": username, "password": password}
+
+    entries = playlist["entries"]
+    progress = PlaylistProgress(update.message, playlist["title"], len(entries))
+    await progress.show(force=True)
+    semaphore = asyncio.Semaphore(Config.PLAYLIST_CONCURRENCY)
+    await asyncio.gather(
+        *(
+            _run_entry(bot, update, playlist, policy, entry, semaphore, progress)
+            for entry in entries
+        )
+    )
+    await progress.show(force=True)
+    return progress.done > 0
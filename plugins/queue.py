@@ -4,13 +4,23 @@ from collections import deque
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from typing import Optional
+from config import Config
 from helper_funcs.download import process_url, download_file
+from plugins.functions.broker import get_broker
+from plugins.functions.link_ingest import (
+    LINK_FILE_EXTENSIONS,
+    extract_links,
+    order_jobs,
+    preflight,
+)
 
 CANCEL_FLAG = False
 QUEUE = deque()
 IS_DOWNLOADING = False
 WAITING_FOR_LINKS = set()
 
+MAX_LINK_FILE_SIZE = 1024 * 1024
+
 DOWNLOAD_FOLDER = "downloads"
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 
@@ -18,6 +28,10 @@ os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 @Client.on_message(filters.command("cancel") & filters.private)
 async def cancel_all_tasks(client, message: Message):
     global CANCEL_FLAG, IS_DOWNLOADING
+    if Config.BOT_MODE == "frontend":
+        cancelled = await get_broker().cancel(message.from_user.id)
+        await message.reply(f"🚫 Cancelled **{cancelled}** pending tasks.")
+        return
     CANCEL_FLAG = True
     QUEUE.clear()
     IS_DOWNLOADING = False
@@ -28,7 +42,8 @@ async def cancel_all_tasks(client, message: Message):
 async def queue_cmd(client, message: Message):
     WAITING_FOR_LINKS.add(message.from_user.id)
     await message.reply(
-        "**Send all your links in ONE MESSAGE, separated by spaces.**\n"
+        "**Send all your links in ONE MESSAGE, separated by spaces,**\n"
+        "**or send them as a .txt / .csv file.**\n"
         "Example:\n"
         "`https://a.com/1.mp4 https://b.com/2.mkv https://c.com/file.zip`"
     )
@@ -36,6 +51,16 @@ async def queue_cmd(client, message: Message):
 
 @Client.on_message(filters.command("queue_status") & filters.private)
 async def queue_status_cmd(client, message: Message):
+    if Config.BOT_MODE == "frontend":
+        counts = await get_broker().counts(message.from_user.id)
+        await message.reply(
+            "📊 **Queue Status**\n"
+            f"• Pending Tasks: **{counts.get('pending', 0)}**\n"
+            f"• Running: **{counts.get('running', 0)}**\n"
+            f"• Done: **{counts.get('done', 0)}**\n"
+            f"• Failed: **{counts.get('failed', 0)}**"
+        )
+        return
     total = len(QUEUE)
     status = "🟢 Running" if IS_DOWNLOADING else "🔴 Idle"
     await message.reply(f"📊 **Queue Status**\n• Status: **{status}**\n• Pending Tasks: **{total}**")
@@ -49,29 +74,65 @@ async def clear_cmd(client, message: Message):
     await message.reply("🧹 Queue cleared!\nAll pending tasks removed.")
 
 
-@Client.on_message(filters.private & ~filters.command(["queue", "cancel", "clear", "queue_status"]))
+async def _waiting_for_links(_, __, message: Message):
+    return message.from_user is not None and message.from_user.id in WAITING_FOR_LINKS
+
+
+# Group -1 runs before echo.py's link handler, which would otherwise take
+# every message containing "http"; only users who sent /queue are matched.
+@Client.on_message(
+    filters.private
+    & filters.create(_waiting_for_links)
+    & ~filters.command(["queue", "cancel", "clear", "queue_status", "settings", "profile"]),
+    group=-1,
+)
 async def queue_add_links(client, message: Message):
     user_id = message.from_user.id
-    if user_id not in WAITING_FOR_LINKS:
-        return
 
-    text = message.text.strip()
-    links = text.split()
-    valid_links = [link for link in links if link.startswith("http")]
+    document_text = ""
+    document = message.document
+    if document and (document.file_name or "").lower().endswith(LINK_FILE_EXTENSIONS):
+        if document.file_size > MAX_LINK_FILE_SIZE:
+            await message.reply("❌ Link list is too large (max 1 MB).")
+            message.stop_propagation()
+        data = await message.download(in_memory=True)
+        document_text = data.getvalue().decode("utf-8", errors="ignore")
 
-    if not valid_links:
-        await message.reply("❌ No valid URLs found. Send again.")
-        return
+    links, duplicates = extract_links(message, document_text)
 
-    for url in valid_links:
-        QUEUE.append({"user_id": user_id, "url": url})
-
-    WAITING_FOR_LINKS.remove(user_id)
-    await message.reply(f"✅ Added **{len(valid_links)}** links. Starting process...")
+    if not links:
+        await message.reply("❌ No valid URLs found. Send again.")
+        message.stop_propagation()
+
+    WAITING_FOR_LINKS.discard(user_id)
+    status = await message.reply(f"🔎 Checking **{len(links)}** links...")
+
+    jobs = await preflight(links)
+    accepted = order_jobs([job for job in jobs if job["error"] is None])
+    rejected = [job for job in jobs if job["error"] is not None]
+
+    if Config.BOT_MODE == "frontend":
+        # Workers (worker.py) pick these up; this process only handles chat
+        broker = get_broker()
+        for job in accepted:
+            await broker.enqueue("url", job, user_id=user_id)
+    else:
+        for job in accepted:
+            QUEUE.append({"user_id": user_id, **job})
+
+    text = f"✅ Added **{len(accepted)}** links. Starting process..."
+    if duplicates:
+        text += f"\n♻️ Skipped **{duplicates}** duplicates."
+    if rejected:
+        text += f"\n❌ Rejected **{len(rejected)}**:\n" + "\n".join(
+            f"• `{job['url']}` — {job['error']}" for job in rejected[:20]
+        )
+    await status.edit(text, disable_web_page_preview=True)
 
     global IS_DOWNLOADING
-    if not IS_DOWNLOADING:
+    if accepted and not IS_DOWNLOADING and Config.BOT_MODE != "frontend":
         asyncio.create_task(queue_worker(client))
+    message.stop_propagation()
 
 
 async def queue_worker(client: Client):
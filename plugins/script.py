@@ -97,6 +97,9 @@ I am Powerful Url Uploader Bot
     SET_CUSTOM_USERNAME_PASSWORD = """"""
     DOWNLOAD_START = "Trying to Download ⌛\n\n <i>{} </i>"
     UPLOAD_START = "<i>{} </i>\n\n📤 Uploading Please Wait "
+    UPLOAD_PARTS_START = "📤 File is larger than Telegram allows, uploading it in {} parts..."
+    QUEUED_FOR_WORKER = "⏳ Queued, a worker will start on it shortly."
+    SPLIT_FAILED = "❌ Could not split the file into uploadable parts: {}"
     RCHD_TG_API_LIMIT = "Downloaded in {} seconds.\nDetected File Size: {}\nSorry. But, I cannot upload files greater than 2GB due to Telegram API limitations."
     AFTER_SUCCESSFUL_UPLOAD_MSG_WITH_TS = (
         "Dᴏᴡɴʟᴏᴀᴅᴇᴅ ɪɴ {} sᴇᴄᴏɴᴅs.\n\nTʜᴀɴᴋs Fᴏʀ Usɪɴɢ Mᴇ\n\nUᴘʟᴏᴀᴅᴇᴅ ɪɴ {} sᴇᴄᴏɴᴅs"
@@ -104,7 +107,27 @@ I am Powerful Url Uploader Bot
     FF_MPEG_DEL_ETED_CUSTOM_MEDIA = "✅ Media cleared succesfully."
     CUSTOM_CAPTION_UL_FILE = ""
     NO_VOID_FORMAT_FOUND = "ERROR... <code>{}</code>"
-    FREE_USER_LIMIT_Q_SZE = "Cannot Process, Time OUT..."
+    PLAYLIST_SCANNING = "Proccesing your ⌛\n\n🗂 {} entries found so far..."
+    PLAYLIST_SELECTION = "🗂 <b>{}</b>\n\n{} entries found. Choose how to download all of them:"
+    PLAYLIST_PROGRESS = """
+🗂 <b>{}</b>
+
+✅ Uploaded : {}
+⏳ Running : {}
+⚠️ Failed : {}
+📋 Total : {}
+"""
+    SESSION_EXPIRED = "This link has expired, send it again."
+    SETTINGS_LIST = "⚙️ <b>Live settings</b>\n\n{}\n\nChange one with <code>/settings NAME VALUE</code>"
+    SETTINGS_VALUE = "⚙️ <code>{}</code> = <code>{}</code>"
+    SETTINGS_UPDATED = "✅ <code>{}</code> is now <code>{}</code>"
+    SETTINGS_UNKNOWN = "❌ <code>{}</code> is not a live setting."
+    SETTINGS_INVALID = "❌ Cannot set <code>{}</code>: {}"
+    PROFILE_USAGE = "Usage: <code>/profile [seconds]</code> or <code>/profile mem [seconds]</code>"
+    PROFILE_START = "🔬 Profiling {} for {} seconds..."
+    PROFILE_CPU_DONE = "🔬 {}s, {} samples of every thread and task.\nOpen with speedscope.app or flamegraph.pl."
+    PROFILE_MEMORY_DONE = "🔬 Memory growth over {}s, largest first."
+    FREE_USER_LIMIT_Q_SZE = "Cannot Process, Time OUT...\n\nTry again in {} seconds."
     SLOW_URL_DECED = """
     Gosh that seems to be a very slow URL. Since you were screwing my home,
     I am in no mood to download this file. Meanwhile, why don't you try this:==> https://shrtz.me/PtsVnf6
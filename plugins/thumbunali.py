@@ -1,12 +1,18 @@
 import os
 from pyrogram import Client, filters
 from config import Config
+from plugins.functions.thumbnail import save_thumbnail, forget_thumbnail
 
 
 @Client.on_message(filters.photo & filters.incoming & filters.private)
 async def save_photo(_bot, message):
-    download_location = f"{Config.DOWNLOAD_LOCATION}/{message.from_user.id}.jpg"
-    await message.download(file_name=download_location)
+    download_location = f"{Config.DOWNLOAD_LOCATION}/{message.from_user.id}.original.jpg"
+    try:
+        await message.download(file_name=download_location)
+        await save_thumbnail(message.from_user.id, download_location)
+    finally:
+        if os.path.isfile(download_location):
+            os.remove(download_location)
 
     await message.reply_text(text="your custom thumbnail is saved", quote=True)
 
@@ -31,6 +37,7 @@ async def delete_photo(_bot, message):
     download_location = f"{Config.DOWNLOAD_LOCATION}/{message.from_user.id}.jpg"
     if os.path.isfile(download_location):
         os.remove(download_location)
+        forget_thumbnail(message.from_user.id)
         await message.reply_text(
             text="your thumbnail removed successfully.", quote=True
         )
@@ -1,6 +1,6 @@
 import logging
-from hachoir.parser import createParser
-from hachoir.metadata import extractMetadata
+
+from plugins.functions.cpu_pool import cpu_pool
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -9,29 +9,58 @@ logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
 
-async def Mdata01(download_directory):
+def extract_metadata(file_path):
     """
-    Extract metadata information for video files.
+    Parse a media file with hachoir, which is only imported on first use.
 
     Parameters:
-    - download_directory (str): The path to the video file.
+    - file_path (str): The path to the media file.
 
     Returns:
-    Tuple[int, int, int]: Tuple containing width, height, and duration.
+    Metadata or None: hachoir metadata, if the file could be parsed.
+    """
+    from hachoir.parser import createParser
+    from hachoir.metadata import extractMetadata
+
+    return extractMetadata(createParser(file_path))
+
+
+def read_metadata(file_path):
+    """
+    Duration, width and height of a media file as plain data.
+
+    Runs in the CPU pool, so it returns a dict rather than hachoir objects.
+
+    Parameters:
+    - file_path (str): The path to the media file.
+
+    Returns:
+    dict: "duration" (seconds), "width" and "height"; 0 when unknown.
     """
-    width = 0
-    height = 0
-    duration = 0
-    metadata = extractMetadata(createParser(download_directory))
+    info = {"duration": 0, "width": 0, "height": 0}
+    metadata = extract_metadata(file_path)
     if metadata is not None:
         if metadata.has("duration"):
-            duration = metadata.get("duration").seconds
+            info["duration"] = metadata.get("duration").seconds
         if metadata.has("width"):
-            width = metadata.get("width")
+            info["width"] = metadata.get("width")
         if metadata.has("height"):
-            height = metadata.get("height")
+            info["height"] = metadata.get("height")
+    return info
 
-    return width, height, duration
+
+async def Mdata01(download_directory):
+    """
+    Extract metadata information for video files.
+
+    Parameters:
+    - download_directory (str): The path to the video file.
+
+    Returns:
+    Tuple[int, int, int]: Tuple containing width, height, and duration.
+    """
+    info = await cpu_pool.run(read_metadata, download_directory)
+    return info["width"], info["height"], info["duration"]
 
 
 async def Mdata02(download_directory):
@@ -44,16 +73,8 @@ async def Mdata02(download_directory):
     Returns:
     Tuple[int, int]: Tuple containing width and duration.
     """
-    width = 0
-    duration = 0
-    metadata = extractMetadata(createParser(download_directory))
-    if metadata is not None:
-        if metadata.has("duration"):
-            duration = metadata.get("duration").seconds
-        if metadata.has("width"):
-            width = metadata.get("width")
-
-    return width, duration
+    info = await cpu_pool.run(read_metadata, download_directory)
+    return info["width"], info["duration"]
 
 
 async def Mdata03(download_directory):
@@ -66,9 +87,4 @@ async def Mdata03(download_directory):
     Returns:
     int: Duration of the audio file.
     """
-    metadata = extractMetadata(createParser(download_directory))
-    return (
-        metadata.get("duration").seconds
-        if metadata is not None and metadata.has("duration")
-        else 0
-    )
+    return (await cpu_pool.run(read_metadata, download_directory))["duration"]
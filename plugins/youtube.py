@@ -1,12 +1,11 @@
 import os
 import asyncio
 
-from youtube_dl import YoutubeDL
 from pyrogram import enums
 from pyrogram.types import Message
 from pyrogram import Client, filters
 
-from config import Config
+from plugins.functions.thumbnail import get_thumbnail
 from plugins.functions.help_ytdl import get_file_extension_from_url, get_resolution
 YTDL_REGEX = r"^((?:https?:)?\/\/)"
 
@@ -14,6 +13,8 @@ YTDL_REGEX = r"^((?:https?:)?\/\/)"
 @Client.on_callback_query(filters.regex("^ytdl_audio$"))
 async def callback_query_ytdl_audio(_, callback_query):
     try:
+        from youtube_dl import YoutubeDL
+
         url = callback_query.message.reply_to_message.text
         ydl_opts = {
             "format": "bestaudio",
@@ -49,8 +50,7 @@ async def send_audio(message: Message, info_dict, audio_file):
         audio_file = audio_file_weba
     thumbnail_url = info_dict["thumbnail"]
     thumbnail_file = f"{basename}.{get_file_extension_from_url(thumbnail_url)}"
-    download_location = f"{Config.DOWNLOAD_LOCATION}/{message.from_user.id}.jpg"
-    thumb = download_location if os.path.isfile(download_location) else None
+    thumb = await get_thumbnail(message.from_user.id)
     webpage_url = info_dict["webpage_url"]
     title = info_dict["title"] or ""
     caption = f'<b><a href="{webpage_url}">{title}</a></b>'
@@ -74,8 +74,7 @@ async def send_video(message: Message, info_dict, video_file):
     basename = video_file.rsplit(".", 1)[-2]
     thumbnail_url = info_dict["thumbnail"]
     thumbnail_file = f"{basename}.{get_file_extension_from_url(thumbnail_url)}"
-    download_location = f"{Config.DOWNLOAD_LOCATION}/{message.from_user.id}.jpg"
-    thumb = download_location if os.path.isfile(download_location) else None
+    thumb = await get_thumbnail(message.from_user.id, video_file)
     webpage_url = info_dict["webpage_url"]
     title = info_dict["title"] or ""
     caption = f'<b><a href="{webpage_url}">{title}</a></b>'
@@ -98,6 +97,8 @@ async def send_video(message: Message, info_dict, video_file):
 @Client.on_callback_query(filters.regex("^ytdl_video$"))
 async def callback_query_ytdl_video(_, callback_query):
     try:
+        from youtube_dl import YoutubeDL
+
         # url = callback_query.message.text
         url = callback_query.message.reply_to_message.text
         ydl_opts = {
@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+import logging
+from importlib.abc import MetaPathFinder
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class _TimedLoader:
+    """Wraps a loader and records how long ``exec_module`` takes."""
+
+    def __init__(self, loader, finder):
+        self._loader = loader
+        self._finder = finder
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        finder = self._finder
+        finder.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = finder.stack.pop()
+            if finder.stack:
+                finder.stack[-1] += cumulative
+            finder.timings.append((module.__name__, cumulative - children, cumulative))
+
+
+class ImportTimer(MetaPathFinder):
+    """
+    Meta path finder that times every module import, like ``-X importtime``.
+
+    It only wraps the loader found by the regular finders, so import
+    semantics are unchanged; remove it with ``uninstall()`` once booted.
+    """
+
+    def __init__(self):
+        self.timings = []
+        self.stack = []
+        self._finding = False
+
+    def find_spec(self, fullname, path, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._finding = False
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def report(self, limit=25):
+        """
+        Format the slowest imports.
+
+        Parameters:
+        - limit (int): Number of modules to list.
+
+        Returns:
+        str: Table of self/cumulative import times in microseconds.
+        """
+        top_level = sum(cumulative for name, _, cumulative in self.timings if "." not in name)
+        lines = [f"import time: {top_level * 1000:.1f} ms total", "      self [us] |  cumulative | module"]
+        for name, self_time, cumulative in sorted(self.timings, key=lambda t: t[2], reverse=True)[:limit]:
+            lines.append(f"{self_time * 1e6:>14.0f} | {cumulative * 1e6:>11.0f} | {name}")
+        return "\n".join(lines)
+
+
+# Installed by begin() when IMPORT_TIME_REPORT is set
+_import_timer = ImportTimer()
+_boot_started = time.perf_counter()
+
+
+def begin():
+    """
+    Prepare the interpreter for a fast boot; call before importing pyrogram.
+
+    Installs uvloop when ``USE_UVLOOP`` is set (and it is installed) and
+    starts timing imports when ``IMPORT_TIME_REPORT`` is set.
+    """
+    if Config.IMPORT_TIME_REPORT:
+        _import_timer.install()
+    if Config.USE_UVLOOP:
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("USE_UVLOOP is set but uvloop is not installed")
+        else:
+            uvloop.install()
+            logger.info("Using uvloop event loop")
+
+
+def finish():
+    """Log how long the boot took and, if enabled, the import-time breakdown."""
+    logger.info("Boot took %.2fs", time.perf_counter() - _boot_started)
+    if _import_timer in sys.meta_path:
+        _import_timer.uninstall()
+        logger.info(_import_timer.report())
+
+
+def plugins_config(root="plugins"):
+    """
+    Build the pyrogram ``plugins`` argument.
+
+    With ``LAZY_PLUGINS`` set, only modules that actually register handlers
+    are imported at start; helpers are imported on first use. Handler modules
+    are found by scanning source text, so nothing is imported to decide.
+
+    Parameters:
+    - root (str): Plugins package.
+
+    Returns:
+    dict: Value for ``Client(plugins=...)``.
+    """
+    if not Config.LAZY_PLUGINS:
+        return {"root": root}
+    paths = sorted(
+        os.path.join(dirpath, filename)
+        for dirpath, _, filenames in os.walk(root)
+        for filename in filenames
+        if filename.endswith(".py")
+    )
+    include = []
+    # Same order pyrogram uses, so handler priority within a group is unchanged
+    for path in paths:
+        with open(path, encoding="utf8") as f:
+            if "@Client.on_" not in f.read():
+                continue
+        module = os.path.relpath(path, root)[: -len(".py")]
+        include.append(module.replace(os.sep, "."))
+    return {"root": root, "include": include}
@@ -0,0 +1,173 @@
+import os
+import socket
+import asyncio
+import logging
+import multiprocessing
+
+from config import Config
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("pyrogram").setLevel(logging.WARNING)
+
+
+async def _keep_lease(broker, job_id, worker):
+    """Renew the job's lease while it runs, so no other worker takes it over."""
+    while True:
+        await asyncio.sleep(Config.BROKER_LEASE / 3)
+        await broker.update(job_id, progress="running", worker=worker)
+
+
+async def apply_settings(broker, version):
+    """
+    Apply the live settings the front-end changed since ``version``.
+
+    Parameters:
+    - broker: JobBroker or RemoteBroker.
+    - version (int): Last version applied, 0 at start.
+
+    Returns:
+    int: Version to pass next time.
+    """
+    from plugins.functions.settings import live_settings
+
+    for name, value, version in await broker.settings_since(version):
+        try:
+            live_settings.set(name, value)
+        except (KeyError, ValueError) as e:
+            logger.warning("Setting %s = %r not applied: %s", name, value, e)
+    return version
+
+
+async def replay_callback(client, job):
+    """
+    Run a download button press the front-end queued.
+
+    Parameters:
+    - client: Pyrogram client.
+    - job (dict): "callback" job; see ``offload_callback``.
+
+    Returns:
+    bool: Whether the file was delivered.
+    """
+    from pyrogram.types import CallbackQuery, User
+
+    from plugins.button import youtube_dl_call_back
+    from plugins.dl_button import ddl_call_back
+    from plugins.playlist import playlist_call_back
+
+    payload = job["payload"]
+    message = await client.get_messages(payload["chat_id"], payload["message_id"])
+    if message.empty or message.reply_to_message is None:
+        raise ValueError("the message with the buttons is gone")
+    update = CallbackQuery(
+        client=client,
+        id="0",
+        from_user=User(id=job["user_id"], client=client),
+        chat_instance="",
+        message=message,
+        data=payload["data"],
+    )
+    if payload["data"].startswith("pl:"):
+        return await playlist_call_back(client, update, session=payload["session"])
+    if payload["session"] is not None:
+        return await youtube_dl_call_back(client, update, session=payload["session"])
+    return await ddl_call_back(client, update, replayed=True)
+
+
+async def run_job(client, broker, job, worker):
+    """
+    Execute one claimed job and report the outcome to the broker.
+
+    Parameters:
+    - client: Pyrogram client used to upload and message the user.
+    - broker: JobBroker or RemoteBroker the job came from.
+    - job (dict): Job returned by ``broker.claim``.
+    - worker (str): Name the job was claimed under.
+    """
+    from helper_funcs.download import process_url
+
+    lease = asyncio.create_task(_keep_lease(broker, job["id"], worker))
+    digest = None
+    try:
+        if job["kind"] == "url":
+            digest = await process_url(client, job["user_id"], job["payload"]["url"], {"cancel": False})
+            delivered = digest is not None
+        elif job["kind"] == "callback":
+            delivered = await replay_callback(client, job)
+        else:
+            raise ValueError(f"unknown job kind {job['kind']!r}")
+    except Exception as e:
+        logger.exception("Job %s failed", job["id"])
+        await broker.update(job["id"], status="failed", error=str(e), worker=worker)
+        try:
+            await client.send_message(job["user_id"], f"⚠️ Error: `{e}`")
+        except Exception:
+            pass
+    else:
+        if delivered:
+            await broker.update(job["id"], status="done", progress="done", digest=digest, worker=worker)
+        else:
+            # The user was already told what went wrong
+            await broker.update(job["id"], status="failed", error="not delivered", worker=worker)
+    finally:
+        lease.cancel()
+
+
+async def run_worker(index):
+    """
+    Pull jobs from the broker forever.
+
+    Parameters:
+    - index (int): Worker number on this host; names the pyrogram session.
+    """
+    from pyrogram import Client
+
+    from plugins.functions.broker import get_broker
+    from plugins.functions.governor import governor
+
+    name = f"{socket.gethostname()}-{index}"
+    broker = get_broker()
+    client = Client(
+        f"All-Url-Uploader-worker-{index}",
+        api_id=Config.API_ID,
+        api_hash=Config.API_HASH,
+        bot_token=Config.BOT_TOKEN,
+        # Updates go to the front-end; workers only call the API
+        no_updates=True,
+    )
+    governor.install(client)
+    settings_version = 0
+    async with client:
+        logger.info("Worker %s started", name)
+        while True:
+            settings_version = await apply_settings(broker, settings_version)
+            job = await broker.claim(name)
+            if job is None:
+                await asyncio.sleep(Config.WORKER_POLL_INTERVAL)
+                continue
+            logger.info("Worker %s running job %s (attempt %s)", name, job["id"], job["attempt"])
+            await run_job(client, broker, job, name)
+
+
+def _worker_process(index):
+    asyncio.run(run_worker(index))
+
+
+if __name__ == "__main__":
+    if not os.path.isdir(Config.DOWNLOAD_LOCATION):
+        os.makedirs(Config.DOWNLOAD_LOCATION)
+
+    if Config.WORKER_PROCESSES <= 1:
+        _worker_process(0)
+    else:
+        processes = [
+            multiprocessing.Process(target=_worker_process, args=(index,), daemon=True)
+            for index in range(Config.WORKER_PROCESSES)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()